@@ -0,0 +1,169 @@
+"""Benchmark the mock server's hot paths.
+
+Runs the server in-process (uvicorn, in a background thread) and measures:
+
+- `handler`: mocked requests/sec and latency at 1/100/1000 routes per namespace.
+- `add`: registration throughput of `/__responsaas__/add`.
+- `churn`: namespace enter/exit cycles.
+- `calls`: the cost of `calls`/`call_count` as a namespace's call log grows.
+
+Results are emitted as JSON, for comparison between runs:
+
+    python benchmarks/bench.py --output results.json
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Callable, Dict, Iterator, List, Optional
+
+import cappa
+import requests
+import uvicorn
+
+from responsaas.api import ResponsaasServer
+
+
+@dataclass
+class Bench:
+    """Benchmark the responsaas server."""
+
+    requests: Annotated[int, cappa.Arg(long=True, help="Requests per measurement.")] = (
+        2000
+    )
+    routes: Annotated[
+        List[int],
+        cappa.Arg(long=True, num_args=-1, help="Routes per namespace to measure."),
+    ] = field(default_factory=lambda: [1, 100, 1000])
+    call_log: Annotated[
+        List[int],
+        cappa.Arg(long=True, num_args=-1, help="Call log sizes to measure."),
+    ] = field(default_factory=lambda: [100, 1000, 10000])
+    output: Annotated[
+        Optional[str], cappa.Arg(short=True, long=True, help="Write results here.")
+    ] = None
+
+    def __call__(self):
+        with serve() as server_url:
+            server = ResponsaasServer(server_url)
+            results = {
+                "environment": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                },
+                "handler": [
+                    bench_handler(server, routes, self.requests)
+                    for routes in self.routes
+                ],
+                "add": bench_add(server, self.requests),
+                "churn": bench_churn(server, self.requests),
+                "calls": [bench_calls(server, size) for size in self.call_log],
+            }
+
+        content = json.dumps(results, indent=2)
+        if self.output:
+            with open(self.output, "w") as f:
+                f.write(content)
+        else:
+            print(content)  # noqa: T201
+
+
+@contextlib.contextmanager
+def serve() -> Iterator[str]:
+    """Run the server on a free port, in a background thread."""
+    from responsaas.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def measure(fn: Callable[[int], Any], count: int) -> Dict[str, float]:
+    """Call `fn` `count` times, summarizing its throughput and latency."""
+    durations = []
+    start = time.perf_counter()
+    for i in range(count):
+        call_start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(durations, n=100)
+    return {
+        "count": count,
+        "per_second": round(count / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
+
+
+def bench_handler(server: ResponsaasServer, routes: int, count: int):
+    session = requests.Session()
+    with server.activate() as responsaas:
+        with responsaas.batch():
+            for i in range(routes):
+                responsaas.get(f"/route/{i}", json={"route": i})
+
+        # Requests are spread across every route, including the last registered.
+        urls = [f"{responsaas.base_url}/route/{i % routes}" for i in range(count)]
+        result = measure(lambda i: session.get(urls[i]), count)
+    return {"routes": routes, **result}
+
+
+def bench_add(server: ResponsaasServer, count: int):
+    with server.activate() as responsaas:
+        return measure(lambda i: responsaas.get(f"/route/{i}", body="body"), count)
+
+
+def bench_churn(server: ResponsaasServer, count: int):
+    def enter_exit(_):
+        with server.activate():
+            pass
+
+    return measure(enter_exit, count)
+
+
+def bench_calls(server: ResponsaasServer, size: int):
+    session = requests.Session()
+    with server.activate() as responsaas:
+        responsaas.get("/foo", body="foo")
+        url = f"{responsaas.base_url}/foo"
+        for _ in range(size):
+            session.get(url)
+
+        # The cursor preceding the last 10 calls, as a caught up `CallLog` would see.
+        calls, end = responsaas.fetch_calls()
+        tail = end - min(len(calls), 10)
+
+        repeat = 20
+        return {
+            "calls": size,
+            "calls_all": measure(lambda _: responsaas.calls(), repeat),
+            "calls_tail": measure(lambda _: responsaas.fetch_calls(tail), repeat),
+            "call_count": measure(lambda _: responsaas.call_count("/foo"), repeat),
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    cappa.invoke(Bench, argv=argv)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
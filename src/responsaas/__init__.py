@@ -1,7 +1,8 @@
-from responsaas.api import Responsaas, URLPatternType, matchers
+from responsaas.api import Responsaas, Shaping, URLPatternType, matchers
 
 __all__ = [
     "Responsaas",
+    "Shaping",
     "matchers",
     "URLPatternType",
 ]
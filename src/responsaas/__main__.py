@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Annotated, Dict, List, Literal, Optional, Union
+
+import cappa
+
+
+def parse_paths(value: Union[str, List[str]]) -> List[str]:
+    # From the environment, a single `os.pathsep` separated string.
+    if isinstance(value, str):
+        return value.split(os.pathsep)
+    return value
+
+
+LogLevel = Literal["critical", "error", "warning", "info", "debug", "trace"]
+
+
+@cappa.command(name="responsaas", default_long=True)
+@dataclass
+class Cli:
+    """Run the responsaas server.
+
+    Server options can also be supplied through their `RESPONSAAS_*` environment
+    variables.
+    """
+
+    host: Annotated[str, cappa.Arg(help="The interface to bind to.")] = "127.0.0.1"
+    port: Annotated[int, cappa.Arg(help="The port to bind to.")] = 7564
+
+    workers: Annotated[
+        int,
+        cappa.Arg(
+            short=True,
+            help="The number of worker processes. Multiple workers share namespaces "
+            "through `--shared-state` (a temporary file, if not supplied).",
+        ),
+    ] = 1
+    loop: Annotated[
+        Literal["auto", "asyncio", "uvloop"],
+        cappa.Arg(help="The event loop. `auto` uses uvloop, if it's installed."),
+    ] = "auto"
+    http: Annotated[
+        Literal["auto", "h11", "httptools"],
+        cappa.Arg(help="The HTTP parser. `auto` uses httptools, if it's installed."),
+    ] = "auto"
+    backlog: Annotated[
+        int, cappa.Arg(help="The maximum number of pending connections.")
+    ] = 2048
+    keep_alive: Annotated[
+        int, cappa.Arg(help="Seconds to keep idle keep-alive connections open.")
+    ] = 5
+
+    log_level: Annotated[LogLevel, cappa.Arg(help="The log level.")] = "warning"
+    access_log: Annotated[
+        bool, cappa.Arg(help="Log every request. Costly under heavy load.")
+    ] = False
+    debug: Annotated[bool, cappa.Arg(help="Return tracebacks in error responses.")] = (
+        False
+    )
+
+    shared_state: Annotated[
+        Optional[str],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_SHARED_STATE"),
+            help="The SQLite database through which workers share namespaces.",
+        ),
+    ] = None
+    namespace_ttl: Annotated[
+        Optional[float],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_NAMESPACE_TTL"),
+            help="Remove namespaces unused for this many seconds.",
+        ),
+    ] = None
+    max_namespaces: Annotated[
+        Optional[int],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_MAX_NAMESPACES"),
+            help="Remove the least recently used namespaces beyond this many.",
+        ),
+    ] = None
+    max_bytes: Annotated[
+        Optional[int],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_MAX_BYTES"),
+            help="Remove the least recently used namespaces beyond this total size.",
+        ),
+    ] = None
+    reap_interval: Annotated[
+        Optional[float],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_REAP_INTERVAL"),
+            help="Seconds between enforcing the namespace limits.",
+        ),
+    ] = None
+    body_dir: Annotated[
+        Optional[str],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_BODY_DIR"),
+            help="The directory in which large bodies are stored.",
+        ),
+    ] = None
+    file_root: Annotated[
+        Optional[str],
+        cappa.Arg(
+            default=cappa.Env("RESPONSAAS_FILE_ROOT"),
+            help="The directory within which routes may reference files.",
+        ),
+    ] = None
+
+    templates: Annotated[
+        List[str],
+        cappa.Arg(
+            long="--template",
+            short="-t",
+            action=cappa.ArgAction.append,
+            default=cappa.Env("RESPONSAAS_TEMPLATES"),
+            parse=parse_paths,
+            help="A template file, or directory of template files, to load. "
+            "May be supplied multiple times.",
+        ),
+    ] = field(default_factory=list)
+
+    def __call__(self):
+        import uvicorn
+
+        shared_state = self.shared_state
+        if self.workers > 1 and not shared_state:
+            shared_state = os.path.join(tempfile.mkdtemp(), "responsaas.db")
+
+        # The app is configured through the environment, because each worker
+        # process imports it anew.
+        os.environ.update(
+            self.environ(
+                RESPONSAAS_SHARED_STATE=shared_state,
+                RESPONSAAS_NAMESPACE_TTL=self.namespace_ttl,
+                RESPONSAAS_MAX_NAMESPACES=self.max_namespaces,
+                RESPONSAAS_MAX_BYTES=self.max_bytes,
+                RESPONSAAS_REAP_INTERVAL=self.reap_interval,
+                RESPONSAAS_BODY_DIR=self.body_dir,
+                RESPONSAAS_FILE_ROOT=self.file_root,
+                RESPONSAAS_TEMPLATES=os.pathsep.join(self.templates) or None,
+                RESPONSAAS_LOG_LEVEL=self.log_level,
+                RESPONSAAS_DEBUG="1" if self.debug else None,
+            )
+        )
+
+        uvicorn.run(
+            "responsaas.main:app",
+            host=self.host,
+            port=self.port,
+            workers=self.workers,
+            loop=self.loop,
+            http=self.http,
+            backlog=self.backlog,
+            timeout_keep_alive=self.keep_alive,
+            log_level=self.log_level,
+            access_log=self.access_log,
+        )
+
+    @staticmethod
+    def environ(**values: object) -> Dict[str, str]:
+        return {name: str(value) for name, value in values.items() if value is not None}
+
+
+def main(argv: Optional[List[str]] = None):
+    cappa.invoke(Cli, argv=argv)
+
+
+if __name__ == "__main__":
+    main()
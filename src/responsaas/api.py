@@ -7,15 +7,84 @@ import pickle
 from dataclasses import dataclass, field
 from functools import partialmethod
 from re import Pattern
-from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, Union
 
 import requests
 from responses import matchers
 
+from responsaas import wire
+from responsaas.shaping import Shaping
+
 log = logging.getLogger(__name__)
 
 
 URLPatternType = Union[Pattern, str]
+ShapingType = Union[Shaping, Dict[str, Any]]
+
+
+def pickle_value(value: Any, *, use_msgpack: bool = False) -> Union[str, bytes]:
+    pickled = pickle.dumps(value)
+    if use_msgpack:
+        return pickled
+    return base64.b64encode(pickled).decode()
+
+
+def build_route(
+    method: str,
+    url: Optional[URLPatternType],
+    content_type: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    body: Optional[bytes] = None,
+    json: Optional[Any] = None,
+    status: Optional[int] = None,
+    match: Optional[List[Tuple[str, Any]]] = None,
+    *,
+    shaping: Optional[ShapingType] = None,
+    body_file: Optional[str] = None,
+    body_digest: Optional[str] = None,
+    use_msgpack: bool = False,
+) -> Dict[str, Any]:
+    """Build the payload describing a route, as sent to the server."""
+    matchers = None
+    if match:
+        matchers = [
+            (pickle_value(match, use_msgpack=use_msgpack), match_args)
+            for match, match_args in match
+        ]
+
+    pattern = None
+    if isinstance(url, Pattern):
+        pattern = pickle_value(url, use_msgpack=use_msgpack)
+        url = None
+
+    return {
+        "method": method,
+        "url": url,
+        "pattern": pattern,
+        "content_type": content_type,
+        "headers": headers,
+        "body": body,
+        "body_file": body_file,
+        "body_digest": body_digest,
+        "json": json,
+        "status": status,
+        "match": matchers,
+        "shaping": dump_shaping(shaping),
+    }
+
+
+def dump_shaping(shaping: Optional[ShapingType]) -> Optional[Dict[str, Any]]:
+    if shaping is None:
+        return None
+    return Shaping.model_validate(shaping).model_dump(mode="json", exclude_none=True)
+
+
+def decode_call(call: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode the bodies of a call returned by `query_calls`."""
+    for name in ("body", "response_body"):
+        if call.get(name) is not None:
+            call[name] = wire.decode_bytes(call[name])
+    return call
 
 
 @dataclass
@@ -25,12 +94,30 @@ class ResponsaasClient:
     session: requests.Session = field(default_factory=requests.Session)
     timeout: int = 10
 
+    # Whether to send requests as msgpack. This is enabled automatically once
+    # the server responds with msgpack, which it does only if it supports it.
+    use_msgpack: bool = False
+
     def _make_call(self, endpoint, *, json={}, namespace_id: Optional[str] = None):
         if namespace_id:
             json = {**json, "namespace_id": namespace_id}
 
         url = f"{self.server_url}/__responsaas__/{endpoint}"
-        response = self.session.post(url, json=json, timeout=self.timeout)
+        if self.use_msgpack:
+            response = self.session.post(
+                url,
+                data=wire.dumps(json),
+                headers={"Content-Type": wire.MSGPACK, "Accept": wire.MSGPACK},
+                timeout=self.timeout,
+            )
+        else:
+            headers = {}
+            if wire.msgpack is not None:
+                headers["Accept"] = f"{wire.MSGPACK}, application/json"
+            response = self.session.post(
+                url, json=json, headers=headers, timeout=self.timeout
+            )
+
         try:
             response.raise_for_status()
         except Exception:  # pragma: no cover
@@ -38,15 +125,44 @@ class ResponsaasClient:
             raise
         return response
 
+    def _call(self, endpoint, **kwargs) -> Any:
+        """Make a call, and decode the response content."""
+        response = self._make_call(endpoint, **kwargs)
+        if wire.is_msgpack(response.headers.get("Content-Type")):
+            self.use_msgpack = True
+            return wire.loads(response.content)
+        return response.json()
+
     def __del__(self):
         self.session.close()
 
 
 @dataclass
 class ResponsaasServer(ResponsaasClient):
+    @classmethod
+    def in_process(cls, app: Any = None, **kwargs: Any) -> ResponsaasServer:
+        """Dispatch requests straight into the server's ASGI app, in this process.
+
+        Requires the `server` extra. Namespaces' `session` also serves mocked
+        traffic in-process; see `responsaas.in_process` for other clients.
+
+        Examples:
+            >>> def test_foo():
+            ...     with ResponsaasServer.in_process().activate() as responsaas:
+            ...         responsaas.get("/foo", json={"foo": True})
+            ...         responsaas.session.get(responsaas.base_url + "/foo")
+        """
+        from responsaas.in_process import BASE_URL, mount
+
+        return cls(BASE_URL, session=mount(requests.Session(), app), **kwargs)
+
     @contextlib.contextmanager
-    def activate(self):
-        response = self._make_call("enter").json()
+    def activate(self, templates: Sequence[str] = ()):
+        """Enter a new namespace, starting with the routes of the given `templates`.
+
+        Templates are loaded by the server at startup (see `responsaas --template`).
+        """
+        response = self._call("enter", json={"templates": list(templates)})
         namespace_id = response["namespace_id"]
         try:
             yield Responsaas(
@@ -54,9 +170,93 @@ class ResponsaasServer(ResponsaasClient):
                 namespace_id=namespace_id,
                 session=self.session,
                 timeout=self.timeout,
+                use_msgpack=self.use_msgpack,
             )
         finally:
-            self._make_call("exit", namespace_id=namespace_id).json()
+            self._make_call("exit", namespace_id=namespace_id)
+
+    def enter(self, count: int, templates: Sequence[str] = ()) -> List[Responsaas]:
+        """Enter `count` new namespaces, in a single request.
+
+        Unlike `activate`, the namespaces must be exited (or released to a
+        `NamespacePool`) by the caller.
+        """
+        response = self._call(
+            "enter", json={"count": count, "templates": list(templates)}
+        )
+        return [
+            Responsaas(
+                self.server_url,
+                namespace_id=namespace["namespace_id"],
+                session=self.session,
+                timeout=self.timeout,
+                use_msgpack=self.use_msgpack,
+            )
+            for namespace in response["namespaces"]
+        ]
+
+
+@dataclass
+class NamespacePool:
+    """Namespaces entered in bulk, and reused rather than exited.
+
+    The first `acquire` enters `size` namespaces in a single request. Released
+    namespaces are reset by the server (including their shaping and profiling)
+    and returned to the pool. Once the pool is drained, namespaces are entered
+    individually.
+
+    Examples:
+        >>> pool = NamespacePool(ResponsaasServer("http://localhost:7564"))
+        >>> def test_foo():
+        ...     with pool.namespace() as responsaas:
+        ...         responsaas.get("/foo")
+    """
+
+    server: ResponsaasServer
+    size: int = 16
+    templates: Sequence[str] = ()
+
+    _idle: List[Responsaas] = field(default_factory=list, init=False, repr=False)
+    _filled: bool = field(default=False, init=False, repr=False)
+
+    def acquire(self) -> Responsaas:
+        if not self._filled:
+            self._idle.extend(self.server.enter(self.size, self.templates))
+            self._filled = True
+
+        if self._idle:
+            return self._idle.pop()
+        [responsaas] = self.server.enter(1, self.templates)
+        return responsaas
+
+    def release(self, responsaas: Responsaas) -> None:
+        """Reset a namespace, returning it to the pool.
+
+        If the namespace asserts that all requests are fired, and they weren't,
+        the server removes the namespace (rather than resetting it) and this raises.
+        """
+        if len(self._idle) >= self.size:
+            self.server._make_call("exit", namespace_id=responsaas.namespace_id)
+            return
+
+        self.server._make_call("release", namespace_id=responsaas.namespace_id)
+        self._idle.append(responsaas)
+
+    @contextlib.contextmanager
+    def namespace(self):
+        """Acquire a namespace for the duration of the context."""
+        responsaas = self.acquire()
+        try:
+            yield responsaas
+        finally:
+            self.release(responsaas)
+
+    def close(self) -> None:
+        """Exit the pool's idle namespaces."""
+        while self._idle:
+            responsaas = self._idle.pop()
+            self.server._make_call("exit", namespace_id=responsaas.namespace_id)
+        self._filled = False
 
 
 @dataclass
@@ -71,6 +271,8 @@ class Responsaas(ResponsaasClient):
     POST: Literal["POST"] = "POST"
     PUT: Literal["PUT"] = "PUT"
 
+    _batch: Optional[List[Dict[str, Any]]] = field(default=None, init=False, repr=False)
+
     @property
     def base_url(self) -> str:
         return f"{self.server_url}/{self.namespace_id}"
@@ -78,6 +280,174 @@ class Responsaas(ResponsaasClient):
     def reset(self) -> None:
         self._make_call("reset", namespace_id=self.namespace_id)
 
+    @contextlib.contextmanager
+    def clone(self):
+        """Enter a new namespace, starting with this namespace's routes and settings.
+
+        The server shares the routes between the namespaces until either changes
+        them, so cloning is cheap regardless of the number of routes. The clone
+        starts without calls, and `reset` restores the routes it was cloned with.
+
+        Examples:
+            >>> def test_foo(session_responsaas: Responsaas):
+            ...     with session_responsaas.clone() as responsaas:
+            ...         responsaas.get("/only-this-test")
+        """
+        response = self._call("clone", namespace_id=self.namespace_id)
+        namespace_id = response["namespace_id"]
+        try:
+            yield Responsaas(
+                self.server_url,
+                namespace_id=namespace_id,
+                session=self.session,
+                timeout=self.timeout,
+                use_msgpack=self.use_msgpack,
+            )
+        finally:
+            self._make_call("exit", namespace_id=namespace_id)
+
+    def profile(self, server_timing: bool = False, slowest: int = 0) -> None:
+        """Enable (or, called without arguments, disable) profiling of mocked requests.
+
+        Args:
+            server_timing: Add a `Server-Timing` header to every mocked response,
+                with the time spent in each phase of handling the request.
+            slowest: Record this many of the slowest requests (see
+                `slowest_requests`).
+        """
+        profiling = None
+        if server_timing or slowest:
+            profiling = {"server_timing": server_timing, "slowest": slowest}
+
+        self._make_call(
+            "profiling",
+            json={"profiling": profiling},
+            namespace_id=self.namespace_id,
+        )
+
+    def proxy(
+        self,
+        upstream: Optional[str] = None,
+        cassette: Optional[str] = None,
+        timeout: float = 30.0,
+    ) -> None:
+        """Forward requests which match no route to `upstream`, recording its responses.
+
+        Each recording is added to the namespace as a route, matching the same
+        method, path, query string, and body, so identical requests are served
+        from the recording. Called without an `upstream`, disables the proxy
+        (leaving recorded routes in place).
+
+        Args:
+            upstream: The base url of the upstream service.
+            cassette: A file, relative to the server's `RESPONSAAS_FILE_ROOT`, to
+                which recordings are also written. Cassettes are templates, so a
+                server started with `--template <cassette>` replays them.
+            timeout: Seconds to wait for the upstream to respond.
+        """
+        proxy = None
+        if upstream is not None:
+            proxy = {"upstream": upstream, "cassette": cassette, "timeout": timeout}
+
+        self._make_call("proxy", json={"proxy": proxy}, namespace_id=self.namespace_id)
+
+    def retain(
+        self,
+        bodies: Literal["keep", "truncate", "hash", "drop"] = "keep",
+        max_body: int = 1024,
+        max_calls: Optional[int] = None,
+    ) -> None:
+        """Limit what's retained of the namespace's calls (or, without arguments, don't).
+
+        Args:
+            bodies: What's retained of calls' request and response bodies: all of
+                them ("keep"), their first `max_body` bytes ("truncate"), their
+                sha256 digest ("hash"), or nothing ("drop").
+            max_body: The number of bytes of each body retained by "truncate".
+            max_calls: Retain only this many of the most recent calls.
+                `call_count`/`call_counts` still count every call.
+        """
+        retention = None
+        if bodies != "keep" or max_calls is not None:
+            retention = {"bodies": bodies, "max_body": max_body, "max_calls": max_calls}
+
+        self._make_call(
+            "retention", json={"retention": retention}, namespace_id=self.namespace_id
+        )
+
+    def slowest_requests(self) -> List[Dict[str, Any]]:
+        """Return the slowest requests recorded while profiling, slowest first.
+
+        Each includes its total and per-phase timings (in milliseconds), and the
+        registered route (and its matchers) which took longest to match against.
+        """
+        response = self._call("slowest", namespace_id=self.namespace_id)
+        return response["requests"]
+
+    def store_body(self, body: bytes) -> str:
+        """Upload a body to the server's body store, returning its digest.
+
+        The digest can be supplied as the `body_digest` of any route, in any
+        namespace, so that large bodies need only be sent (and stored) once.
+        """
+        response = self.session.post(
+            f"{self.server_url}/__responsaas__/bodies",
+            data=body,
+            headers={"Content-Type": "application/octet-stream"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["digest"]
+
+    def shape(self, shaping: Optional[ShapingType] = None, **kwargs: Any) -> None:
+        """Set the shaping applied to routes which don't specify their own.
+
+        Accepts either a `Shaping` or its fields as keyword arguments. Calling with
+        neither clears the namespace's shaping.
+
+        Examples:
+            >>> def test_slow(responsaas: Responsaas):
+            ...     responsaas.shape(latency=0.1, jitter=0.02, bandwidth=64_000)
+            ...     responsaas.get("/fast", body="fast", shaping={"latency": 0})
+        """
+        self._make_call(
+            "shaping",
+            json={"shaping": dump_shaping(shaping or kwargs or None)},
+            namespace_id=self.namespace_id,
+        )
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Buffer route changes, sending them to the server in a single request.
+
+        Within the context, ``add``, ``replace``, ``remove`` and ``upsert`` (and the
+        method-specific helpers like ``get``) are recorded rather than sent. Upon
+        exiting the context, the operations are applied by the server in order,
+        atomically. If the block raises, the buffered operations are discarded.
+
+        Examples:
+            >>> def test_foo(responsaas):
+            ...     with responsaas.batch():
+            ...         responsaas.get("/foo", json={"foo": True})
+            ...         responsaas.post("/bar", status=201)
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        self._batch = operations = []
+        try:
+            yield self
+        finally:
+            self._batch = None
+
+        if operations:
+            self._make_call(
+                "batch",
+                json={"operations": operations},
+                namespace_id=self.namespace_id,
+            )
+
     def add(self, *args: Any, **kwargs: Any):
         """Add a new response.
 
@@ -91,6 +461,13 @@ class Responsaas(ResponsaasClient):
         This is necessary because, in order to utilize arbitrary `match` function
         inputs, the function is pickled and sent over the wire. Thus, the `match`
         function itself must be pickleable.
+
+        Additionally, a `shaping` argument (a `Shaping`, or equivalent dict) delays
+        and/or throttles the delivery of the response (see `shape`).
+
+        Rather than `body`, large bodies can be supplied as `body_digest` (see
+        `store_body`), or `body_file`: the path of a file on the server, relative
+        to its `RESPONSAAS_FILE_ROOT`. Either is streamed from disk by the server.
         """
         return self._execute("add", *args, **kwargs)
 
@@ -108,6 +485,9 @@ class Responsaas(ResponsaasClient):
         If no response exists.  Responses are matched using ``method``and ``url``.
         The first matching response is replaced.
         """
+        if self._batch is not None:
+            return self._execute("upsert", *args, **kwargs)
+
         try:
             return self.replace(*args, **kwargs)
         except ValueError:
@@ -117,17 +497,98 @@ class Responsaas(ResponsaasClient):
         """Remove all matching responses previously added using ``add()``."""
         return self._execute("remove", *args, **kwargs)
 
-    def calls(self) -> list:
-        response = self._make_call("calls", namespace_id=self.namespace_id).json()
-        pickled_calls = response["calls"]
-        return pickle.loads(base64.b64decode(pickled_calls))  # noqa: S301
+    def calls(self, since: int = 0, limit: Optional[int] = None) -> list:
+        """Return the calls made against the namespace.
+
+        Arguments:
+            since: A cursor, as returned by `fetch_calls`, after which to return calls.
+            limit: The maximum number of calls to return.
+        """
+        calls, _ = self.fetch_calls(since, limit)
+        return calls
+
+    def fetch_calls(
+        self, since: int = 0, limit: Optional[int] = None
+    ) -> Tuple[list, int]:
+        """Return the calls made after the `since` cursor, and the next cursor."""
+        response = self._call(
+            "calls",
+            json={"since": since, "limit": limit},
+            namespace_id=self.namespace_id,
+        )
+        pickled_calls = wire.decode_bytes(response["calls"])
+        calls = pickle.loads(pickled_calls)  # noqa: S301
+        return calls, response["cursor"]
+
+    def query_calls(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        max_body: Optional[int] = None,
+        since: int = 0,
+        limit: Optional[int] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        """Return selected fields of the calls matching the `filters`.
+
+        Calls are filtered by the server, so only the matching calls are sent.
+
+        Arguments:
+            fields: The fields of each call to return: any of "method", "url",
+                "path", "query", "headers", "body", "route", "status",
+                "response_headers", and "response_body". Defaults to "method",
+                "url", "route", and "status".
+            max_body: Truncate returned bodies to this many bytes.
+            since: A cursor, as returned by `fetch_calls`, after which to search calls.
+            limit: The maximum number of calls to return.
+            filters: Any of `method`, `path_prefix`, `path_regex`, `query` (a
+                dict of query parameters), `headers` (a dict of request headers),
+                `status`, and `route` (i.e. "GET /foo", as with `call_counts`).
+
+        Examples:
+            >>> def test_foo(responsaas):
+            ...     calls = responsaas.query_calls(
+            ...         method="POST", path_prefix="/users/", fields=["url", "body"]
+            ...     )
+        """
+        query: Dict[str, Any] = {"since": since, "limit": limit, **filters}
+        if fields is not None:
+            query["fields"] = list(fields)
+        if max_body is not None:
+            query["max_body"] = max_body
+
+        response = self._call("query_calls", json=query, namespace_id=self.namespace_id)
+        return [decode_call(call) for call in response["calls"]]
+
+    def call_log(self) -> CallLog:
+        """Return a `CallLog`, which incrementally accumulates calls.
+
+        Examples:
+            >>> def test_foo(responsaas):
+            ...     log = responsaas.call_log()
+            ...     requests.get(responsaas.base_url + "/foo")
+            ...     new_calls = log.poll()
+        """
+        return CallLog(self)
 
     def call_count(self, url: str) -> int:
-        response = self._make_call(
+        response = self._call(
             "call_count", json={"url": url}, namespace_id=self.namespace_id
-        ).json()
+        )
         return response["call_count"]
 
+    def call_counts(self) -> Dict[str, Dict[str, int]]:
+        """Return counts of all calls, grouped a number of ways.
+
+        The result contains a mapping of counts for each of:
+
+        - `url`: The full url, including the query string (as with `call_count`).
+        - `path`: The url's path.
+        - `method_path`: The method and path, i.e. "GET /foo".
+        - `route`: The registered route the call matched, i.e. "GET /foo". Regex
+          routes are prefixed with "re:", i.e. "GET re:/foo/.*".
+        """
+        return self._call("call_counts", namespace_id=self.namespace_id)
+
     def assert_call_count(self, url: str, count: int):
         call_count = self.call_count(url)
         assert call_count == count
@@ -140,49 +601,36 @@ class Responsaas(ResponsaasClient):
     post = partialmethod(add, POST)
     put = partialmethod(add, PUT)
 
-    def _execute(
-        self,
-        action: str,
-        method: str,
-        url: Optional[URLPatternType],
-        content_type: Optional[str] = None,
-        headers: Optional[Dict[str, str]] = None,
-        body: Optional[bytes] = None,
-        json: Optional[Any] = None,
-        status: Optional[int] = None,
-        match: Optional[List[Tuple[str, Any]]] = None,
-    ):
-        matchers = None
-        if match:
-            matchers = [
-                (base64.b64encode(pickle.dumps(match)).decode(), match_args)
-                for match, match_args in match
-            ]
-
-        pattern = None
-        if isinstance(url, Pattern):
-            pattern = base64.b64encode(pickle.dumps(url)).decode()
-            url = None
-
-        return self._make_call(
-            action,
-            json={
-                "method": method,
-                "url": url,
-                "pattern": pattern,
-                "content_type": content_type,
-                "headers": headers,
-                "body": body,
-                "json": json,
-                "status": status,
-                "match": matchers,
-            },
-            namespace_id=self.namespace_id,
-        )
+    def _execute(self, action: str, *args: Any, **kwargs: Any):
+        route = build_route(*args, use_msgpack=self.use_msgpack, **kwargs)
+
+        if self._batch is not None:
+            self._batch.append({"action": action, **route})
+            return None
+
+        return self._make_call(action, json=route, namespace_id=self.namespace_id)
+
+
+@dataclass
+class CallLog:
+    """Accumulates a namespace's calls, only retrieving calls it hasn't yet seen."""
+
+    responsaas: Responsaas
+    cursor: int = 0
+    calls: list = field(default_factory=list)
+
+    def poll(self, limit: Optional[int] = None) -> list:
+        """Retrieve calls made since the last poll, returning only the new calls."""
+        calls, self.cursor = self.responsaas.fetch_calls(self.cursor, limit)
+        self.calls.extend(calls)
+        return calls
 
 
 __all__ = [
+    "CallLog",
     "matchers",
+    "NamespacePool",
     "ResponsaasServer",
     "Responsaas",
+    "Shaping",
 ]
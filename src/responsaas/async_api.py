@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import pickle
+from dataclasses import dataclass, field
+from functools import partialmethod
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+import httpx
+
+from responsaas import wire
+from responsaas.api import (
+    ShapingType,
+    build_route,
+    decode_call,
+    dump_shaping,
+    matchers,
+)
+
+log = logging.getLogger(__name__)
+
+
+def default_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+
+
+@dataclass
+class AsyncResponsaasClient:
+    server_url: str
+
+    client: httpx.AsyncClient = field(default_factory=default_client)
+    timeout: int = 10
+
+    # See `ResponsaasClient.use_msgpack`.
+    use_msgpack: bool = False
+
+    async def _make_call(
+        self, endpoint, *, json={}, namespace_id: Optional[str] = None
+    ) -> httpx.Response:
+        if namespace_id:
+            json = {**json, "namespace_id": namespace_id}
+
+        url = f"{self.server_url}/__responsaas__/{endpoint}"
+        if self.use_msgpack:
+            response = await self.client.post(
+                url,
+                content=wire.dumps(json),
+                headers={"Content-Type": wire.MSGPACK, "Accept": wire.MSGPACK},
+                timeout=self.timeout,
+            )
+        else:
+            headers = {}
+            if wire.msgpack is not None:
+                headers["Accept"] = f"{wire.MSGPACK}, application/json"
+            response = await self.client.post(
+                url, json=json, headers=headers, timeout=self.timeout
+            )
+
+        try:
+            response.raise_for_status()
+        except Exception:  # pragma: no cover
+            log.error(response.text, exc_info=True)
+            raise
+        return response
+
+    async def _call(self, endpoint, **kwargs) -> Any:
+        """Make a call, and decode the response content."""
+        response = await self._make_call(endpoint, **kwargs)
+        if wire.is_msgpack(response.headers.get("Content-Type")):
+            self.use_msgpack = True
+            return wire.loads(response.content)
+        return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+@dataclass
+class AsyncResponsaasServer(AsyncResponsaasClient):
+    @classmethod
+    def in_process(cls, app: Any = None, **kwargs: Any) -> AsyncResponsaasServer:
+        """Dispatch requests straight into the server's ASGI app, in this process.
+
+        See `ResponsaasServer.in_process`. Namespaces' `client` also serves
+        mocked traffic in-process.
+        """
+        from responsaas.in_process import BASE_URL, AsyncASGITransport
+
+        client = httpx.AsyncClient(transport=AsyncASGITransport(app))
+        return cls(BASE_URL, client=client, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def activate(self, templates: Sequence[str] = ()):
+        """Enter a new namespace, starting with the routes of the given `templates`."""
+        response = await self._call("enter", json={"templates": list(templates)})
+        namespace_id = response["namespace_id"]
+        try:
+            yield AsyncResponsaas(
+                self.server_url,
+                namespace_id=namespace_id,
+                client=self.client,
+                timeout=self.timeout,
+                use_msgpack=self.use_msgpack,
+            )
+        finally:
+            await self._make_call("exit", namespace_id=namespace_id)
+
+
+@dataclass
+class AsyncResponsaas(AsyncResponsaasClient):
+    """The asyncio equivalent of `Responsaas`.
+
+    Every method which communicates with the server must be awaited.
+
+    Examples:
+        >>> async def test_foo(async_responsaas):
+        ...     await async_responsaas.get("/foo", json={"foo": True})
+        ...     assert await async_responsaas.call_count("/foo") == 0
+    """
+
+    namespace_id: str = ""
+
+    DELETE: Literal["DELETE"] = "DELETE"
+    GET: Literal["GET"] = "GET"
+    HEAD: Literal["HEAD"] = "HEAD"
+    OPTIONS: Literal["OPTIONS"] = "OPTIONS"
+    PATCH: Literal["PATCH"] = "PATCH"
+    POST: Literal["POST"] = "POST"
+    PUT: Literal["PUT"] = "PUT"
+
+    _batch: Optional[List[Dict[str, Any]]] = field(default=None, init=False, repr=False)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.server_url}/{self.namespace_id}"
+
+    async def reset(self) -> None:
+        await self._make_call("reset", namespace_id=self.namespace_id)
+
+    @contextlib.asynccontextmanager
+    async def clone(self):
+        """Enter a new namespace, starting with this namespace's routes and settings."""
+        response = await self._call("clone", namespace_id=self.namespace_id)
+        namespace_id = response["namespace_id"]
+        try:
+            yield AsyncResponsaas(
+                self.server_url,
+                namespace_id=namespace_id,
+                client=self.client,
+                timeout=self.timeout,
+                use_msgpack=self.use_msgpack,
+            )
+        finally:
+            await self._make_call("exit", namespace_id=namespace_id)
+
+    async def profile(self, server_timing: bool = False, slowest: int = 0) -> None:
+        """Enable (or disable) profiling of mocked requests. See `Responsaas.profile`."""
+        profiling = None
+        if server_timing or slowest:
+            profiling = {"server_timing": server_timing, "slowest": slowest}
+
+        await self._make_call(
+            "profiling",
+            json={"profiling": profiling},
+            namespace_id=self.namespace_id,
+        )
+
+    async def proxy(
+        self,
+        upstream: Optional[str] = None,
+        cassette: Optional[str] = None,
+        timeout: float = 30.0,
+    ) -> None:
+        """Forward unmatched requests upstream, recording responses. See `Responsaas.proxy`."""
+        proxy = None
+        if upstream is not None:
+            proxy = {"upstream": upstream, "cassette": cassette, "timeout": timeout}
+
+        await self._make_call(
+            "proxy", json={"proxy": proxy}, namespace_id=self.namespace_id
+        )
+
+    async def retain(
+        self,
+        bodies: Literal["keep", "truncate", "hash", "drop"] = "keep",
+        max_body: int = 1024,
+        max_calls: Optional[int] = None,
+    ) -> None:
+        """Limit what's retained of the namespace's calls. See `Responsaas.retain`."""
+        retention = None
+        if bodies != "keep" or max_calls is not None:
+            retention = {"bodies": bodies, "max_body": max_body, "max_calls": max_calls}
+
+        await self._make_call(
+            "retention", json={"retention": retention}, namespace_id=self.namespace_id
+        )
+
+    async def slowest_requests(self) -> List[Dict[str, Any]]:
+        """Return the slowest requests recorded while profiling, slowest first."""
+        response = await self._call("slowest", namespace_id=self.namespace_id)
+        return response["requests"]
+
+    async def store_body(self, body: bytes) -> str:
+        """Upload a body to the server's body store, returning its digest."""
+        response = await self.client.post(
+            f"{self.server_url}/__responsaas__/bodies",
+            content=body,
+            headers={"Content-Type": "application/octet-stream"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["digest"]
+
+    async def shape(self, shaping: Optional[ShapingType] = None, **kwargs: Any) -> None:
+        """Set the shaping applied to routes which don't specify their own."""
+        await self._make_call(
+            "shaping",
+            json={"shaping": dump_shaping(shaping or kwargs or None)},
+            namespace_id=self.namespace_id,
+        )
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Buffer route changes, sending them to the server in a single request.
+
+        See `Responsaas.batch`.
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        self._batch = operations = []
+        try:
+            yield self
+        finally:
+            self._batch = None
+
+        if operations:
+            await self._make_call(
+                "batch",
+                json={"operations": operations},
+                namespace_id=self.namespace_id,
+            )
+
+    async def add(self, *args: Any, **kwargs: Any):
+        """Add a new response. See `Responsaas.add`."""
+        return await self._execute("add", *args, **kwargs)
+
+    async def replace(self, *args: Any, **kwargs: Any):
+        """Replace a response previously added using ``add()``."""
+        return await self._execute("replace", *args, **kwargs)
+
+    async def upsert(self, *args: Any, **kwargs: Any):
+        """Replace a response previously added using ``add()``, or adds the response."""
+        return await self._execute("upsert", *args, **kwargs)
+
+    async def remove(self, *args: Any, **kwargs: Any):
+        """Remove all matching responses previously added using ``add()``."""
+        return await self._execute("remove", *args, **kwargs)
+
+    async def calls(self, since: int = 0, limit: Optional[int] = None) -> list:
+        """Return the calls made against the namespace. See `Responsaas.calls`."""
+        calls, _ = await self.fetch_calls(since, limit)
+        return calls
+
+    async def fetch_calls(
+        self, since: int = 0, limit: Optional[int] = None
+    ) -> Tuple[list, int]:
+        """Return the calls made after the `since` cursor, and the next cursor."""
+        response = await self._call(
+            "calls",
+            json={"since": since, "limit": limit},
+            namespace_id=self.namespace_id,
+        )
+        pickled_calls = wire.decode_bytes(response["calls"])
+        calls = pickle.loads(pickled_calls)  # noqa: S301
+        return calls, response["cursor"]
+
+    async def query_calls(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        max_body: Optional[int] = None,
+        since: int = 0,
+        limit: Optional[int] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        """Return selected fields of matching calls. See `Responsaas.query_calls`."""
+        query: Dict[str, Any] = {"since": since, "limit": limit, **filters}
+        if fields is not None:
+            query["fields"] = list(fields)
+        if max_body is not None:
+            query["max_body"] = max_body
+
+        response = await self._call(
+            "query_calls", json=query, namespace_id=self.namespace_id
+        )
+        return [decode_call(call) for call in response["calls"]]
+
+    async def call_count(self, url: str) -> int:
+        response = await self._call(
+            "call_count", json={"url": url}, namespace_id=self.namespace_id
+        )
+        return response["call_count"]
+
+    async def call_counts(self) -> Dict[str, Dict[str, int]]:
+        """Return counts of all calls. See `Responsaas.call_counts`."""
+        return await self._call("call_counts", namespace_id=self.namespace_id)
+
+    async def assert_call_count(self, url: str, count: int):
+        call_count = await self.call_count(url)
+        assert call_count == count
+
+    delete = partialmethod(add, DELETE)
+    get = partialmethod(add, GET)
+    head = partialmethod(add, HEAD)
+    options = partialmethod(add, OPTIONS)
+    patch = partialmethod(add, PATCH)
+    post = partialmethod(add, POST)
+    put = partialmethod(add, PUT)
+
+    async def _execute(self, action: str, *args: Any, **kwargs: Any):
+        route = build_route(*args, use_msgpack=self.use_msgpack, **kwargs)
+
+        if self._batch is not None:
+            self._batch.append({"action": action, **route})
+            return None
+
+        return await self._make_call(action, json=route, namespace_id=self.namespace_id)
+
+
+__all__ = [
+    "AsyncResponsaas",
+    "AsyncResponsaasServer",
+    "matchers",
+]
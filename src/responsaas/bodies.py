@@ -0,0 +1,129 @@
+"""Storage for large response bodies, outside of the namespaces' registries.
+
+Bodies are kept on disk and served as streamed file responses, so they're never
+held in memory as a whole. Bodies are either:
+
+- Stored in the `BodyStore`, which is content-addressed (by sha256), so that an
+  identical body registered by any number of namespaces is only stored once.
+  Inline bodies larger than `BodyStore.threshold` are moved into the store
+  automatically.
+- Existing files on the server, referenced by their path relative to the
+  (opt-in) `BodyStore.file_root`.
+
+Stored bodies are not removed while the server runs, because they may be shared
+by any namespace. When no `path` is configured, the store lives in a temporary
+directory which is removed when the server exits.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from responsaas.operations import RouteSpec
+
+R = TypeVar("R", bound=RouteSpec)
+
+digest_re = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass
+class BodyStore:
+    path: Optional[str] = None
+
+    # The directory within which files may be referenced by routes' `body_file`.
+    # Referencing files is disabled if unset.
+    file_root: Optional[str] = None
+
+    # Inline bodies of at least this many bytes are moved into the store.
+    threshold: int = 64 * 1024
+
+    _tempdir: Optional[tempfile.TemporaryDirectory] = field(
+        default=None, init=False, repr=False
+    )
+
+    @property
+    def directory(self) -> str:
+        if self.path is None:
+            self._tempdir = tempfile.TemporaryDirectory(prefix="responsaas-")
+            self.path = self._tempdir.name
+        os.makedirs(self.path, exist_ok=True)
+        return self.path
+
+    def put(self, body: bytes) -> str:
+        """Store `body`, returning its digest."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = os.path.join(self.directory, digest)
+        if not os.path.exists(path):
+            # Write then rename, so concurrent writers never expose a partial body.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """Return the path of a stored body."""
+        path = os.path.join(self.directory, digest)
+        if not digest_re.match(digest) or not os.path.exists(path):
+            raise HTTPException(status_code=400, detail=f"Unknown body: {digest}")
+        return path
+
+    def resolve_file(self, name: str) -> str:
+        """Return the path of a file referenced by a route, relative to `file_root`."""
+        path = self.resolve_path(name)
+        if path is None or not os.path.isfile(path):
+            raise HTTPException(status_code=400, detail=f"Invalid body_file: {name}")
+        return path
+
+    def resolve_path(self, name: str) -> Optional[str]:
+        """Return the path of `name`, relative to `file_root`, if it's within it."""
+        if self.file_root is None:
+            raise HTTPException(
+                status_code=400, detail="Referencing server files is not enabled."
+            )
+
+        root = os.path.realpath(self.file_root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            return None
+        return path
+
+    def intern(self, route: R) -> R:
+        """Move a route's body out of the route, and into the store.
+
+        The resulting route's `body_file` is the absolute path of the body to serve.
+        """
+        if route.body_digest is not None:
+            path = self.get(route.body_digest)
+        elif route.body_file is not None:
+            path = self.resolve_file(route.body_file)
+        elif route.body is not None and len(route.body) >= self.threshold:
+            path = self.get(self.put(route.body))
+        else:
+            return route
+
+        return route.model_copy(update={"body": None, "body_file": path})
+
+
+def iter_bytes(body: bytes, chunk_size: int) -> Iterator[bytes]:
+    for start in range(0, len(body), chunk_size):
+        yield body[start : start + chunk_size]
+
+
+def iter_file(path: str, chunk_size: int) -> Iterator[bytes]:
+    """Read a file in chunks, through a memory map rather than buffered reads."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start : start + chunk_size]
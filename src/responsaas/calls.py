@@ -0,0 +1,258 @@
+"""Compact records of a namespace's calls, and their retention.
+
+`responses` records each call as the full `PreparedRequest` and
+`requests.Response`. Namespaces instead keep a `CallRecord` of each: only the
+parts of the request and response which are ever returned, with their bodies
+retained according to the namespace's `Retention`. The `requests` objects are
+reconstructed only when calls are retrieved.
+
+Responses served from a file (see `responsaas.bodies`) record the file's path,
+rather than its content, which is read back when calls are retrieved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Literal, Mapping, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+from requests import PreparedRequest, Response
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+from responses import Call, CallList, RequestsMock
+
+Bodies = Literal["keep", "truncate", "hash", "drop"]
+
+
+class Retention(BaseModel):
+    """A namespace's call log retention settings.
+
+    Args:
+        bodies: What's retained of calls' request and response bodies: all of
+            them ("keep"), their first `max_body` bytes ("truncate"), their
+            sha256 digest ("hash"), or nothing ("drop"). Their sizes are always
+            retained.
+        max_body: The number of bytes of each body retained by "truncate".
+        max_calls: Retain only this many of the most recent calls. Cursors
+            remain valid, skipping any discarded calls, and calls are still
+            counted (see `call_counts`).
+    """
+
+    bodies: Bodies = "keep"
+    max_body: int = Field(default=1024, ge=0)
+    max_calls: Optional[int] = Field(default=None, ge=1)
+
+    def retain(self, body: Optional[bytes]) -> Tuple[Optional[bytes], Optional[str]]:
+        """Return what's retained of a body, and its digest (if hashed)."""
+        if body is None or self.bodies == "keep":
+            return body, None
+        if self.bodies == "truncate":
+            return body[: self.max_body], None
+        if self.bodies == "hash":
+            return None, hashlib.sha256(body).hexdigest()
+        return None, None
+
+
+class CallRecord:
+    """The retained parts of a call's request and response.
+
+    `request` and `response` reconstruct (with bodies as retained) the objects
+    `responses` recorded.
+    """
+
+    __slots__ = (
+        "body",
+        "body_digest",
+        "body_size",
+        "error",
+        "headers",
+        "method",
+        "response_body",
+        "response_body_digest",
+        "response_body_file",
+        "response_body_size",
+        "response_headers",
+        "route",
+        "status",
+        "url",
+    )
+
+    def __init__(
+        self,
+        method: Optional[str],
+        url: Optional[str],
+        headers: Mapping[str, str],
+        body: Optional[bytes] = None,
+        body_size: int = 0,
+        body_digest: Optional[str] = None,
+        route: Optional[str] = None,
+        status: Optional[int] = None,
+        response_headers: Optional[Mapping[str, str]] = None,
+        response_body: Optional[bytes] = None,
+        response_body_size: int = 0,
+        response_body_digest: Optional[str] = None,
+        response_body_file: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.body_size = body_size
+        self.body_digest = body_digest
+        self.route = route
+        self.status = status
+        self.response_headers = response_headers
+        self.response_body = response_body
+        self.response_body_size = response_body_size
+        self.response_body_digest = response_body_digest
+        self.response_body_file = response_body_file
+        self.error = error
+
+    @classmethod
+    def from_call(cls, call: Call, retention: Optional[Retention] = None) -> CallRecord:
+        if retention is None:
+            retention = DEFAULT_RETENTION
+
+        request = call.request
+        body = to_bytes(request.body)
+        retained, digest = retention.retain(body)
+        record = cls(
+            request.method,
+            request.url,
+            # Neither headers mapping is modified once recorded, so they're kept
+            # as-is. A pre-rendered response's headers are shared by all its calls.
+            request.headers,
+            body=retained,
+            body_size=len(body or b""),
+            body_digest=digest,
+            route=getattr(request, "route", None),
+        )
+
+        response = call.response
+        if isinstance(response, Response):
+            record.status = response.status_code
+            record.response_headers = response.headers
+
+            body_file = getattr(request, "body_file", None)
+            if body_file:
+                record.retain_file(body_file, retention)
+            else:
+                content = response.content
+                record.response_body, record.response_body_digest = retention.retain(
+                    content
+                )
+                record.response_body_size = len(content or b"")
+        elif isinstance(response, Exception):
+            record.error = str(response)
+        return record
+
+    def retain_file(self, path: str, retention: Retention) -> None:
+        """Retain the body of a response served from the file at `path`."""
+        self.response_body_size = os.path.getsize(path)
+        if retention.bodies == "keep":
+            self.response_body_file = path
+        elif retention.bodies == "truncate":
+            with open(path, "rb") as f:
+                self.response_body = f.read(retention.max_body)
+        elif retention.bodies == "hash":
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self.response_body_digest = digest.hexdigest()
+
+    @property
+    def response_content(self) -> Optional[bytes]:
+        """The retained response body, read back from its file if it was served from one."""
+        if self.response_body_file is None:
+            return self.response_body
+
+        try:
+            with open(self.response_body_file, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @property
+    def size(self) -> int:
+        """An estimate of the memory retained by the record, in bytes."""
+        return (
+            len(self.url or "") + len(self.body or b"") + len(self.response_body or b"")
+        )
+
+    @property
+    def request(self) -> PreparedRequest:
+        request = PreparedRequest()
+        request.method = self.method
+        request.url = self.url
+        request.headers = CaseInsensitiveDict(self.headers)
+        request.body = self.body
+        # As `responses` sets them.
+        request.params = RequestsMock._parse_request_params(  # type: ignore[attr-defined]
+            None,  # type: ignore[arg-type]
+            request.path_url,
+        )
+        request.route = self.route  # type: ignore[attr-defined]
+        request.body_size = self.body_size  # type: ignore[attr-defined]
+        request.body_digest = self.body_digest  # type: ignore[attr-defined]
+        return request
+
+    @property
+    def response(self) -> Union[Response, Exception, None]:
+        if self.error is not None:
+            return ConnectionError(self.error)
+        if self.status is None:
+            return None
+
+        response = Response()
+        response.status_code = self.status
+        response.headers = CaseInsensitiveDict(self.response_headers)
+        response._content = self.response_content or b""
+        response.url = self.url or ""
+        response.body_size = self.response_body_size  # type: ignore[attr-defined]
+        response.body_digest = self.response_body_digest  # type: ignore[attr-defined]
+        return response
+
+    def to_call(self) -> Call:
+        request = self.request
+        response = self.response
+        if isinstance(response, Response):
+            response.request = request
+        return Call(request, response)  # type: ignore[arg-type]
+
+
+class CallCounter(CallList):
+    """A `CallList` which counts calls, without retaining them.
+
+    Routes' own call lists are only used for their length (`call_count`); the
+    namespace's call log retains the calls themselves.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, request: Any, response: Any) -> None:
+        self._count += 1
+
+    def add_call(self, call: Call) -> None:
+        self._count += 1
+
+    def reset(self) -> None:
+        self._count = 0
+
+
+def to_bytes(body: Any) -> Optional[bytes]:
+    if body is None or isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return bytes(body)
+
+
+DEFAULT_RETENTION = Retention()
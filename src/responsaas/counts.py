@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from re import Pattern
+from typing import Dict
+from urllib.parse import urlsplit
+
+from responses import BaseResponse
+
+from responsaas.calls import CallRecord
+
+
+def route_key(response: BaseResponse) -> str:
+    """Identify a registered response by its method and url (or pattern)."""
+    url = response.url
+    if isinstance(url, Pattern):
+        return f"{response.method} re:{url.pattern}"
+    return f"{response.method} {url}"
+
+
+@dataclass
+class CallCounts:
+    """Counts of a namespace's calls, maintained as calls are recorded.
+
+    Calls are counted by their full url (including the query string), by path,
+    by method and path (i.e. "GET /foo"), and by the registered response they
+    matched (see `route_key`).
+    """
+
+    url: Counter = field(default_factory=Counter)
+    path: Counter = field(default_factory=Counter)
+    method_path: Counter = field(default_factory=Counter)
+    route: Counter = field(default_factory=Counter)
+
+    def record(self, call: CallRecord):
+        url = call.url or ""
+        path = urlsplit(url).path
+
+        self.url[url] += 1
+        self.path[path] += 1
+        self.method_path[f"{call.method} {path}"] += 1
+
+        if call.route is not None:
+            self.route[call.route] += 1
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "url": dict(self.url),
+            "path": dict(self.path),
+            "method_path": dict(self.method_path),
+            "route": dict(self.route),
+        }
@@ -0,0 +1,280 @@
+"""Serving responsaas in-process, without the network.
+
+When tests run in the same process as the server's ASGI app, requests (both
+control plane calls, and mocked traffic) can be dispatched straight into the app,
+skipping sockets, uvicorn, and HTTP parsing. The app runs on an event loop in a
+background thread, shared by every transport:
+
+- `ASGIAdapter`: A `requests` transport adapter (see `mount`).
+- `ASGITransport`/`AsyncASGITransport`: `httpx` transports (requires `httpx`).
+
+Requests are addressed to `BASE_URL`, i.e. `http://responsaas/<namespace>/foo`.
+
+The app's lifespan isn't run, so namespaces are only reaped when created (see
+`State.max_namespaces`), rather than in the background.
+
+Requires the `server` extra.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from io import BytesIO
+from typing import Any, Coroutine, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests import PreparedRequest
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ReadTimeout
+from responses import _form_response
+from urllib3.response import HTTPHeaderDict
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+BASE_URL = "http://responsaas"
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class AppRunner:
+    """Runs an ASGI app's requests on an event loop in a background thread."""
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="responsaas", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, coroutine: Coroutine[Any, Any, T], timeout: Optional[float]) -> T:
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def dispatch(
+        self, method: str, url: str, headers: Headers, body: bytes
+    ) -> Coroutine[Any, Any, Tuple[int, Headers, bytes]]:
+        return dispatch(self.app, method, url, headers, body)
+
+
+_runners: Dict[Any, AppRunner] = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner(app: Any = None) -> AppRunner:
+    """Return the runner for `app` (defaulting to `responsaas.main.app`)."""
+    if app is None:
+        from responsaas.main import app
+
+    with _runners_lock:
+        runner = _runners.get(app)
+        if runner is None:
+            runner = _runners[app] = AppRunner(app)
+    return runner
+
+
+async def dispatch(
+    app: Any, method: str, url: str, headers: Headers, body: bytes
+) -> Tuple[int, Headers, bytes]:
+    """Make a request of an ASGI app, returning the response's status, headers and body."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": parts.scheme or "http",
+        "path": unquote(path),
+        "raw_path": path.encode("latin-1"),
+        "query_string": parts.query.encode("latin-1"),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": (parts.hostname, parts.port or 80),
+    }
+
+    request_sent = False
+    response_complete = asyncio.Event()
+    status = 500
+    response_headers: Headers = []
+    chunks: List[bytes] = []
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_complete.set()
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # Starlette re-raises (for the server to log) after sending a 500.
+        if not response_complete.is_set():
+            raise
+        log.error("Exception in ASGI application", exc_info=True)
+
+    return status, response_headers, b"".join(chunks)
+
+
+def encode_header(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("latin-1")
+
+
+def read_body(body: Any) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        return read_body(body.read())
+    return b"".join(read_body(chunk) for chunk in body)
+
+
+class ASGIAdapter(HTTPAdapter):
+    """A `requests` transport adapter which dispatches requests into an ASGI app.
+
+    Examples:
+        >>> def test_foo():
+        ...     session = requests.Session()
+        ...     session.mount(BASE_URL, ASGIAdapter())
+    """
+
+    def __init__(self, app: Any = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.runner = get_runner(app)
+
+    def send(  # type: ignore[override]
+        self, request: PreparedRequest, stream: bool = False, timeout: Any = None, **_
+    ) -> requests.Response:
+        assert request.method is not None
+        assert request.url is not None
+
+        headers = [(b"host", encode_header(urlsplit(request.url).netloc))]
+        headers.extend(
+            (encode_header(name).lower(), encode_header(value))
+            for name, value in request.headers.items()
+        )
+
+        if isinstance(timeout, tuple):
+            timeout = timeout[1]
+        try:
+            status, response_headers, body = self.runner.call(
+                self.runner.dispatch(
+                    request.method, request.url, headers, read_body(request.body)
+                ),
+                timeout,
+            )
+        except concurrent.futures.TimeoutError:
+            raise ReadTimeout(f"Read timed out. (read timeout={timeout})")
+
+        raw = _form_response(
+            BytesIO(body),
+            HTTPHeaderDict(
+                [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in response_headers
+                ]
+            ),
+            status,
+            request.method,
+        )
+        return self.build_response(request, raw)
+
+
+def mount(session: requests.Session, app: Any = None) -> requests.Session:
+    """Route a session's requests to `BASE_URL` into the app, in-process."""
+    session.mount(BASE_URL, ASGIAdapter(app))
+    return session
+
+
+try:
+    import httpx
+
+    class ASGITransport(httpx.BaseTransport):
+        """An `httpx` transport which dispatches requests into an ASGI app.
+
+        Examples:
+            >>> def test_foo():
+            ...     client = httpx.Client(transport=ASGITransport())
+        """
+
+        def __init__(self, app: Any = None):
+            self.runner = get_runner(app)
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            timeout = request.extensions.get("timeout", {}).get("read")
+            try:
+                status, headers, body = self.runner.call(
+                    self.runner.dispatch(
+                        request.method,
+                        str(request.url),
+                        [(name.lower(), value) for name, value in request.headers.raw],
+                        request.read(),
+                    ),
+                    timeout,
+                )
+            except concurrent.futures.TimeoutError:
+                raise httpx.ReadTimeout("Read timed out.", request=request)
+            return httpx.Response(status, headers=headers, content=body)
+
+    class AsyncASGITransport(httpx.AsyncBaseTransport):
+        """An async `httpx` transport which dispatches requests into an ASGI app.
+
+        Requests are handled on the app's own event loop, so that the app's
+        state is only ever accessed by one thread.
+        """
+
+        def __init__(self, app: Any = None):
+            self.runner = get_runner(app)
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            timeout = request.extensions.get("timeout", {}).get("read")
+            future = self.runner.submit(
+                self.runner.dispatch(
+                    request.method,
+                    str(request.url),
+                    [(name.lower(), value) for name, value in request.headers.raw],
+                    await request.aread(),
+                )
+            )
+            try:
+                status, headers, body = await asyncio.wait_for(
+                    asyncio.wrap_future(future), timeout
+                )
+            except asyncio.TimeoutError:
+                raise httpx.ReadTimeout("Read timed out.", request=request)
+            return httpx.Response(status, headers=headers, content=body)
+
+except ImportError:  # pragma: no cover
+    pass
@@ -1,14 +1,73 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
+import os
+from typing import Callable, Optional, TypeVar
 
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI
 
-from responsaas.state import State
+from responsaas.metrics import Metrics
+from responsaas.state import create_state
+from responsaas.wire import WireRoute
 
-logging.basicConfig(level=logging.DEBUG)
+log = logging.getLogger(__name__)
 
-state = State()
-app = FastAPI(debug=True)
+T = TypeVar("T")
+
+
+def env(name: str, parse: Callable[[str], T]) -> Optional[T]:
+    value = os.environ.get(name)
+    if not value:
+        return None
+    return parse(value)
+
+
+log_level = os.environ.get("RESPONSAAS_LOG_LEVEL")
+if log_level:
+    # uvicorn's "trace" level is more verbose than any of the stdlib's.
+    level = logging.DEBUG if log_level == "trace" else log_level.upper()
+    logging.basicConfig(level=level)
+
+state = create_state(
+    os.environ.get("RESPONSAAS_SHARED_STATE"),
+    namespace_ttl=env("RESPONSAAS_NAMESPACE_TTL", float),
+    max_namespaces=env("RESPONSAAS_MAX_NAMESPACES", int),
+    max_bytes=env("RESPONSAAS_MAX_BYTES", int),
+    body_dir=os.environ.get("RESPONSAAS_BODY_DIR"),
+    file_root=os.environ.get("RESPONSAAS_FILE_ROOT"),
+    templates=env("RESPONSAAS_TEMPLATES", lambda value: value.split(os.pathsep)) or (),
+)
+metrics = Metrics()
+reap_interval = env("RESPONSAAS_REAP_INTERVAL", float) or 30.0
+
+
+async def reap_namespaces(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = state.reap()
+        except Exception:  # pragma: no cover
+            log.exception("Failed to reap namespaces")
+        else:
+            if evicted:
+                log.info("Evicted %s namespaces", len(evicted))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    reaper = None
+    if state.evicts:
+        reaper = asyncio.create_task(reap_namespaces(reap_interval))
+
+    yield
+
+    if reaper:
+        reaper.cancel()
+
+
+app = FastAPI(debug=bool(env("RESPONSAAS_DEBUG", int)), lifespan=lifespan)
+router = APIRouter(route_class=WireRoute)
 
 from responsaas import routes  # noqa: F401, E402
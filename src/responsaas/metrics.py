@@ -0,0 +1,212 @@
+"""Server metrics, exposed by `/__responsaas__/metrics`.
+
+Metrics are maintained per server process.
+"""
+
+from __future__ import annotations
+
+import bisect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+from responsaas.state import Namespace, State
+
+# Upper bounds (in seconds) of the histogram buckets.
+BUCKETS: Tuple[float, ...] = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+@dataclass
+class Histogram:
+    buckets: Tuple[float, ...] = BUCKETS
+    counts: List[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            # The final count is of values beyond the largest bucket.
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Return the (`le`, count) pairs of each bucket, as Prometheus expects."""
+        result = []
+        total = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "buckets": dict(self.cumulative()),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+@dataclass
+class Metrics:
+    """Counters and histograms updated while handling mocked requests."""
+
+    requests: int = 0
+    misses: int = 0
+
+    # The time spent by `responses` matching a request, and building its response.
+    match_seconds: Histogram = field(default_factory=Histogram)
+
+    # The time from receiving a request to returning its response.
+    handler_seconds: Histogram = field(default_factory=Histogram)
+
+    def record_match(self, namespace: Namespace, duration: float, matched: bool):
+        self.requests += 1
+        namespace.requests += 1
+        if not matched:
+            self.misses += 1
+            namespace.misses += 1
+        self.match_seconds.observe(duration)
+
+    def record_handler(self, duration: float):
+        self.handler_seconds.observe(duration)
+
+    def to_dict(self, state: State) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "namespaces": len(state.namespaces),
+            "requests": self.requests,
+            "misses": self.misses,
+            "miss_rate": self.misses / self.requests if self.requests else 0.0,
+            "match_seconds": self.match_seconds.to_dict(),
+            "handler_seconds": self.handler_seconds.to_dict(),
+            "namespace": {
+                namespace.id: namespace_metrics(namespace, now)
+                for namespace in state.namespaces.values()
+            },
+        }
+
+    def to_prometheus(self, state: State) -> str:
+        namespaces = list(state.namespaces.values())
+        lines = [
+            *metric("namespaces", "gauge", "Live namespaces.", [("", len(namespaces))]),
+            *metric(
+                "requests_total",
+                "counter",
+                "Mocked requests handled.",
+                [("", self.requests)],
+            ),
+            *metric(
+                "misses_total",
+                "counter",
+                "Mocked requests which matched no registered response.",
+                [("", self.misses)],
+            ),
+            *metric(
+                "namespace_requests_total",
+                "counter",
+                "Mocked requests handled, by namespace.",
+                labelled(namespaces, lambda namespace: namespace.requests),
+            ),
+            *metric(
+                "namespace_misses_total",
+                "counter",
+                "Mocked requests which matched no registered response, by namespace.",
+                labelled(namespaces, lambda namespace: namespace.misses),
+            ),
+            *metric(
+                "namespace_registered_responses",
+                "gauge",
+                "Registered responses, by namespace.",
+                labelled(namespaces, registry_size),
+            ),
+            *metric(
+                "namespace_calls",
+                "gauge",
+                "Calls retained in the call log, by namespace.",
+                labelled(namespaces, lambda namespace: len(namespace.calls)),
+            ),
+            *metric(
+                "namespace_bytes",
+                "gauge",
+                "Estimated memory retained by routes and calls, by namespace.",
+                labelled(namespaces, lambda namespace: namespace.size),
+            ),
+            *histogram(
+                "match_seconds",
+                "Time spent matching requests and building responses.",
+                self.match_seconds,
+            ),
+            *histogram(
+                "handler_seconds",
+                "Time from receiving a mocked request to returning its response.",
+                self.handler_seconds,
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def registry_size(namespace: Namespace) -> int:
+    return len(namespace.responses.registered())
+
+
+def namespace_metrics(namespace: Namespace, now: float) -> Dict[str, Any]:
+    age = now - namespace.created
+    return {
+        "requests": namespace.requests,
+        "requests_per_second": namespace.requests / age if age > 0 else 0.0,
+        "misses": namespace.misses,
+        "miss_rate": (
+            namespace.misses / namespace.requests if namespace.requests else 0.0
+        ),
+        "registered_responses": registry_size(namespace),
+        "calls": len(namespace.calls),
+        "bytes": namespace.size,
+        "routes": dict(namespace.counts.route),
+    }
+
+
+def labelled(namespaces: Iterable[Namespace], value) -> List[Tuple[str, Any]]:
+    return [
+        (f'namespace="{namespace.id}"', value(namespace)) for namespace in namespaces
+    ]
+
+
+def metric(
+    name: str, kind: str, help: str, samples: Iterable[Tuple[str, Any]]
+) -> List[str]:
+    name = f"responsaas_{name}"
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+
+def histogram(name: str, help: str, histogram: Histogram) -> List[str]:
+    name = f"responsaas_{name}"
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for bound, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+    lines.append(f"{name}_sum {histogram.sum}")
+    lines.append(f"{name}_count {histogram.count}")
+    return lines
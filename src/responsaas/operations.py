@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import functools
+import pickle
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field
+from responses import RequestsMock
+
+from responsaas.rendering import StaticResponse
+from responsaas.shaping import Shaping
+from responsaas.wire import decode_bytes
+
+Action = Literal["add", "replace", "remove", "upsert"]
+Operations = Iterable[Tuple[Action, "RouteSpec"]]
+
+# Pickled values are base64 encoded when sent as JSON, and raw when sent as msgpack.
+Pickled = Union[str, bytes]
+
+
+class RouteSpec(BaseModel):
+    url: Optional[str] = None
+    pattern: Optional[Pickled] = None
+    method: Optional[str] = "GET"
+    content_type: Optional[str] = None
+    headers: Optional[Dict[str, str]] = None
+    body: Optional[bytes] = None
+
+    # Serve the body from a file rather than `body`. See `responsaas.bodies`.
+    body_file: Optional[str] = None
+    body_digest: Optional[str] = None
+    json_body: Optional[Any] = Field(None, alias="json")
+    status: Optional[int] = Field(None)
+    match: Optional[List[Tuple[Pickled, Any]]] = None
+    shaping: Optional[Shaping] = None
+
+
+class Operation(RouteSpec):
+    action: Action
+
+
+@functools.lru_cache(maxsize=1024)
+def unpickle(payload: Pickled) -> Any:
+    """Unpickle a matcher function or url pattern.
+
+    Clients tend to send the same handful of matchers and patterns over and over,
+    so the result is cached by the pickled payload. Matcher functions and compiled
+    patterns are immutable, so sharing them between namespaces is safe.
+    """
+    return pickle.loads(decode_bytes(payload))  # noqa: S301
+
+
+def unpickle_cache_info() -> Dict[str, Optional[int]]:
+    info = unpickle.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
+
+def collect_responses_kwargs(payload: RouteSpec):
+    if payload.pattern:
+        url = unpickle(payload.pattern)
+    else:
+        url = payload.url
+
+    kwargs: Dict[str, Any] = {
+        "method": payload.method,
+        "url": url,
+    }
+
+    # responses uses kwargs dynamically to determine sent fields. We cannot
+    # "just" send None for these.
+
+    if payload.body is not None:
+        kwargs["body"] = payload.body
+
+    if payload.json_body is not None:
+        kwargs["json"] = payload.json_body
+
+    if payload.status is not None:
+        kwargs["status"] = payload.status
+
+    if payload.headers is not None:
+        kwargs["headers"] = payload.headers
+
+    if payload.content_type is not None:
+        kwargs["content_type"] = payload.content_type
+
+    if payload.shaping is not None:
+        kwargs["shaping"] = payload.shaping
+
+    if payload.body_file is not None:
+        kwargs["body_file"] = payload.body_file
+
+    if payload.match is not None:
+        kwargs["match"] = []
+
+        for matcher, *match_args in payload.match:
+            matcher_fn = unpickle(matcher)
+            kwargs["match"].append(matcher_fn(*match_args))
+
+    return kwargs
+
+
+def apply_operation(responses: RequestsMock, action: str, kwargs: Dict[str, Any]):
+    # `replace`, `remove`, and `upsert` only accept the method positionally.
+    method = kwargs.pop("method")
+    shaping = kwargs.pop("shaping", None)
+    body_file = kwargs.pop("body_file", None)
+
+    if action == "remove":
+        return responses.remove(method, **kwargs)
+
+    # Routes are constructed here, rather than by `responses`, so that they're
+    # pre-rendered. See `responsaas.rendering`.
+    response = getattr(responses, action)(StaticResponse(method, **kwargs))
+    if shaping is not None:
+        response.shaping = shaping
+    if body_file is not None:
+        response.body_file = body_file
+    return response
@@ -0,0 +1,113 @@
+"""Timing of the phases of handling a mocked request.
+
+Timing is opt-in per namespace (see `Profiling`), and otherwise costs nothing.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from requests import PreparedRequest
+from responses import BaseResponse
+
+from responsaas.counts import route_key
+
+PHASES = ("body", "prepare", "registry", "matcher", "upstream", "delay", "response")
+
+
+class Profiling(BaseModel):
+    """A namespace's profiling settings.
+
+    Args:
+        server_timing: Add a `Server-Timing` header, describing the time spent in
+            each phase, to every response.
+        slowest: Record this many of the slowest requests, and their timings.
+    """
+
+    server_timing: bool = False
+    slowest: int = Field(0, ge=0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.server_timing or self.slowest > 0
+
+
+@dataclass
+class Timings:
+    """The time spent (in seconds) in each phase of handling a request.
+
+    - `body`: Receiving the request body.
+    - `prepare`: Building the `PreparedRequest` handed to `responses`.
+    - `registry`: Finding candidate responses in the registry.
+    - `matcher`: Evaluating candidate responses' url, method, and `match` functions.
+    - `upstream`: Recording the response of a proxy's upstream (see `responsaas.proxy`).
+    - `delay`: Delays imposed by shaping.
+    - `response`: Building the response.
+    """
+
+    phases: Dict[str, float] = field(default_factory=dict)
+
+    # The candidate response whose matching took the longest.
+    dominant: Optional[Dict[str, Any]] = None
+
+    start: float = field(default_factory=time.perf_counter)
+    _last: float = field(default=0.0, init=False, repr=False)
+
+    # Time attributed (via `add`) to phases since the last `mark`.
+    _added: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self):
+        self._last = self.start
+
+    def mark(self, phase: str):
+        """Attribute the time since the previous mark to `phase`."""
+        now = time.perf_counter()
+        self.add(phase, now - self._last - self._added)
+        self._last = now
+        self._added = 0.0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self._added += seconds
+
+    def matches(
+        self, response: BaseResponse, request: PreparedRequest
+    ) -> Tuple[bool, str]:
+        """Time `response.matches`, tracking the slowest response to match against."""
+        start = time.perf_counter()
+        result = response.matches(request)
+        duration = time.perf_counter() - start
+
+        self.add("matcher", duration)
+        if self.dominant is None or duration * 1000 > self.dominant["ms"]:
+            self.dominant = {
+                "route": route_key(response),
+                "matchers": [
+                    getattr(matcher, "__qualname__", repr(matcher))
+                    for matcher in response.match
+                ],
+                "ms": duration * 1000,
+            }
+        return result
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+    def server_timing(self) -> str:
+        phases = sorted(self.phases.items(), key=lambda item: PHASES.index(item[0]))
+        return ", ".join(
+            f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in phases
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": self.total * 1000,
+            "phases_ms": {
+                phase: seconds * 1000 for phase, seconds in self.phases.items()
+            },
+            "dominant": self.dominant,
+        }
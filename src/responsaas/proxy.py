@@ -0,0 +1,161 @@
+"""Record-and-replay of an upstream service.
+
+A namespace with `Proxy` settings forwards requests which match no registered
+route to its `upstream`, and records the upstream's response as a route in the
+namespace; so identical requests (by method, path, query string, and body) are
+then served from the recording.
+
+Recordings can also be written to a cassette file: a template (see
+`responsaas.templates`), which a server can load to replay the recordings
+without the upstream.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from requests import PreparedRequest
+from responses import matchers
+
+from responsaas.operations import RouteSpec
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+HOP_BY_HOP = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "te",
+        "trailers",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+
+# Set by `requests` for the forwarded request.
+UNFORWARDED = HOP_BY_HOP | {"host", "content-length"}
+
+# `requests` decodes the body, and the length is set when serving the recording.
+# The content type is recorded separately.
+UNRECORDED = HOP_BY_HOP | {"content-encoding", "content-length", "content-type"}
+
+session = requests.Session()
+
+
+class Proxy(BaseModel):
+    """A namespace's record-and-replay settings.
+
+    Args:
+        upstream: The base url to which unmatched requests are forwarded.
+        cassette: A file, relative to the server's `RESPONSAAS_FILE_ROOT`, to
+            which recordings are also written, as a template.
+        timeout: Seconds to wait for the upstream to respond.
+    """
+
+    upstream: str
+    cassette: Optional[str] = None
+    timeout: float = Field(30.0, gt=0)
+
+
+def record(
+    proxy: Proxy, request: PreparedRequest, cassette: Optional[str] = None
+) -> RouteSpec:
+    """Forward a request to the upstream, returning a route which replays its response.
+
+    If `cassette` (the resolved path of the proxy's cassette) is given, the
+    route is also written to it.
+    """
+    response = forward(proxy, request)
+
+    assert request.url is not None
+    path, _, query = request.url.partition("?")
+    match: List[Tuple[str, Any]] = [("query_string_matcher", query)]
+    body = request.body
+    if body:
+        try:
+            text = body.decode("utf-8") if isinstance(body, bytes) else str(body)
+        except UnicodeDecodeError:
+            # `body_matcher` only compares text, so binary bodies aren't matched.
+            pass
+        else:
+            match.append(("body_matcher", text))
+
+    route: Dict[str, Any] = {
+        "method": request.method,
+        "url": path,
+        "status": response.status_code,
+        "content_type": response.headers.get("Content-Type"),
+        "headers": {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in UNRECORDED
+        },
+    }
+    if cassette is not None:
+        write_cassette(cassette, {**route, "match": match}, response.content)
+
+    return RouteSpec(
+        **route,
+        body=response.content,
+        match=[(pickle.dumps(getattr(matchers, name)), args) for name, args in match],
+    )
+
+
+def forward(proxy: Proxy, request: PreparedRequest) -> requests.Response:
+    assert request.method is not None
+    headers = {
+        name: value
+        for name, value in request.headers.items()
+        if name.lower() not in UNFORWARDED
+    }
+    try:
+        return session.request(
+            request.method,
+            proxy.upstream.rstrip("/") + str(request.url),
+            headers=headers,
+            data=request.body,
+            timeout=proxy.timeout,
+            allow_redirects=False,
+        )
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"Upstream request failed: {e}")
+
+
+def write_cassette(path: str, route: Dict[str, Any], body: bytes):
+    """Append a route to a cassette (a template file), creating it if necessary."""
+    try:
+        route["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        # Binary bodies are written alongside the cassette, by digest.
+        bodies = f"{os.path.basename(path)}.bodies"
+        os.makedirs(os.path.join(os.path.dirname(path), bodies), exist_ok=True)
+        name = os.path.join(bodies, hashlib.sha256(body).hexdigest())
+        with open(os.path.join(os.path.dirname(path), name), "wb") as f:
+            f.write(body)
+        route["body_file"] = name
+
+    # Every server process may record to the same cassette.
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+        f.seek(0)
+        content = f.read()
+        cassette = json.loads(content) if content.strip() else {"routes": []}
+        cassette["routes"].append(route)
+
+        f.seek(0)
+        f.truncate()
+        json.dump(cassette, f, indent=2)
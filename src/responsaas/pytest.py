@@ -1,14 +1,21 @@
+import os
+import re
+import zlib
 from typing import (
+    AsyncGenerator,
+    Dict,
     Generator,
+    List,
     Literal,
     Optional,
     Protocol,
+    Sequence,
     Union,
 )
 
 import pytest
 
-from responsaas.api import Responsaas, ResponsaasServer
+from responsaas.api import NamespacePool, Responsaas, ResponsaasServer
 
 Scope = Union[
     Literal["session"],
@@ -28,37 +35,176 @@ def responsaas_server():  # pragma: no cover
     return None
 
 
+def resolve_server_url(
+    responsaas_server: Union[str, HasBaseUrl, None], server_url: Optional[str]
+) -> str:
+    if responsaas_server is not None:
+        if isinstance(responsaas_server, str):
+            server_url = responsaas_server
+
+        else:
+            server_url = responsaas_server.base_url
+
+    if server_url is None:
+        raise ValueError(
+            "Either the `server_url` argument must be supplied, or "
+            "the `responsaas_server` fixture must be defined."
+        )
+    return server_url
+
+
 def create_responsaas_fixture(
-    *, scope: Scope = "function", server_url: Optional[str] = None
+    *,
+    scope: Scope = "function",
+    server_url: Optional[str] = None,
+    templates: Sequence[str] = (),
+    clone: Optional[str] = None,
+    pool: int = 0,
+    in_process: bool = False,
 ):
+    """Produce a `Responsaas` fixture.
+
+    Each use of the fixture enters a new namespace, starting with the routes
+    of the given server-side `templates`.
+
+    If `pool` is given, namespaces are instead acquired from a `NamespacePool`
+    of that size (entered in bulk, on first use), and reset upon release rather
+    than exited. The pool is closed when the test session ends.
+
+    Alternatively, `clone` names another (i.e. broader scoped) `Responsaas`
+    fixture, whose namespace each use of the fixture clones (see `Responsaas.clone`).
+
+    If `in_process`, the server's ASGI app is run in this process (which requires
+    the `server` extra), rather than requiring a `responsaas_server`. Mocked
+    traffic is then sent with the namespace's `session` (see
+    `ResponsaasServer.in_process`). Entering namespaces in-process is cheap, so
+    `pool` is not supported.
+
+    Examples:
+        >>> @pytest.fixture(scope="session")
+        ... def session_responsaas(responsaas_server):
+        ...     with ResponsaasServer(responsaas_server.base_url).activate() as responsaas:
+        ...         responsaas.get("/common", json={"common": True})
+        ...         yield responsaas
+        >>> responsaas = create_responsaas_fixture(clone="session_responsaas")
+    """
+    if clone is not None:
+        parent_name = clone
+
+        @pytest.fixture(scope=scope)
+        def cloned_responsaas(
+            request: pytest.FixtureRequest,
+        ) -> Generator[Responsaas, None, None]:
+            parent: Responsaas = request.getfixturevalue(parent_name)
+            with parent.clone() as scoped:
+                yield scoped
+
+        return cloned_responsaas
+
+    if in_process:
+        if pool:
+            raise ValueError("`pool` is not supported `in_process`.")
+
+        @pytest.fixture(scope=scope)
+        def in_process_responsaas() -> Generator[Responsaas, None, None]:
+            with ResponsaasServer.in_process().activate(templates) as scoped:
+                yield scoped
+
+        return in_process_responsaas
+
+    if pool:
+        pools: Dict[str, NamespacePool] = {}
+
+        @pytest.fixture(scope=scope)
+        def pooled_responsaas(
+            responsaas_server: Union[str, HasBaseUrl, None],
+            request: pytest.FixtureRequest,
+        ) -> Generator[Responsaas, None, None]:
+            url = resolve_server_url(responsaas_server, server_url)
+
+            namespace_pool = pools.get(url)
+            if namespace_pool is None:
+                namespace_pool = pools[url] = NamespacePool(
+                    ResponsaasServer(url), size=pool, templates=templates
+                )
+                request.config.add_cleanup(namespace_pool.close)
+
+            with namespace_pool.namespace() as scoped:
+                yield scoped
+
+        return pooled_responsaas
+
     @pytest.fixture(scope=scope)
     def responsaas(
         responsaas_server: Union[str, HasBaseUrl, None],
     ) -> Generator[Responsaas, None, None]:
-        nonlocal server_url
+        url = resolve_server_url(responsaas_server, server_url)
 
-        if responsaas_server is not None:
-            if isinstance(responsaas_server, str):
-                server_url = responsaas_server
+        responsaas = ResponsaasServer(url)
+        with responsaas.activate(templates) as scoped:
+            yield scoped
 
-            else:
-                server_url = responsaas_server.base_url
+    return responsaas
 
-        if server_url is None:
-            raise ValueError(
-                "Either the `server_url` argument must be supplied, or "
-                "the `responsaas_server` fixture must be defined."
-            )
 
-        responsaas = ResponsaasServer(server_url)
-        with responsaas.activate() as scoped:
-            yield scoped
+def create_async_responsaas_fixture(
+    *,
+    scope: Scope = "function",
+    server_url: Optional[str] = None,
+    templates: Sequence[str] = (),
+    in_process: bool = False,
+):
+    """Produce an `AsyncResponsaas` fixture.
 
-    return responsaas
+    The fixture is an async generator, so it requires an async test runner
+    plugin (e.g. `anyio` or `pytest-asyncio`). Requires the `async` extra.
+
+    If `in_process`, the server's ASGI app is run in this process, as with
+    `create_responsaas_fixture`. Mocked traffic is then sent with the
+    namespace's `client`.
+    """
+    from responsaas.async_api import AsyncResponsaas, AsyncResponsaasServer
+
+    try:
+        import pytest_asyncio  # type: ignore[import-not-found,unused-ignore]
+
+        fixture = pytest_asyncio.fixture
+    except ImportError:  # pragma: no cover
+        fixture = pytest.fixture
+
+    if in_process:
+
+        @fixture(scope=scope)
+        async def in_process_async_responsaas() -> (
+            AsyncGenerator[AsyncResponsaas, None]
+        ):
+            server = AsyncResponsaasServer.in_process()
+            try:
+                async with server.activate(templates) as scoped:
+                    yield scoped
+            finally:
+                await server.aclose()
+
+        return in_process_async_responsaas
+
+    @fixture(scope=scope)
+    async def async_responsaas(
+        responsaas_server: Union[str, HasBaseUrl, None],
+    ) -> AsyncGenerator[AsyncResponsaas, None]:
+        url = resolve_server_url(responsaas_server, server_url)
+
+        server = AsyncResponsaasServer(url)
+        try:
+            async with server.activate(templates) as scoped:
+                yield scoped
+        finally:
+            await server.aclose()
+
+    return async_responsaas
 
 
 try:
-    from pytest_mock_resources.config import DockerContainerConfig
+    from pytest_mock_resources.config import DockerContainerConfig, get_env_config
     from pytest_mock_resources.container.base import ContainerCheckFailed, get_container
 
     class ResponsaasConfig(DockerContainerConfig):
@@ -73,16 +219,40 @@ try:
                 Defaults to :code:`5532`.
             ci_port (int): The port to bind the container to when a CI environment is detected.
                 Defaults to :code:`5432`.
+            instance_ports (list[int]): The ports of multiple server instances (each
+                its own container), between which pytest-xdist workers are spread.
+                Defaults to just :code:`port`.
         """
 
         name = "responsaas"
 
-        _fields = {"image", "host", "port"}  # noqa: RUF012
+        _fields = {"image", "host", "port", "instance_ports"}  # noqa: RUF012
         _fields_defaults = {  # noqa: RUF012
             "image": "dancardin/responsaas:latest",
             "port": 7564,
         }
 
+        # Set on the configs returned by `instances`, each of which is a single
+        # instance whose port is fixed, regardless of `PMR_RESPONSAAS_*`.
+        _instance_port: Optional[int] = None
+
+        @property
+        def port(self):
+            if self._instance_port is not None:
+                return self._instance_port
+            return super().port
+
+        @property
+        def instance_ports(self):
+            if self._instance_port is not None:
+                return None
+
+            # As `fallback`: the environment, then the constructor's argument.
+            value = get_env_config(self.name, "instance_ports")
+            if value is None and self.has("instance_ports"):
+                value = self.get("instance_ports")
+            return value
+
         @property
         def base_url(self):
             return f"http://{self.host}:{self.port}"
@@ -90,26 +260,68 @@ try:
         def ports(self):
             return {7564: self.port}
 
+        def instances(self) -> List["ResponsaasConfig"]:
+            """Return the config of each server instance."""
+            if self._instance_port is not None:
+                return [self]
+
+            ports = self.instance_ports or [self.port]
+            if isinstance(ports, str):
+                # From the environment, i.e. `PMR_RESPONSAAS_INSTANCE_PORTS=7564,7565`.
+                ports = ports.split(",")
+
+            instances = []
+            for port in ports:
+                instance = ResponsaasConfig(image=self.image, host=self.host)
+                instance._instance_port = int(port)
+                instances.append(instance)
+            return instances
+
+        def for_worker(self, worker_id: Optional[str] = None) -> "ResponsaasConfig":
+            """Return the config of the instance used by a pytest-xdist worker.
+
+            Workers are assigned instances round-robin, by their number (i.e. "gw3").
+            Defaults to the current worker.
+            """
+            if worker_id is None:
+                worker_id = os.environ.get("PYTEST_XDIST_WORKER", "")
+
+            instances = self.instances()
+            return instances[worker_index(worker_id) % len(instances)]
+
         def check_fn(self):
             import requests
 
-            try:
-                requests.post(self.base_url + "/check", timeout=10)
-            except requests.exceptions.RequestException:
-                raise ContainerCheckFailed(
-                    "Unable to connect to a presumed responsaas test container via given config: {}".format(
-                        self
+            for instance in self.instances():
+                try:
+                    requests.post(instance.base_url + "/check", timeout=10)
+                except requests.exceptions.RequestException:
+                    raise ContainerCheckFailed(
+                        "Unable to connect to a presumed responsaas test container via given config: {}".format(
+                            instance
+                        )
                     )
-                )
+
+    def worker_index(worker_id: str) -> int:
+        match = re.fullmatch(r"gw(\d+)", worker_id)
+        if match:
+            return int(match.group(1))
+        return zlib.crc32(worker_id.encode())
 
     def create_responsaas_server_fixture(
         config: ResponsaasConfig = ResponsaasConfig(), *, scope: Scope = "session"
     ):
+        """Produce a fixture which starts (if necessary) a responsaas container.
+
+        If `config` has multiple `instance_ports`, each pytest-xdist worker starts
+        and uses only the instance it's assigned (see `ResponsaasConfig.for_worker`).
+        """
+
         @pytest.fixture(scope=scope)
         def responsaas_server(pytestconfig):
-            for _ in get_container(pytestconfig, config):
-                yield config
-            # yield from get_container(pytestconfig, config)
+            instance = config.for_worker()
+            for _ in get_container(pytestconfig, instance):
+                yield instance
 
         return responsaas_server
 
@@ -118,6 +330,7 @@ except ImportError:  # pragma: no cover
 
 
 __all__ = [
+    "create_async_responsaas_fixture",
     "create_responsaas_fixture",
     "create_responsaas_server_fixture",
     "ResponsaasConfig",
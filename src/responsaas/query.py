@@ -0,0 +1,157 @@
+"""Server-side filtering of a namespace's calls.
+
+Rather than retrieving (and unpickling) a namespace's entire call log to assert
+on a handful of calls, clients can send a `CallQuery`, and receive only the
+selected fields of the matching calls.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import BaseModel, Field, field_validator
+
+from responsaas.calls import CallRecord
+
+CallField = Literal[
+    "method",
+    "url",
+    "path",
+    "query",
+    "headers",
+    "body",
+    "body_size",
+    "body_digest",
+    "route",
+    "status",
+    "response_headers",
+    "response_body",
+]
+
+DEFAULT_FIELDS: List[CallField] = ["method", "url", "route", "status"]
+
+
+class CallQuery(BaseModel):
+    """Filters selecting calls, and the fields of them to return.
+
+    A call must match every filter which is given.
+
+    Args:
+        method: The request's method.
+        path_prefix: A prefix of the request's path (excluding the query string).
+        path_regex: A regex matched against the start of the request's path.
+        query: Query parameters, each of which the request must include (with
+            the given value).
+        headers: Request headers, each of which the request must include (with
+            the given value). Names are case insensitive.
+        status: The response's status code. Calls which matched no route have
+            no status.
+        route: The registered route the call matched, as with `call_counts`,
+            i.e. "GET /foo".
+        fields: The fields of each call to return. Bodies are as retained (see
+            `Retention`); "body_size" and "body_digest" are those of the request
+            body as received (the digest only if bodies are hashed).
+        max_body: Truncate returned bodies to this many bytes.
+        since: A cursor, after which to search calls.
+        limit: The maximum number of calls to return.
+    """
+
+    method: Optional[str] = None
+    path_prefix: Optional[str] = None
+    path_regex: Optional[str] = None
+    query: Optional[Dict[str, str]] = None
+    headers: Optional[Dict[str, str]] = None
+    status: Optional[int] = None
+    route: Optional[str] = None
+
+    fields: List[CallField] = Field(default_factory=lambda: list(DEFAULT_FIELDS))
+    max_body: Optional[int] = Field(default=None, ge=0)
+    since: int = 0
+    limit: Optional[int] = Field(default=None, ge=1)
+
+    @field_validator("path_regex")
+    @classmethod
+    def compile_path_regex(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid regex: {e}")
+        return value
+
+    def select(
+        self, calls: Iterable[Tuple[int, CallRecord]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return the fields of the matching calls, and the cursor following them.
+
+        `calls` pairs each call with the cursor which follows it. If `limit`
+        calls are found, the cursor follows the last of them; otherwise, it
+        follows every call searched.
+        """
+        cursor = self.since
+        results = []
+        for cursor, call in calls:
+            if not self.matches(call):
+                continue
+
+            results.append(self.project(call))
+            if self.limit is not None and len(results) >= self.limit:
+                break
+        return results, cursor
+
+    def matches(self, call: CallRecord) -> bool:
+        if self.method is not None and call.method != self.method.upper():
+            return False
+
+        if self.route is not None and call.route != self.route:
+            return False
+
+        if self.status is not None and call.status != self.status:
+            return False
+
+        url = urlsplit(call.url or "")
+        if self.path_prefix is not None and not url.path.startswith(self.path_prefix):
+            return False
+
+        if self.path_regex is not None and not re.match(self.path_regex, url.path):
+            return False
+
+        if self.query:
+            params = parse_qs(url.query, keep_blank_values=True)
+            for name, value in self.query.items():
+                if value not in params.get(name, ()):
+                    return False
+
+        if self.headers:
+            for name, value in self.headers.items():
+                if call.headers.get(name) != value:
+                    return False
+
+        return True
+
+    def project(self, call: CallRecord) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for name in self.fields:
+            if name == "path":
+                result[name] = urlsplit(call.url or "").path
+            elif name == "query":
+                result[name] = parse_qs(
+                    urlsplit(call.url or "").query, keep_blank_values=True
+                )
+            elif name in ("headers", "response_headers"):
+                headers = getattr(call, name)
+                result[name] = None if headers is None else dict(headers)
+            elif name == "body":
+                result[name] = self.truncate(call.body)
+            elif name == "response_body":
+                result[name] = self.truncate(call.response_content)
+            else:
+                result[name] = getattr(call, name)
+        return result
+
+    def truncate(self, body: Optional[bytes]) -> Optional[bytes]:
+        if body is not None and self.max_body is not None:
+            return body[: self.max_body]
+        return body
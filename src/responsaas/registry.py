@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import copy
+import heapq
+import time
+from re import Pattern
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from requests import PreparedRequest
+from responses import (
+    BaseResponse,
+    RequestsMock,
+    _clean_unicode,
+    _get_url_and_path,
+    _has_unicode,
+)
+from responses.registries import FirstMatchRegistry
+
+from responsaas.counts import route_key
+from responsaas.profiling import Timings
+
+IndexKey = Tuple[str, str]
+IndexEntry = Tuple[int, BaseResponse]
+
+
+def index_key(method: str, url: str) -> IndexKey:
+    if _has_unicode(url):
+        url = _clean_unicode(url)
+    return (method, _get_url_and_path(url))
+
+
+class IndexedRegistry(FirstMatchRegistry):
+    """A `FirstMatchRegistry` which narrows candidates by method and path.
+
+    Responses registered with a plain string url are bucketed by their
+    (method, path) pair, so an incoming request only runs the matchers of
+    responses which could possibly match it. Responses registered with a regex
+    `Pattern` cannot be bucketed, and are considered for every request.
+
+    Candidates are visited in registration order, so the first-match (and
+    "pop the first of multiple matches") semantics of `FirstMatchRegistry`
+    are preserved.
+
+    Registries can be `fork`ed in constant time. A fork shares its parent's
+    structures (and responses) until either side modifies them.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._index: Dict[IndexKey, List[IndexEntry]] = {}
+        self._unindexed: List[IndexEntry] = []
+        self._sequence = 0
+        self._stale = False
+
+        # Whether the above structures may be shared with a fork.
+        self._shared = False
+
+        # Identifies the responses this registry created, and may mutate (as
+        # `responses` does, when recording their calls).
+        self._token = object()
+
+    def fork(self) -> IndexedRegistry:
+        """Return a registry starting with this registry's responses.
+
+        Neither registry copies the structures they share until it modifies them.
+        Responses are copied by the fork when they're first matched, so each
+        registry tracks its own calls; the fork starts with none.
+        """
+        forked = IndexedRegistry()
+        forked._responses = self._responses
+        forked._index = self._index
+        forked._unindexed = self._unindexed
+        forked._sequence = self._sequence
+        forked._stale = self._stale
+        forked._shared = self._shared = True
+        return forked
+
+    def reset(self) -> None:
+        super().reset()
+        self._stale = True
+        self._shared = False
+
+    def add(self, response: BaseResponse) -> BaseResponse:
+        self._own()
+        response = super().add(response)
+        self._claim(response)
+        if not self._stale:
+            self._index_response(response)
+        return response
+
+    def remove(self, response: BaseResponse) -> List[BaseResponse]:
+        self._own()
+        removed = super().remove(response)
+        self._stale = True
+        return removed
+
+    def replace(self, response: BaseResponse) -> BaseResponse:
+        self._own()
+        response = super().replace(response)
+        self._claim(response)
+        self._stale = True
+        return response
+
+    def call_count(self, response: BaseResponse) -> int:
+        """Return the calls made to a registered response, through this registry."""
+        if self._owns(response):
+            return response.call_count
+        return 0
+
+    def own_responses(self) -> None:
+        """Copy any responses shared with another registry.
+
+        Afterwards, the `call_count` of every registered response reflects only
+        this registry's calls.
+        """
+        if any(not self._owns(response) for response in self._responses):
+            self._own()
+            self._responses = [self._copy(response) for response in self._responses]
+            self._stale = True
+
+    def find(
+        self, request: PreparedRequest
+    ) -> Tuple[Optional[BaseResponse], List[str]]:
+        timings: Optional[Timings] = getattr(request, "timings", None)
+        if timings is None:
+            return self._find(request, None)
+
+        start = time.perf_counter()
+        matching = timings.phases.get("matcher", 0.0)
+        try:
+            return self._find(request, timings)
+        finally:
+            matching = timings.phases.get("matcher", 0.0) - matching
+            timings.add("registry", time.perf_counter() - start - matching)
+
+    def _find(
+        self, request: PreparedRequest, timings: Optional[Timings]
+    ) -> Tuple[Optional[BaseResponse], List[str]]:
+        if self._stale:
+            self._rebuild()
+
+        assert request.method
+        key = index_key(request.method, str(request.url))
+
+        found: Optional[IndexEntry] = None
+        for entry in self._candidates(key):
+            response = entry[1]
+            if timings is None:
+                match_result, _ = response.matches(request)
+            else:
+                match_result, _ = timings.matches(response, request)
+            if not match_result:
+                continue
+
+            if found is None:
+                found = entry
+                continue
+
+            # Multiple matches found. If the first has already been called,
+            # it's discarded in favor of the next one; otherwise the first is
+            # consumed.
+            if self.call_count(found[1]) > 0:
+                self._discard(found)
+                return self._matched(request, self._take(entry)), []
+
+            # The popped response is copied first, if it's shared with a fork,
+            # so that its call is recorded against this registry alone.
+            response = self._take(found)
+            self._discard((found[0], response))
+            return self._matched(request, response), []
+
+        if found is not None:
+            return self._matched(request, self._take(found)), []
+
+        # The error message produced by `responses` expects a reason for every
+        # registered response. This is the slow path, so just check them all.
+        reasons = [response.matches(request)[1] for response in self.registered]
+        return None, reasons
+
+    def _matched(
+        self, request: PreparedRequest, response: BaseResponse
+    ) -> BaseResponse:
+        # Like the `params` `responses` attaches to the request, this records
+        # which registered response the request matched (for `CallCounts`), and
+        # how its response should be delivered.
+        request.route = route_key(response)  # type: ignore[attr-defined]
+        request.shaping = getattr(response, "shaping", None)  # type: ignore[attr-defined]
+        request.body_file = getattr(response, "body_file", None)  # type: ignore[attr-defined]
+        return response
+
+    def _candidates(self, key: IndexKey) -> Iterable[IndexEntry]:
+        bucket = self._index.get(key)
+        if not bucket:
+            return self._unindexed
+        if not self._unindexed:
+            return bucket
+        return heapq.merge(bucket, self._unindexed, key=lambda entry: entry[0])
+
+    def _index_response(self, response: BaseResponse) -> None:
+        entry = (self._sequence, response)
+        self._sequence += 1
+
+        if isinstance(response.url, Pattern):
+            self._unindexed.append(entry)
+        else:
+            key = index_key(response.method, response.url)
+            self._index.setdefault(key, []).append(entry)
+
+    def _rebuild(self) -> None:
+        self._index = {}
+        self._unindexed = []
+        self._sequence = 0
+        self._stale = False
+        for response in self.registered:
+            self._index_response(response)
+
+    def _entries(self, response: BaseResponse) -> List[IndexEntry]:
+        if isinstance(response.url, Pattern):
+            return self._unindexed
+        return self._index[index_key(response.method, response.url)]
+
+    def _discard(self, entry: IndexEntry) -> None:
+        self._own()
+        response = entry[1]
+        self._entries(response).remove(entry)
+        for i, registered in enumerate(self.registered):
+            if registered is response:
+                del self.registered[i]
+                break
+
+    def _take(self, entry: IndexEntry) -> BaseResponse:
+        """Return the response of a matched entry, copying it if it's shared."""
+        response = entry[1]
+        if self._owns(response):
+            return response
+
+        self._own()
+        copied = self._copy(response)
+        entries = self._entries(response)
+        entries[entries.index(entry)] = (entry[0], copied)
+        for i, registered in enumerate(self.registered):
+            if registered is response:
+                self.registered[i] = copied
+                break
+        return copied
+
+    def _owns(self, response: BaseResponse) -> bool:
+        return getattr(response, "_registry_token", None) is self._token
+
+    def _claim(self, response: BaseResponse) -> None:
+        response._registry_token = self._token  # type: ignore[attr-defined]
+
+    def _copy(self, response: BaseResponse) -> BaseResponse:
+        if self._owns(response):
+            return response
+
+        copied = copy.copy(response)
+        copied._calls = type(response._calls)()
+        self._claim(copied)
+        return copied
+
+    def _own(self) -> None:
+        """Copy any structures shared with a fork, before modifying them."""
+        if not self._shared:
+            return
+
+        self._responses = list(self._responses)
+        self._index = {key: list(entries) for key, entries in self._index.items()}
+        self._unindexed = list(self._unindexed)
+        self._shared = False
+
+
+class IndexedRequestsMock(RequestsMock):
+    """A `RequestsMock` which always uses an `IndexedRegistry`.
+
+    `RequestsMock.reset` reinstates the default registry, so it's reapplied here.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("registry", IndexedRegistry)
+        super().__init__(*args, **kwargs)
+
+    def reset(self) -> None:
+        super().reset()
+        self._registry = IndexedRegistry()
+
+    def fork(self) -> IndexedRequestsMock:
+        """Return a mock starting with this mock's responses (see `IndexedRegistry.fork`)."""
+        registry = self.get_registry()
+        assert isinstance(registry, IndexedRegistry)
+
+        forked = IndexedRequestsMock(
+            assert_all_requests_are_fired=self.assert_all_requests_are_fired
+        )
+        forked._registry = registry.fork()
+        return forked
+
+    def stop(self, allow_assert: bool = True) -> None:
+        if allow_assert and self.assert_all_requests_are_fired:
+            # Responses shared with another mock have that mock's call counts.
+            registry = self.get_registry()
+            assert isinstance(registry, IndexedRegistry)
+            registry.own_responses()
+        super().stop(allow_assert)
@@ -0,0 +1,102 @@
+"""Pre-rendered responses.
+
+Routes are static: their status, headers, and body are fixed when they're
+registered. So rather than `responses` forming a new `HTTPResponse` for every
+matched request (and the handler re-wrapping its headers and body), each route
+is rendered once, the first time it's served, and copied thereafter.
+
+Calls are still recorded by `responses`, so `calls`/`call_count` are unaffected.
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Any, List, Optional, Tuple
+
+from fastapi import Response
+from requests import PreparedRequest, models
+from requests.adapters import HTTPAdapter
+from responses import Response as ResponsesResponse
+
+from responsaas.calls import CallCounter
+
+
+class Rendered:
+    """A route's rendered response.
+
+    Shared between copies of the route (see `IndexedRegistry.fork`), so a route
+    inherited by many namespaces is rendered once.
+    """
+
+    __slots__ = ("http_response", "raw_headers", "response")
+
+    def __init__(self) -> None:
+        # The `HTTPResponse` formed by `responses`, until it's been built.
+        self.http_response: Any = None
+        self.response: Optional[models.Response] = None
+        self.raw_headers: Optional[List[Tuple[bytes, bytes]]] = None
+
+    def copy(self, request: PreparedRequest) -> models.Response:
+        """Copy the built `requests` response, as the response to `request`."""
+        assert self.response is not None
+        response = copy.copy(self.response)
+        response.url = str(request.url)
+        response.request = request
+        response.rendered = self  # type: ignore[attr-defined]
+        return response
+
+    def to_response(self) -> Response:
+        """Produce the `fastapi.Response` to send."""
+        assert self.response is not None
+        body = self.response.content
+        status_code = self.response.status_code
+        if self.raw_headers is None:
+            response = Response(body, status_code, headers=self.response.headers)
+            self.raw_headers = list(response.raw_headers)
+            return response
+
+        response = Response(body, status_code)
+        response.raw_headers = list(self.raw_headers)
+        return response
+
+
+class StaticResponse(ResponsesResponse):
+    """A `responses.Response` which is rendered when first served."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        headers = kwargs.get("headers") or {}
+        if "content_type" in kwargs and any(
+            name.lower() == "content-type" for name in headers
+        ):
+            # As `RequestsMock.add` would.
+            raise RuntimeError(
+                "You cannot define both `content_type` and `headers[Content-Type]`."
+                " Using the `content_type` kwarg is recommended."
+            )
+
+        super().__init__(*args, **kwargs)
+        self.rendered = Rendered()
+        # The namespace's call log retains calls; the route only counts them.
+        self._calls = CallCounter()
+
+    def get_response(self, request: PreparedRequest) -> Any:
+        rendered = self.rendered
+        if rendered.response is None and rendered.http_response is None:
+            rendered.http_response = super().get_response(request)
+        return rendered
+
+
+class RenderingAdapter(HTTPAdapter):
+    """An `HTTPAdapter` which builds `Rendered` responses once, then copies them."""
+
+    def build_response(self, req: PreparedRequest, resp: Any) -> models.Response:
+        if not isinstance(resp, Rendered):
+            return super().build_response(req, resp)
+
+        if resp.response is None:
+            response = super().build_response(req, resp.http_response)
+            # Read the body, so copies share it.
+            response.content
+            resp.response = response
+            resp.http_response = None
+        return resp.copy(req)
@@ -1,7 +1,11 @@
+from responsaas.main import app, router
 from responsaas.routes import namespace, route
 
+# The control plane routes must be registered before the catch-all handler.
+app.include_router(router)
+
 # isort: split
-from responsaas.routes import handler
+from responsaas.routes import handler  # noqa: E402
 
 __all__ = [
     "namespace",
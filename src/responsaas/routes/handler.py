@@ -1,22 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from json import JSONDecodeError
+import time
+from typing import Optional
 
 from fastapi import Request, Response
-from requests import PreparedRequest
-from requests.adapters import HTTPAdapter
-
-from responsaas.main import app, state
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from requests import PreparedRequest, models
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from responsaas.bodies import iter_bytes, iter_file
+from responsaas.main import app, metrics, state
+from responsaas.profiling import Timings
+from responsaas.proxy import record
+from responsaas.rendering import Rendered, RenderingAdapter
+from responsaas.shaping import Shaping
+from responsaas.state import Namespace
 
 log = logging.getLogger(__name__)
 
-# The hostname here is actually not relevant, given that any request here has
-# already made it to this service. Using the **actual** host just introduces
-# more points of failure.
-HOST_PREFIX = "http://_/"
-
-
 url = "/{namespace_id:str}/{url:path}"
 
 
@@ -28,41 +33,146 @@ url = "/{namespace_id:str}/{url:path}"
 @app.head(url)
 @app.options(url)
 async def handler(namespace_id: str, request: Request):
+    start = time.perf_counter()
+    try:
+        return await handle(namespace_id, request)
+    finally:
+        metrics.record_handler(time.perf_counter() - start)
+
+
+async def handle(namespace_id: str, request: Request) -> Response:
     namespace = state.get_namespace(namespace_id)
-    adapter: HTTPAdapter = state.http_adapter
+    adapter = state.http_adapter
 
-    json = None
-    body = None
-    files = None
-    try:
-        json = await request.json()
-    except JSONDecodeError:
-        try:
-            # Files
-            raise Exception()
-        except Exception:
-            body = await request.body()
+    profiling = namespace.profiling
+    timings = Timings() if profiling is not None and profiling.enabled else None
+
+    # The body is handed to `responses` exactly as it was received. Matchers
+    # which need it parsed (i.e. `json_params_matcher`) parse it themselves, so
+    # it's never decoded unless a matcher requires it.
+    body = await request.body()
+    if timings is not None:
+        timings.mark("body")
 
     url = "/" + request.path_params.get("url", "")
+    query = request.scope["query_string"]
+    if query:
+        url = f"{url}?{query.decode('latin-1')}"
 
     prepared_request = PreparedRequest()
-
-    prepared_request.prepare(
-        method=request.method,
-        url=HOST_PREFIX,
-        headers=request.headers,
-        params=request.query_params,
-        json=json,
-        files=files,
-        data=body,
+    prepared_request.method = request.method
+    prepared_request.url = url
+    prepared_request.headers = CaseInsensitiveDict(request.headers)
+    prepared_request.body = body or None
+    if timings is not None:
+        timings.mark("prepare")
+        prepared_request.timings = timings  # type: ignore[attr-defined]
+
+    match_start = time.perf_counter()
+    matched = True
+    try:
+        response = namespace.responses._on_request(
+            adapter=adapter, request=prepared_request
+        )
+    except ConnectionError as e:
+        # `responses` raises when no registered response matches the request.
+        matched = False
+        if namespace.proxy is None:
+            return Response(str(e), status_code=500, media_type="text/plain")
+    finally:
+        metrics.record_match(namespace, time.perf_counter() - match_start, matched)
+        if matched or namespace.proxy is None:
+            state.record_calls(namespace)
+
+    if not matched:
+        response = await replay(namespace, adapter, prepared_request, timings)
+
+    if timings is None:
+        return await build_response(prepared_request, response, namespace.shaping)
+
+    assert profiling is not None
+    timings.mark("response")
+    result = await build_response(
+        prepared_request, response, namespace.shaping, timings
     )
+    timings.mark("response")
 
-    assert prepared_request.url
-    prepared_request.url = url + prepared_request.url.removeprefix(HOST_PREFIX)
+    if profiling.server_timing:
+        result.headers["Server-Timing"] = timings.server_timing()
+    namespace.record_timings(prepared_request, timings)
+    return result
 
-    response = namespace.responses._on_request(
-        adapter=adapter, request=prepared_request
-    )
+
+async def replay(
+    namespace: Namespace,
+    adapter: RenderingAdapter,
+    prepared_request: PreparedRequest,
+    timings: Optional[Timings],
+) -> models.Response:
+    """Record the proxy's upstream response to an unmatched request, then serve it."""
+    proxy = namespace.proxy
+    assert proxy is not None
+
+    # The unmatched call is superseded by the call to the recorded route.
+    namespace.drain_calls()
+
+    cassette = None
+    if proxy.cassette is not None:
+        cassette = state.bodies.resolve_path(proxy.cassette)
+
+    route = await run_in_threadpool(record, proxy, prepared_request, cassette)
+    state.apply(namespace, [("add", route)])
+    if timings is not None:
+        timings.mark("upstream")
+
+    try:
+        return namespace.responses._on_request(
+            adapter=adapter, request=prepared_request
+        )
+    finally:
+        state.record_calls(namespace)
+
+
+async def build_response(
+    prepared_request: PreparedRequest,
+    response: models.Response,
+    default_shaping: Optional[Shaping],
+    timings: Optional[Timings] = None,
+) -> Response:
+    body_file: Optional[str] = getattr(prepared_request, "body_file", None)
+    shaping: Optional[Shaping] = getattr(prepared_request, "shaping", None)
+    if shaping is None:
+        shaping = default_shaping
+
+    if shaping is not None:
+        delay = shaping.delay()
+        if delay:
+            await asyncio.sleep(delay)
+            if timings is not None:
+                timings.mark("delay")
+
+        if shaping.streams:
+            if body_file:
+                chunks = iter_file(body_file, shaping.chunk_size)
+            else:
+                chunks = iter_bytes(response.content, shaping.chunk_size)
+
+            return StreamingResponse(
+                shaping.stream(chunks),
+                status_code=response.status_code,
+                headers=response.headers,
+            )
+
+    if body_file:
+        return FileResponse(
+            body_file,
+            status_code=response.status_code,
+            headers=response.headers,
+        )
+
+    rendered: Optional[Rendered] = getattr(response, "rendered", None)
+    if rendered is not None:
+        return rendered.to_response()
 
     return Response(
         content=response.content,
@@ -1,47 +1,98 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import HTTPException, Request
-from pydantic import BaseModel
-from responses import RequestsMock
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel, Field
 
-from responsaas.main import app, state
+from responsaas.main import metrics, router, state
+from responsaas.wire import respond
 
 
 class EnterNamespace(BaseModel):
     assert_all_requests_are_fired: Optional[bool] = False
+    templates: List[str] = []
+    count: Optional[int] = Field(default=None, ge=1)
 
 
 class NamespaceId(BaseModel):
     namespace_id: str
 
 
-@app.post("/__responsaas__/check")
-async def check():
+@router.post("/__responsaas__/check")
+async def check(request: Request):
     """Check server's ability to respond to any request."""
-    return {"ok": True}
+    return respond(request, {"ok": True})
 
 
-@app.post("/__responsaas__/enter")
+@router.get("/__responsaas__/metrics")
+async def get_metrics(request: Request, format: Optional[str] = None):
+    """Return the server process's metrics.
+
+    Metrics are in the Prometheus text format, unless `?format=json` is supplied.
+    """
+    if format == "json":
+        return respond(request, metrics.to_dict(state))
+
+    return Response(
+        metrics.to_prometheus(state),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@router.post("/__responsaas__/templates")
+async def templates(request: Request):
+    """Return the names of the loaded templates, and their number of routes."""
+    return respond(
+        request, {name: len(routes) for name, routes in state.templates.items()}
+    )
+
+
+@router.post("/__responsaas__/enter")
 async def enter_namespace(payload: EnterNamespace, request: Request):
-    """Create a namespace against which future requests can be made."""
+    """Create a namespace against which future requests can be made.
+
+    The namespace starts with the routes of the given `templates`, in order.
+
+    If `count` is supplied, that many namespaces are created, and returned as
+    a list of `namespaces`.
+    """
     if not payload:
         payload = EnterNamespace()
 
-    namespace_id = state.create_namespace(
-        RequestsMock(
-            assert_all_requests_are_fired=bool(payload.assert_all_requests_are_fired),
-        )
+    namespace_ids = state.create_namespaces(
+        payload.count or 1,
+        assert_all_requests_are_fired=bool(payload.assert_all_requests_are_fired),
+        templates=payload.templates,
+    )
+    if payload.count is None:
+        return respond(request, describe_namespace(request, namespace_ids[0]))
+
+    return respond(
+        request,
+        {
+            "namespaces": [
+                describe_namespace(request, namespace_id)
+                for namespace_id in namespace_ids
+            ]
+        },
     )
-    base_url = str(request.url_for("handler", namespace_id=namespace_id, url=""))
-    return {
-        "namespace_id": namespace_id,
-        "base_url": base_url,
-    }
 
 
-@app.post("/__responsaas__/exit")
+@router.post("/__responsaas__/clone")
+async def clone_namespace(payload: NamespaceId, request: Request):
+    """Create a namespace starting with the routes and settings of an existing one.
+
+    The clone shares the existing namespace's routes until either changes them,
+    so cloning is cheap regardless of the number of routes. The clone starts
+    without calls, and is reset to the routes it was cloned with.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    namespace_id = state.clone_namespace(namespace)
+    return respond(request, describe_namespace(request, namespace_id))
+
+
+@router.post("/__responsaas__/exit")
 async def exit_namespace(payload: NamespaceId):
     """Remove a namespace by id."""
     namespace = state.get_namespace(payload.namespace_id)
@@ -49,3 +100,30 @@ async def exit_namespace(payload: NamespaceId):
         namespace.responses.stop()
     except AssertionError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        state.remove_namespace(namespace.id)
+
+
+@router.post("/__responsaas__/release")
+async def release_namespace(payload: NamespaceId):
+    """Reset a namespace (including its shaping and profiling), for reuse.
+
+    As with `exit`, fails if the namespace asserts that all requests are fired,
+    and they weren't; in which case the namespace is removed.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    try:
+        namespace.responses.stop()
+    except AssertionError as e:
+        state.remove_namespace(namespace.id)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    state.release_namespace(namespace)
+
+
+def describe_namespace(request: Request, namespace_id: str):
+    base_url = str(request.url_for("handler", namespace_id=namespace_id, url=""))
+    return {
+        "namespace_id": namespace_id,
+        "base_url": base_url,
+    }
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
-import base64
 import logging
 import pickle
-from typing import Any, Dict, List, Optional, Tuple
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
 
-from responsaas.main import app, state
+from responsaas.calls import Retention
+from responsaas.main import router, state
+from responsaas.operations import Operation, RouteSpec, unpickle_cache_info
+from responsaas.profiling import Profiling
+from responsaas.proxy import Proxy
+from responsaas.query import CallQuery
+from responsaas.shaping import Shaping
+from responsaas.wire import respond
 
 log = logging.getLogger(__name__)
 
@@ -16,112 +23,197 @@ class NamespaceId(BaseModel):
     namespace_id: str
 
 
-class Route(NamespaceId):
-    url: Optional[str] = None
-    pattern: Optional[str] = None
-    method: Optional[str] = "GET"
-    content_type: Optional[str] = None
-    headers: Optional[Dict[str, str]] = None
-    body: Optional[bytes] = None
-    json_body: Optional[Any] = Field(None, alias="json")
-    status: Optional[int] = Field(None)
-    match: Optional[List[Tuple[str, Any]]] = None
+class Route(RouteSpec, NamespaceId):
+    pass
 
 
-class CallCount(NamespaceId):
-    url: str
+class Batch(NamespaceId):
+    operations: List[Operation]
+
 
+class Calls(NamespaceId):
+    since: int = 0
+    limit: Optional[int] = None
 
-def collect_responses_kwargs(payload: Route):
-    if payload.pattern:
-        url = pickle.loads(  # noqa: S301
-            base64.b64decode(payload.pattern.encode("utf-8"))
-        )
-    else:
-        url = payload.url
 
-    kwargs: Dict[str, Any] = {
-        "method": payload.method,
-        "url": url,
-    }
+class QueryCalls(CallQuery, NamespaceId):
+    pass
 
-    # responses uses kwargs dynamically to determine sent fields. We cannot
-    # "just" send None for these.
 
-    if payload.body is not None:
-        kwargs["body"] = payload.body
+class CallCount(NamespaceId):
+    url: str
 
-    if payload.json_body is not None:
-        kwargs["json"] = payload.json_body
 
-    if payload.status is not None:
-        kwargs["status"] = payload.status
+class NamespaceShaping(NamespaceId):
+    shaping: Optional[Shaping] = None
 
-    if payload.headers is not None:
-        kwargs["headers"] = payload.headers
 
-    if payload.content_type is not None:
-        kwargs["content_type"] = payload.content_type
+class NamespaceProfiling(NamespaceId):
+    profiling: Optional[Profiling] = None
 
-    if payload.match is not None:
-        kwargs["match"] = []
 
-        for matcher, *match_args in payload.match:
-            matcher_fn = pickle.loads(  # noqa: S301
-                base64.b64decode(matcher.encode("utf-8"))
-            )
-            kwargs["match"].append(matcher_fn(*match_args))
+class NamespaceProxy(NamespaceId):
+    proxy: Optional[Proxy] = None
 
-    return kwargs
 
+class NamespaceRetention(NamespaceId):
+    retention: Optional[Retention] = None
 
-@app.post("/__responsaas__/add")
+
+@router.post("/__responsaas__/add")
 async def add(payload: Route):
     namespace = state.get_namespace(payload.namespace_id)
-    kwargs = collect_responses_kwargs(payload)
-    namespace.responses.add(**kwargs)
+    state.apply(namespace, [("add", payload)])
 
 
-@app.post("/__responsaas__/replace")
+@router.post("/__responsaas__/replace")
 async def replace(payload: Route):
     namespace = state.get_namespace(payload.namespace_id)
-    kwargs = collect_responses_kwargs(payload)
-    namespace.responses.replace(**kwargs)
+    state.apply(namespace, [("replace", payload)])
 
 
-@app.post("/__responsaas__/remove")
+@router.post("/__responsaas__/remove")
 async def remove(payload: Route):
     namespace = state.get_namespace(payload.namespace_id)
-    kwargs = collect_responses_kwargs(payload)
-    namespace.responses.remove(**kwargs)
+    state.apply(namespace, [("remove", payload)])
 
 
-@app.post("/__responsaas__/upsert")
+@router.post("/__responsaas__/upsert")
 async def upsert(payload: Route):
     namespace = state.get_namespace(payload.namespace_id)
-    kwargs = collect_responses_kwargs(payload)
-    namespace.responses.upsert(**kwargs)
+    state.apply(namespace, [("upsert", payload)])
+
+
+@router.post("/__responsaas__/batch")
+async def batch(payload: Batch):
+    """Apply a sequence of add/replace/remove/upsert operations in one request.
+
+    All operations are validated before any are applied, and are then applied
+    in order. If any operation fails, the namespace's registry is left untouched.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    operations = [(operation.action, operation) for operation in payload.operations]
+    try:
+        state.apply(namespace, operations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/__responsaas__/reset")
+@router.post("/__responsaas__/reset")
 async def reset(payload: NamespaceId):
     namespace = state.get_namespace(payload.namespace_id)
-    namespace.responses.reset()
+    state.reset_namespace(namespace)
+
+
+@router.post("/__responsaas__/shaping")
+async def shaping(payload: NamespaceShaping):
+    """Set (or clear) the shaping applied to routes which don't specify their own."""
+    namespace = state.get_namespace(payload.namespace_id)
+    state.configure(namespace, shaping=payload.shaping)
+
+
+@router.post("/__responsaas__/profiling")
+async def profiling(payload: NamespaceProfiling):
+    """Set (or clear) the namespace's profiling settings.
+
+    Changing the settings discards any previously recorded slow requests.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    state.configure(namespace, profiling=payload.profiling)
+
+
+@router.post("/__responsaas__/proxy")
+async def proxy(payload: NamespaceProxy):
+    """Set (or clear) the upstream to which requests matching no route are forwarded.
+
+    The upstream's responses are recorded as routes, and also written to the
+    `cassette` file (relative to the server's `RESPONSAAS_FILE_ROOT`), if given.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    if payload.proxy is not None and payload.proxy.cassette is not None:
+        if state.bodies.resolve_path(payload.proxy.cassette) is None:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid cassette: {payload.proxy.cassette}"
+            )
+    state.configure(namespace, proxy=payload.proxy)
+
+
+@router.post("/__responsaas__/retention")
+async def retention(payload: NamespaceRetention):
+    """Set (or clear) what's retained of the namespace's calls.
+
+    Applies to calls made from then on, except that `max_calls` immediately
+    discards any older calls beyond it.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    state.configure(namespace, retention=payload.retention)
+
+
+@router.post("/__responsaas__/slowest")
+async def slowest(payload: NamespaceId, request: Request):
+    """Return the slowest requests recorded while profiling, slowest first.
+
+    Requests are recorded per server process.
+    """
+    namespace = state.get_namespace(payload.namespace_id)
+    return respond(request, {"requests": namespace.slowest_requests()})
 
 
-@app.post("/__responsaas__/calls")
-async def calls(payload: NamespaceId):
+@router.post("/__responsaas__/calls")
+async def calls(payload: Calls, request: Request):
+    """Return the calls made after the `since` cursor, and the cursor following them."""
     namespace = state.get_namespace(payload.namespace_id)
 
-    calls = namespace.responses.calls
-    pickled_calls = base64.b64encode(pickle.dumps(calls)).decode("utf-8")
-    return {"calls": pickled_calls}
+    calls, cursor = state.calls_since(namespace, payload.since, payload.limit)
+    return respond(
+        request,
+        {"calls": pickle.dumps([call.to_call() for call in calls]), "cursor": cursor},
+    )
+
 
+@router.post("/__responsaas__/query_calls")
+async def query_calls(payload: QueryCalls, request: Request):
+    """Return the selected fields of the calls matching the query, and the next cursor.
 
-@app.post("/__responsaas__/call_count")
-async def call_count(payload: CallCount):
+    See `CallQuery` for the available filters and fields.
+    """
     namespace = state.get_namespace(payload.namespace_id)
 
-    calls = namespace.responses.calls
-    call_count = len([1 for call in calls if call.request.url == payload.url])
-    return {"call_count": call_count}
+    calls, cursor = state.query_calls(namespace, payload)
+    return respond(request, {"calls": calls, "cursor": cursor})
+
+
+@router.post("/__responsaas__/call_count")
+async def call_count(payload: CallCount, request: Request):
+    namespace = state.get_namespace(payload.namespace_id)
+    state.sync_calls(namespace)
+
+    return respond(request, {"call_count": namespace.counts.url[payload.url]})
+
+
+@router.post("/__responsaas__/call_counts")
+async def call_counts(payload: NamespaceId, request: Request):
+    """Return the namespace's call counts, grouped by url, path, method and path, and route."""
+    namespace = state.get_namespace(payload.namespace_id)
+    state.sync_calls(namespace)
+
+    return respond(request, namespace.counts.to_dict())
+
+
+@router.post("/__responsaas__/bodies")
+async def store_body(request: Request):
+    """Store the request body in the body store, returning its digest.
+
+    Routes can then reference the body by `body_digest`, rather than sending it.
+    """
+    digest = state.bodies.put(await request.body())
+    return respond(request, {"digest": digest})
+
+
+@router.post("/__responsaas__/unpickle_cache")
+async def unpickle_cache(request: Request):
+    """Return hit/miss statistics for the cache of unpickled matchers and patterns.
+
+    Statistics are per server process.
+    """
+    return respond(request, unpickle_cache_info())
@@ -0,0 +1,79 @@
+"""Response shaping: artificial latency and bandwidth limits for mocked responses.
+
+Shaping is applied with asyncio sleeps, so delayed responses don't occupy the
+server while they wait.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import random
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Shaping(BaseModel):
+    """Describe how a response is delivered.
+
+    Args:
+        latency: Seconds to wait before responding.
+        jitter: Seconds by which `latency` is (uniformly) randomly varied, in
+            either direction.
+        percentiles: A latency distribution, mapping percentiles (0-100) to
+            latency in seconds, i.e. `{50: 0.01, 99: 0.2}`. Latencies are sampled
+            by interpolating between the given points. Takes precedence over
+            `latency`.
+        ttfb: Seconds to wait between sending the response headers and the first
+            byte of the body.
+        bandwidth: The rate at which the body is sent, in bytes per second.
+        chunk_size: The size of the chunks in which a shaped body is sent.
+    """
+
+    latency: Optional[float] = Field(default=None, ge=0)
+    jitter: Optional[float] = Field(default=None, ge=0)
+    percentiles: Optional[Dict[float, float]] = None
+    ttfb: Optional[float] = Field(default=None, ge=0)
+    bandwidth: Optional[int] = Field(default=None, gt=0)
+    chunk_size: int = Field(default=16384, gt=0)
+
+    @property
+    def streams(self) -> bool:
+        return bool(self.ttfb or self.bandwidth)
+
+    def delay(self) -> float:
+        """Sample the time to wait before responding."""
+        delay = self.latency or 0.0
+        if self.percentiles:
+            percentile = random.uniform(0, 100)  # noqa: S311
+            delay = sample_percentiles(self.percentiles, percentile)
+
+        if self.jitter:
+            delay += random.uniform(-self.jitter, self.jitter)  # noqa: S311
+        return max(delay, 0.0)
+
+    async def stream(self, chunks: Iterable[bytes]) -> AsyncIterator[bytes]:
+        """Deliver the given body `chunks` at the configured pace."""
+        if self.ttfb:
+            await asyncio.sleep(self.ttfb)
+
+        for chunk in chunks:
+            yield chunk
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+
+
+def sample_percentiles(percentiles: Dict[float, float], percentile: float) -> float:
+    """Interpolate the value at `percentile` between the given points."""
+    points = sorted(percentiles.items())
+    keys = [key for key, _ in points]
+
+    index = bisect.bisect_left(keys, percentile)
+    if index == 0:
+        return points[0][1]
+    if index == len(points):
+        return points[-1][1]
+
+    (low_key, low), (high_key, high) = points[index - 1], points[index]
+    return low + (high - low) * (percentile - low_key) / (high_key - low_key)
@@ -1,38 +1,977 @@
 from __future__ import annotations
 
+import contextlib
+import heapq
+import itertools
+import json
+import pickle
+import sqlite3
+import time
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
 from fastapi import HTTPException
-from requests.adapters import HTTPAdapter
+from pydantic import BaseModel
+from requests import PreparedRequest
 from responses import RequestsMock
 
+from responsaas.bodies import BodyStore
+from responsaas.calls import CallRecord, Retention
+from responsaas.counts import CallCounts
+from responsaas.operations import (
+    Action,
+    Operation,
+    Operations,
+    RouteSpec,
+    apply_operation,
+    collect_responses_kwargs,
+)
+from responsaas.profiling import Profiling, Timings
+from responsaas.proxy import Proxy
+from responsaas.query import CallQuery
+from responsaas.registry import IndexedRequestsMock
+from responsaas.rendering import RenderingAdapter
+from responsaas.shaping import Shaping
+from responsaas.templates import Templates, load_templates
+
 
 @dataclass
 class Namespace:
     id: str
     responses: RequestsMock
+    calls: Deque[CallRecord] = field(default_factory=deque)
+
+    # The number of calls which have been discarded from the start of `calls`.
+    # Call cursors are absolute, so they remain valid when calls are discarded.
+    calls_offset: int = 0
+    counts: CallCounts = field(default_factory=CallCounts)
+
+    # An estimate of the memory retained by the namespace, in bytes.
+    size: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    # The shaping applied to responses whose route doesn't specify its own.
+    shaping: Optional[Shaping] = None
+
+    profiling: Optional[Profiling] = None
+
+    # Where requests which match no route are forwarded to, and recorded from.
+    proxy: Optional[Proxy] = None
+
+    # What's retained of calls, and how many of them. All of them, by default.
+    retention: Optional[Retention] = None
+
+    # The responses the namespace starts with, and is reset to: those of its
+    # templates, or of the namespace it was cloned from. It's never modified,
+    # only forked (see `IndexedRegistry.fork`).
+    origin: Optional[IndexedRequestsMock] = None
+
+    # The slowest requests handled by this process, while `profiling.slowest`
+    # is set, as a heap of (total, sequence, timings) tuples.
+    slowest: List[Tuple[float, int, Dict[str, Any]]] = field(default_factory=list)
+
+    # Traffic handled by this process (see `responsaas.metrics`).
+    created: float = field(default_factory=time.monotonic)
+    requests: int = 0
+    misses: int = 0
+
+    @contextlib.contextmanager
+    def atomic(self):
+        """Restore the registered responses if the wrapped block raises."""
+        registry = self.responses.get_registry()
+        snapshot = list(registry.registered)
+        try:
+            yield
+        except BaseException:
+            registry.reset()
+            registry.registered.extend(snapshot)
+            raise
+
+    def apply(self, operations: Operations):
+        """Apply the given operations in order, or none of them if any fail."""
+        operations = list(operations)
+        collected = [
+            (action, collect_responses_kwargs(route)) for action, route in operations
+        ]
+        with self.atomic():
+            for action, kwargs in collected:
+                apply_operation(self.responses, action, kwargs)
+
+        self.size += sum(route_size(route) for _, route in operations)
+
+    def reset(self):
+        if self.origin is None:
+            self.responses.reset()
+        else:
+            self.responses = self.origin.fork()
+        self.calls_offset += len(self.calls)
+        self.calls = deque()
+        self.counts = CallCounts()
+        self.size = 0
+
+    def clone(self, namespace_id: str) -> Namespace:
+        """Return a new namespace, starting with this namespace's responses and settings.
+
+        The clone shares (copy-on-write) this namespace's responses, rather than
+        copying them, and starts without calls. Its `size` counts only the
+        routes and calls it adds.
+        """
+        assert isinstance(self.responses, IndexedRequestsMock)
+        origin = self.responses.fork()
+        return type(self)(
+            namespace_id,
+            origin.fork(),
+            shaping=self.shaping,
+            profiling=self.profiling,
+            proxy=self.proxy,
+            retention=self.retention,
+            origin=origin,
+        )
+
+    def calls_since(
+        self, cursor: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[CallRecord], int]:
+        """Return the calls after `cursor`, along with the cursor following them."""
+        start = max(cursor - self.calls_offset, 0)
+        end = None if limit is None else start + limit
+        calls = list(itertools.islice(self.calls, start, end))
+        return calls, self.calls_offset + start + len(calls)
+
+    def query_calls(self, query: CallQuery) -> Tuple[List[Dict[str, Any]], int]:
+        """Return the calls after `query.since` which match `query`, and the next cursor."""
+        start = max(query.since - self.calls_offset, 0)
+        return query.select(
+            enumerate(
+                itertools.islice(self.calls, start, None), self.calls_offset + start + 1
+            )
+        )
+
+    def record_timings(self, request: PreparedRequest, timings: Timings):
+        assert self.profiling is not None
+        if not self.profiling.slowest:
+            return
+
+        record = {"method": request.method, "url": request.url, **timings.to_dict()}
+        entry = (timings.total, self.requests, record)
+        if len(self.slowest) < self.profiling.slowest:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def slowest_requests(self) -> List[Dict[str, Any]]:
+        return [record for *_, record in sorted(self.slowest, reverse=True)]
+
+    def drain_calls(self) -> List[CallRecord]:
+        """Take the calls `responses` has recorded since the last drain."""
+        calls = [
+            CallRecord.from_call(call, self.retention) for call in self.responses.calls
+        ]
+        self.responses.calls.reset()
+        return calls
+
+    def record_calls(self, calls: List[CallRecord]):
+        self.calls.extend(calls)
+        for call in calls:
+            self.counts.record(call)
+        self.size += sum(call.size for call in calls)
+        self.trim_calls()
+
+    def trim_calls(self):
+        """Discard the oldest calls beyond `retention.max_calls`."""
+        if self.retention is None or self.retention.max_calls is None:
+            return
+
+        # Calls are discarded one at a time from the left of the deque, so each
+        # recorded call costs O(1) once `max_calls` is reached.
+        while len(self.calls) > self.retention.max_calls:
+            self.size -= self.calls.popleft().size
+            self.calls_offset += 1
+
+
+def route_size(route: RouteSpec) -> int:
+    size = len(route.body or b"")
+    if route.json_body is not None:
+        size += len(json.dumps(route.json_body, default=str))
+    return size
 
 
 @dataclass
 class State:
+    """The server's namespaces.
+
+    Namespaces are removed when exited. To bound the memory used by clients which
+    never exit their namespaces (killed test runs, crashed workers), namespaces
+    can also be evicted by `reap`:
+
+    - `namespace_ttl`: Namespaces unused for this many seconds are removed.
+    - `max_namespaces`: The least recently used namespaces beyond this count are
+      removed. This is also enforced whenever a namespace is created.
+    - `max_bytes`: The least recently used namespaces are removed until the
+      (estimated) total size of all namespaces is below this limit.
+
+    Large bodies are kept outside of the namespaces, in `bodies`. Namespaces may
+    be created from any of the named sets of routes in `templates`.
+    """
+
     namespaces: Dict[str, Namespace] = field(default_factory=dict)
-    http_adapter: HTTPAdapter = field(default_factory=HTTPAdapter)
+    http_adapter: RenderingAdapter = field(default_factory=RenderingAdapter)
+    bodies: BodyStore = field(default_factory=BodyStore)
+    templates: Templates = field(default_factory=dict)
+
+    namespace_ttl: Optional[float] = None
+    max_namespaces: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+    # The responses of each combination of templates (and namespace options)
+    # namespaces have been created with.
+    _origins: Dict[Tuple[Any, ...], IndexedRequestsMock] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    @property
+    def evicts(self) -> bool:
+        return any(
+            limit is not None
+            for limit in (self.namespace_ttl, self.max_namespaces, self.max_bytes)
+        )
 
     def reset(self):
         self.namespaces = {}
-        self.http_adapter = HTTPAdapter()
+        self.http_adapter = RenderingAdapter()
 
-    def create_namespace(self, responses: RequestsMock):
+    def create_namespace(
+        self,
+        assert_all_requests_are_fired: bool = False,
+        templates: Sequence[str] = (),
+    ) -> str:
+        [namespace_id] = self.create_namespaces(
+            1,
+            assert_all_requests_are_fired=assert_all_requests_are_fired,
+            templates=templates,
+        )
+        return namespace_id
+
+    def create_namespaces(
+        self,
+        count: int,
+        assert_all_requests_are_fired: bool = False,
+        templates: Sequence[str] = (),
+    ) -> List[str]:
+        """Create `count` namespaces with the same options."""
+        namespace_ids = []
+        for _ in range(count):
+            namespace_id = str(uuid.uuid4())
+            self.namespaces[namespace_id] = self._new_namespace(
+                namespace_id,
+                assert_all_requests_are_fired=assert_all_requests_are_fired,
+                templates=templates,
+            )
+            namespace_ids.append(namespace_id)
+
+        if self.max_namespaces is not None:
+            self._evict_lru(self._over_max_namespaces)
+        return namespace_ids
+
+    def clone_namespace(self, namespace: Namespace) -> str:
+        """Create a namespace starting with the responses of `namespace`."""
         namespace_id = str(uuid.uuid4())
-        self.namespaces[namespace_id] = Namespace(namespace_id, responses)
+        self.namespaces[namespace_id] = namespace.clone(namespace_id)
+        if self.max_namespaces is not None:
+            self._evict_lru(self._over_max_namespaces)
         return namespace_id
 
-    def get_namespace(self, namespace_id: str):
+    def get_namespace(self, namespace_id: str) -> Namespace:
         try:
-            return self.namespaces[namespace_id]
+            namespace = self.namespaces.pop(namespace_id)
         except Exception:
             raise HTTPException(
                 status_code=400, detail=f"Invalid namespace_id: {namespace_id}"
             )
+
+        self._touch(namespace)
+        return namespace
+
+    def remove_namespace(self, namespace_id: str):
+        self.namespaces.pop(namespace_id, None)
+
+    def reap(self) -> List[str]:
+        """Remove expired namespaces, and those beyond the configured limits.
+
+        Returns the ids of the removed namespaces.
+        """
+        evicted = []
+        if self.namespace_ttl is not None:
+            cutoff = time.monotonic() - self.namespace_ttl
+            evicted.extend(
+                self._evict_lru(lambda namespace: namespace.last_used < cutoff)
+            )
+
+        if self.max_namespaces is not None:
+            evicted.extend(self._evict_lru(self._over_max_namespaces))
+
+        if self.max_bytes is not None:
+            total = sum(namespace.size for namespace in self.namespaces.values())
+
+            def over_max_bytes(namespace: Namespace):
+                nonlocal total
+                assert self.max_bytes is not None
+                if total <= self.max_bytes:
+                    return False
+                total -= namespace.size
+                return True
+
+            evicted.extend(self._evict_lru(over_max_bytes))
+        return evicted
+
+    def _touch(self, namespace: Namespace):
+        # (Re)insert the namespace, so that `namespaces` is ordered by recency of use.
+        self.namespaces.pop(namespace.id, None)
+        self.namespaces[namespace.id] = namespace
+        namespace.last_used = time.monotonic()
+
+    def _over_max_namespaces(self, _: Namespace):
+        assert self.max_namespaces is not None
+        return len(self.namespaces) > self.max_namespaces
+
+    def _evict_lru(self, should_evict: Callable[[Namespace], bool]) -> List[str]:
+        evicted = []
+        while self.namespaces:
+            namespace = next(iter(self.namespaces.values()))
+            if not should_evict(namespace):
+                break
+
+            self.namespaces.pop(namespace.id)
+            evicted.append(namespace.id)
+        return evicted
+
+    def apply(self, namespace: Namespace, operations: Operations):
+        namespace.apply(self._intern(operations))
+
+    def _intern(self, operations: Operations) -> List[Tuple[Action, RouteSpec]]:
+        return [
+            (action, route if action == "remove" else self.bodies.intern(route))
+            for action, route in operations
+        ]
+
+    def reset_namespace(self, namespace: Namespace):
+        namespace.reset()
+
+    def release_namespace(self, namespace: Namespace):
+        """Reset a namespace, including its settings, for reuse."""
+        self.reset_namespace(namespace)
+        settings = {
+            name: None for name in SETTINGS if getattr(namespace, name) is not None
+        }
+        if settings:
+            self.configure(namespace, **settings)
+
+    def configure(self, namespace: Namespace, **settings: Optional[BaseModel]):
+        """Set namespace settings (`shaping`, `profiling`, `proxy`, or `retention`)."""
+        for name, value in settings.items():
+            setattr(namespace, name, value)
+        if "profiling" in settings:
+            namespace.slowest = []
+        if "retention" in settings:
+            namespace.trim_calls()
+
+    def record_calls(self, namespace: Namespace):
+        """Move calls recorded while handling a request into the namespace's call log."""
+        namespace.record_calls(namespace.drain_calls())
+
+    def sync_calls(self, namespace: Namespace):
+        """Ensure `namespace.calls` reflects every call made against the namespace."""
+
+    def calls_since(
+        self, namespace: Namespace, cursor: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[CallRecord], int]:
+        return namespace.calls_since(cursor, limit)
+
+    def query_calls(
+        self, namespace: Namespace, query: CallQuery
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        return namespace.query_calls(query)
+
+    def _new_namespace(
+        self,
+        namespace_id: str,
+        shaping: Optional[Shaping] = None,
+        profiling: Optional[Profiling] = None,
+        templates: Sequence[str] = (),
+        **options: Any,
+    ) -> Namespace:
+        origin = self._origin(templates, **options)
+        return Namespace(
+            namespace_id,
+            IndexedRequestsMock(**options) if origin is None else origin.fork(),
+            shaping=shaping,
+            profiling=profiling,
+            origin=origin,
+        )
+
+    def _origin(
+        self, templates: Sequence[str], **options: Any
+    ) -> Optional[IndexedRequestsMock]:
+        """Return the responses of the given templates, built once and shared."""
+        if not templates:
+            return None
+
+        key = (tuple(templates), tuple(sorted(options.items())))
+        origin = self._origins.get(key)
+        if origin is None:
+            origin = IndexedRequestsMock(**options)
+            for name in templates:
+                template = self.templates.get(name)
+                if template is None:
+                    raise HTTPException(
+                        status_code=400, detail=f"Unknown template: {name}"
+                    )
+                for route in template:
+                    apply_operation(origin, "add", collect_responses_kwargs(route))
+            self._origins[key] = origin
+        return origin
+
+
+@dataclass
+class SharedNamespace(Namespace):
+    generation: int = 0
+    operation_id: int = 0
+    call_id: int = 0
+
+    # For a namespace cloned by this process, the last of the operations copied
+    # from the namespace it was cloned from, which its `origin` already includes.
+    origin_operation_id: int = 0
+
+
+@dataclass
+class SharedState(State):
+    """State shared between server processes through a SQLite database.
+
+    Each process keeps its own `Namespace` objects, but the operations applied to
+    them, and the calls made against them, are written to the database. Before
+    a namespace is used, any operations written by other processes are replayed
+    against the local copy.
+
+    Namespace limits are enforced against the database by every process, based
+    on when each namespace was last modified or called by any process.
+
+    Because `responses` mutates its registry while matching (when multiple
+    responses match a request, the first is consumed), and tracks per-response
+    call counts locally, those behaviors (including `assert_all_requests_are_fired`)
+    are evaluated per process.
+    """
+
+    path: str = ""
+
+    _connection: Optional[sqlite3.Connection] = field(
+        default=None, init=False, repr=False
+    )
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Connect lazily, so that each worker process gets its own connection.
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False, timeout=30
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    @contextlib.contextmanager
+    def transaction(self):
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+
+    def reset(self):
+        super().reset()
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM namespaces")
+            connection.execute("DELETE FROM operations")
+            connection.execute("DELETE FROM calls")
+
+    def create_namespaces(
+        self,
+        count: int,
+        assert_all_requests_are_fired: bool = False,
+        templates: Sequence[str] = (),
+    ) -> List[str]:
+        namespace_ids = super().create_namespaces(
+            count,
+            assert_all_requests_are_fired=assert_all_requests_are_fired,
+            templates=templates,
+        )
+        options = json.dumps(
+            {
+                "assert_all_requests_are_fired": assert_all_requests_are_fired,
+                "templates": list(templates),
+            }
+        )
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO namespaces (id, options, last_used) VALUES (?, ?, ?)",
+                [(namespace_id, options, now) for namespace_id in namespace_ids],
+            )
+            if self.max_namespaces is not None:
+                self._delete(
+                    connection,
+                    connection.execute(
+                        "SELECT id FROM namespaces ORDER BY last_used DESC "
+                        "LIMIT -1 OFFSET ?",
+                        (self.max_namespaces,),
+                    ),
+                )
+        return namespace_ids
+
+    def clone_namespace(self, namespace: Namespace) -> str:
+        with self.transaction() as connection:
+            source = self._sync(connection, namespace.id)
+            assert source is not None
+            namespace_id = super().clone_namespace(source)
+
+            # The clone's operations are copied within the database, for other
+            # processes to replay. This process already has them, in `origin`.
+            connection.execute(
+                "INSERT INTO namespaces (id, options, last_used) "
+                "SELECT ?, options, ? FROM namespaces WHERE id = ?",
+                (namespace_id, time.time(), source.id),
+            )
+            connection.execute(
+                "INSERT INTO operations (namespace_id, operation) "
+                "SELECT ?, operation FROM operations WHERE namespace_id = ? "
+                "ORDER BY id",
+                (namespace_id, source.id),
+            )
+            (origin_operation_id,) = connection.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM operations WHERE namespace_id = ?",
+                (namespace_id,),
+            ).fetchone()
+            connection.execute(
+                "UPDATE namespaces SET origin_operation_id = ? WHERE id = ?",
+                (origin_operation_id, namespace_id),
+            )
+
+            clone = self.namespaces[namespace_id]
+            assert isinstance(clone, SharedNamespace)
+            clone.operation_id = clone.origin_operation_id = origin_operation_id
+
+            if self.max_namespaces is not None:
+                self._delete(
+                    connection,
+                    connection.execute(
+                        "SELECT id FROM namespaces ORDER BY last_used DESC "
+                        "LIMIT -1 OFFSET ?",
+                        (self.max_namespaces,),
+                    ),
+                )
+        return namespace_id
+
+    def get_namespace(self, namespace_id: str) -> SharedNamespace:
+        namespace = self._sync(self.connection, namespace_id)
+        if namespace is None:
+            self.namespaces.pop(namespace_id, None)
+            raise HTTPException(
+                status_code=400, detail=f"Invalid namespace_id: {namespace_id}"
+            )
+
+        self._touch(namespace)
+        return namespace
+
+    def remove_namespace(self, namespace_id: str):
+        super().remove_namespace(namespace_id)
+        with self.transaction() as connection:
+            self._delete(connection, [(namespace_id,)])
+
+    def reap(self) -> List[str]:
+        now = time.time()
+        with self.transaction() as connection:
+            evicted: List[str] = []
+            if self.namespace_ttl is not None:
+                evicted.extend(
+                    self._delete(
+                        connection,
+                        connection.execute(
+                            "SELECT id FROM namespaces WHERE last_used < ?",
+                            (now - self.namespace_ttl,),
+                        ),
+                    )
+                )
+
+            if self.max_namespaces is not None:
+                evicted.extend(
+                    self._delete(
+                        connection,
+                        connection.execute(
+                            "SELECT id FROM namespaces ORDER BY last_used DESC "
+                            "LIMIT -1 OFFSET ?",
+                            (self.max_namespaces,),
+                        ),
+                    )
+                )
+
+            if self.max_bytes is not None:
+                total = 0
+                over_budget = []
+                for namespace_id, size in connection.execute(
+                    "SELECT id, size FROM namespaces ORDER BY last_used DESC"
+                ):
+                    total += size
+                    if total > self.max_bytes:
+                        over_budget.append((namespace_id,))
+                evicted.extend(self._delete(connection, over_budget))
+
+        for namespace_id in evicted:
+            self.namespaces.pop(namespace_id, None)
+
+        # Drop local copies which haven't been used by this process in a while.
+        # They're reloaded from the database if they're used again.
+        super().reap()
+        return evicted
+
+    def apply(self, namespace: Namespace, operations: Operations):
+        operations = self._intern(operations)
+        with self.transaction() as connection:
+            shared = self._sync(connection, namespace.id)
+            assert shared is not None
+
+            shared.apply(operations)
+            for action, route in operations:
+                fields = route.model_dump(
+                    by_alias=True, exclude={"action", "namespace_id"}
+                )
+                operation = Operation(action=action, **fields)
+                cursor = connection.execute(
+                    "INSERT INTO operations (namespace_id, operation) VALUES (?, ?)",
+                    (namespace.id, pickle.dumps(operation)),
+                )
+                assert cursor.lastrowid is not None
+                shared.operation_id = cursor.lastrowid
+
+            connection.execute(
+                "UPDATE namespaces SET last_used = ?, size = size + ? WHERE id = ?",
+                (
+                    time.time(),
+                    sum(route_size(route) for _, route in operations),
+                    namespace.id,
+                ),
+            )
+
+    def reset_namespace(self, namespace: Namespace):
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE namespaces SET generation = generation + 1, size = 0 "
+                "WHERE id = ?",
+                (namespace.id,),
+            )
+            # A clone keeps the operations copied from the namespace it was cloned
+            # from.
+            connection.execute(
+                "DELETE FROM operations WHERE namespace_id = ? AND id > "
+                "(SELECT origin_operation_id FROM namespaces WHERE id = ?)",
+                (namespace.id, namespace.id),
+            )
+            connection.execute(
+                "DELETE FROM calls WHERE namespace_id = ?", (namespace.id,)
+            )
+            self._sync(connection, namespace.id)
+
+    def configure(self, namespace: Namespace, **settings: Optional[BaseModel]):
+        super().configure(namespace, **settings)
+        with self.transaction() as connection:
+            for name, value in settings.items():
+                connection.execute(
+                    "UPDATE namespaces SET options = json_set(options, ?, json(?)), "
+                    "last_used = ? WHERE id = ?",
+                    (
+                        f"$.{name}",
+                        "null" if value is None else value.model_dump_json(),
+                        time.time(),
+                        namespace.id,
+                    ),
+                )
+
+            retention = settings.get("retention")
+            if isinstance(retention, Retention) and retention.max_calls:
+                connection.execute(
+                    "UPDATE namespaces SET size = size - ? WHERE id = ?",
+                    (
+                        self._trim_calls(connection, namespace.id, retention.max_calls),
+                        namespace.id,
+                    ),
+                )
+
+    def record_calls(self, namespace: Namespace):
+        calls = namespace.drain_calls()
+        if not calls:
+            return
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO calls (namespace_id, call, size, method, url, route) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        namespace.id,
+                        pickle.dumps(call),
+                        call.size,
+                        call.method,
+                        call.url,
+                        call.route,
+                    )
+                    for call in calls
+                ],
+            )
+            size = sum(call.size for call in calls)
+
+            max_calls = namespace.retention and namespace.retention.max_calls
+            if max_calls:
+                size -= self._trim_calls(connection, namespace.id, max_calls)
+
+            connection.execute(
+                "UPDATE namespaces SET last_used = ?, size = size + ? WHERE id = ?",
+                (time.time(), size, namespace.id),
+            )
+
+    def _trim_calls(
+        self, connection: sqlite3.Connection, namespace_id: str, max_calls: int
+    ) -> int:
+        """Discard the oldest calls beyond `max_calls`, returning their total size.
+
+        Other processes may not have counted the discarded calls yet, so their
+        rows are kept (with just the fields `CallCounts` needs) until the
+        namespace is reset.
+        """
+        row = connection.execute(
+            "SELECT id FROM calls WHERE namespace_id = ? AND call IS NOT NULL "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (namespace_id, max_calls),
+        ).fetchone()
+        if row is None:
+            return 0
+
+        (size,) = connection.execute(
+            "SELECT SUM(size) FROM calls WHERE namespace_id = ? AND id <= ?",
+            (namespace_id, row[0]),
+        ).fetchone()
+        connection.execute(
+            "UPDATE calls SET call = NULL, size = 0 "
+            "WHERE namespace_id = ? AND id <= ? AND call IS NOT NULL",
+            (namespace_id, row[0]),
+        )
+        return size
+
+    def sync_calls(self, namespace: Namespace):
+        assert isinstance(namespace, SharedNamespace)
+        rows = self.connection.execute(
+            "SELECT id, call, method, url, route FROM calls "
+            "WHERE namespace_id = ? AND id > ? ORDER BY id",
+            (namespace.id, namespace.call_id),
+        ).fetchall()
+        if not rows:
+            return
+
+        calls = []
+        for _, call, method, url, route in rows:
+            if call is None:
+                # Discarded (see `_trim_calls`) before this process saw it.
+                namespace.counts.record(CallRecord(method, url, {}, route=route))
+            else:
+                calls.append(pickle.loads(call))  # noqa: S301
+        namespace.record_calls(calls)
+        namespace.call_id = rows[-1][0]
+
+    def calls_since(
+        self, namespace: Namespace, cursor: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[CallRecord], int]:
+        # Cursors are call ids, so only the requested calls need to be loaded.
+        rows = self.connection.execute(
+            "SELECT id, call FROM calls WHERE namespace_id = ? AND id > ? "
+            "AND call IS NOT NULL ORDER BY id LIMIT ?",
+            (namespace.id, cursor, -1 if limit is None else limit),
+        ).fetchall()
+        if not rows:
+            return [], cursor
+
+        calls = [pickle.loads(call) for _, call in rows]  # noqa: S301
+        return calls, rows[-1][0]
+
+    def query_calls(
+        self, namespace: Namespace, query: CallQuery
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        # Calls are unpickled as they're searched, and the search stops at `limit`.
+        rows = self.connection.execute(
+            "SELECT id, call FROM calls WHERE namespace_id = ? AND id > ? "
+            "AND call IS NOT NULL ORDER BY id",
+            (namespace.id, query.since),
+        )
+        return query.select((id, pickle.loads(call)) for id, call in rows)  # noqa: S301
+
+    def _new_namespace(
+        self,
+        namespace_id: str,
+        shaping: Optional[Shaping] = None,
+        profiling: Optional[Profiling] = None,
+        templates: Sequence[str] = (),
+        **options: Any,
+    ) -> SharedNamespace:
+        # Templates are loaded by every process, so their routes are applied
+        # locally rather than being written to the database.
+        origin = self._origin(templates, **options)
+        return SharedNamespace(
+            namespace_id,
+            IndexedRequestsMock(**options) if origin is None else origin.fork(),
+            shaping=shaping,
+            profiling=profiling,
+            origin=origin,
+        )
+
+    def _delete(
+        self, connection: sqlite3.Connection, rows: Iterable[Tuple[str]]
+    ) -> List[str]:
+        namespace_ids = [row[0] for row in rows]
+        for table, column in (
+            ("namespaces", "id"),
+            ("operations", "namespace_id"),
+            ("calls", "namespace_id"),
+        ):
+            connection.executemany(
+                f"DELETE FROM {table} WHERE {column} = ?",  # noqa: S608
+                [(namespace_id,) for namespace_id in namespace_ids],
+            )
+        return namespace_ids
+
+    def _sync(
+        self, connection: sqlite3.Connection, namespace_id: str
+    ) -> Optional[SharedNamespace]:
+        """Bring the local copy of a namespace up to date with the database."""
+        row = connection.execute(
+            "SELECT options, generation, "
+            "(SELECT MAX(id) FROM operations WHERE namespace_id = namespaces.id) "
+            "FROM namespaces WHERE id = ?",
+            (namespace_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        options, generation, operation_id = row
+        options = json.loads(options)
+        settings = {
+            name: None if value is None else model(**value)
+            for name, model in SETTINGS.items()
+            for value in [options.pop(name, None)]
+        }
+
+        namespace = self.namespaces.get(namespace_id)
+        if namespace is None:
+            namespace = self._new_namespace(namespace_id, **options)
+            self.namespaces[namespace_id] = namespace
+        assert isinstance(namespace, SharedNamespace)
+        if settings["profiling"] != namespace.profiling:
+            namespace.slowest = []
+        for name, value in settings.items():
+            setattr(namespace, name, value)
+
+        if namespace.generation != generation:
+            namespace.reset()
+            namespace.generation = generation
+            namespace.operation_id = namespace.origin_operation_id
+            namespace.call_id = 0
+
+        if operation_id is not None and operation_id != namespace.operation_id:
+            rows = connection.execute(
+                "SELECT id, operation FROM operations "
+                "WHERE namespace_id = ? AND id > ? ORDER BY id",
+                (namespace_id, namespace.operation_id),
+            ).fetchall()
+            operations: List[Operation] = [
+                pickle.loads(row[1]) for row in rows  # noqa: S301
+            ]
+            namespace.apply([(operation.action, operation) for operation in operations])
+            namespace.operation_id = rows[-1][0]
+
+        return namespace
+
+
+# Namespace settings, which are stored in the namespace's options.
+SETTINGS: Dict[str, Type[BaseModel]] = {
+    "shaping": Shaping,
+    "profiling": Profiling,
+    "proxy": Proxy,
+    "retention": Retention,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (
+    id TEXT PRIMARY KEY,
+    options TEXT NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    origin_operation_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace_id TEXT NOT NULL,
+    operation BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS operations_namespace ON operations (namespace_id, id);
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace_id TEXT NOT NULL,
+    call BLOB,
+    size INTEGER NOT NULL DEFAULT 0,
+    method TEXT,
+    url TEXT,
+    route TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_namespace ON calls (namespace_id, id);
+"""
+
+
+def create_state(
+    shared_state: Optional[str] = None,
+    *,
+    body_dir: Optional[str] = None,
+    file_root: Optional[str] = None,
+    templates: Sequence[str] = (),
+    **limits: Any,
+) -> State:
+    """Create the server's state.
+
+    If `shared_state` is a path, namespaces are shared between all server
+    processes using the same path, allowing the server to run multiple workers.
+    `body_dir` and `file_root` configure the `BodyStore`. `templates` are paths
+    of template files (or directories of them). `limits` are forwarded to the
+    state (see `State`).
+    """
+    if shared_state and body_dir is None:
+        # Every process must be able to serve the bodies stored by the others.
+        body_dir = f"{shared_state}.bodies"
+
+    bodies = BodyStore(body_dir, file_root=file_root)
+    loaded = load_templates(templates, bodies)
+    if shared_state:
+        return SharedState(path=shared_state, bodies=bodies, templates=loaded, **limits)
+    return State(bodies=bodies, templates=loaded, **limits)
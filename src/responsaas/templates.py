@@ -0,0 +1,121 @@
+"""Named sets of routes, loaded from files when the server starts.
+
+A namespace can be created pre-populated with the routes of any number of
+templates, so that clients need only register the routes specific to them.
+
+Template files are YAML (requires `PyYAML`) or JSON:
+
+```yaml
+name: github  # Defaults to the file's name, without its extension.
+routes:
+  - url: /user
+    json: {"login": "octocat"}
+  - method: POST
+    pattern: "/repos/[^/]+/issues"  # A regular expression.
+    status: 201
+    match:
+      - [query_param_matcher, {"draft": "false"}]  # A `responses.matchers` function.
+  - url: /archive.tar.gz
+    body_file: archive.tar.gz  # Relative to the template file.
+```
+
+Routes are validated and compiled once, when loaded. Templates are read-only;
+they're applied as the first routes of a namespace (and reapplied when it's
+reset), so a client overrides a template's route with `replace` or `upsert`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import re
+from typing import Any, Dict, Iterable, List
+
+from responses import matchers
+
+from responsaas.bodies import BodyStore
+from responsaas.operations import RouteSpec
+
+try:
+    import yaml  # type: ignore[import-untyped,unused-ignore]
+except ImportError:  # pragma: no cover
+    yaml = None  # type: ignore[assignment]
+
+Templates = Dict[str, List[RouteSpec]]
+
+extensions = (".json", ".yaml", ".yml")
+
+
+def load_templates(paths: Iterable[str], bodies: BodyStore) -> Templates:
+    """Load the templates in the given files, or directories of files."""
+    templates: Templates = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(extensions)
+            )
+        else:
+            files = [path]
+
+        for file in files:
+            name, routes = load_template(file, bodies)
+            if name in templates:
+                raise ValueError(f"Duplicate template name '{name}', in {file}")
+            templates[name] = routes
+    return templates
+
+
+def load_template(path: str, bodies: BodyStore):
+    with open(path) as f:
+        if path.endswith(".json"):
+            content = json.load(f)
+        else:
+            if yaml is None:  # pragma: no cover
+                raise RuntimeError(f"PyYAML is required to load {path}")
+            content = yaml.safe_load(f)
+
+    name = content.get("name") or os.path.splitext(os.path.basename(path))[0]
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        routes = [
+            compile_route(route, directory, bodies)
+            for route in content.get("routes") or []
+        ]
+    except Exception as e:
+        raise ValueError(f"Invalid template '{name}', in {path}: {e}") from e
+    return name, routes
+
+
+def compile_route(raw: Dict[str, Any], directory: str, bodies: BodyStore) -> RouteSpec:
+    raw = dict(raw)
+
+    pattern = raw.pop("pattern", None)
+    if pattern is not None:
+        raw["pattern"] = pickle.dumps(re.compile(pattern))
+
+    match = raw.pop("match", None)
+    if match is not None:
+        raw["match"] = [
+            (pickle.dumps(getattr(matchers, matcher)), args) for matcher, args in match
+        ]
+
+    body = raw.pop("body", None)
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    raw["body"] = body
+
+    body_file = raw.pop("body_file", None)
+    if body_file is not None:
+        # Template files are trusted, so aren't limited to the `file_root`.
+        path = os.path.join(directory, body_file)
+        if not os.path.isfile(path):
+            raise ValueError(f"No such body_file: {path}")
+        raw["body_file"] = path
+
+    route = RouteSpec(**raw)
+    if route.body_file is None:
+        route = bodies.intern(route)
+    return route
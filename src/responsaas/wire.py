@@ -0,0 +1,94 @@
+"""Encoding of control plane (`/__responsaas__/*`) requests and responses.
+
+JSON is always supported. If `msgpack` is installed, requests may instead be
+sent as msgpack (`Content-Type: application/msgpack`), and responses are sent as
+msgpack to clients which accept it (`Accept: application/msgpack`).
+
+msgpack supports raw bytes, so bodies, pickled matchers/patterns and pickled
+calls are sent as-is, rather than base64 encoded within JSON.
+"""
+
+from __future__ import annotations
+
+import base64
+from typing import Any, Callable, Coroutine, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    return msgpack is not None and bool(accept) and MSGPACK in str(accept)
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return bool(content_type) and str(content_type).startswith(MSGPACK)
+
+
+def dumps(content: Any) -> bytes:
+    assert msgpack is not None
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def loads(content: bytes) -> Any:
+    assert msgpack is not None
+    return msgpack.unpackb(content, raw=False)
+
+
+def encode_bytes(content: Any) -> Any:
+    """Base64 encode any bytes within `content`, so that it's JSON serializable."""
+    if isinstance(content, bytes):
+        return base64.b64encode(content).decode("utf-8")
+    if isinstance(content, dict):
+        return {key: encode_bytes(value) for key, value in content.items()}
+    if isinstance(content, (list, tuple)):
+        return [encode_bytes(value) for value in content]
+    return content
+
+
+def decode_bytes(content: Any) -> bytes:
+    """Accept bytes sent either raw (msgpack) or base64 encoded (JSON)."""
+    if isinstance(content, str):
+        return base64.b64decode(content.encode("utf-8"))
+    return content
+
+
+def respond(request: Request, content: Any) -> Response:
+    if accepts_msgpack(request.headers.get("accept")):
+        return Response(dumps(content), media_type=MSGPACK)
+    return JSONResponse(encode_bytes(content))
+
+
+class MsgpackRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+
+class WireRoute(APIRoute):
+    """Decode msgpack request bodies as though they were JSON."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if msgpack is not None and is_msgpack(request.headers.get("content-type")):
+                # FastAPI only parses bodies it believes are JSON.
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (key, b"application/json" if key == b"content-type" else value)
+                    for key, value in request.scope["headers"]
+                ]
+                request = MsgpackRequest(scope, request.receive)
+            return await handler(request)
+
+        return route_handler
@@ -1,7 +1,9 @@
 from responsaas.pytest import (
+    create_async_responsaas_fixture,
     create_responsaas_fixture,
     create_responsaas_server_fixture,
 )
 
 responsaas_server = create_responsaas_server_fixture()
 responsaas = create_responsaas_fixture()
+async_responsaas = create_async_responsaas_fixture()
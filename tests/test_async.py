@@ -0,0 +1,60 @@
+import re
+
+import httpx
+import pytest
+
+from responsaas.async_api import AsyncResponsaas
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def test_get(async_responsaas: AsyncResponsaas):
+    await async_responsaas.get("/foo", json={"foo": True})
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(async_responsaas.base_url + "/foo")
+    assert response.json() == {"foo": True}
+
+    await async_responsaas.assert_call_count("/foo", 1)
+    calls = await async_responsaas.calls()
+    assert len(calls) == 1
+
+
+async def test_batch_and_upsert(async_responsaas: AsyncResponsaas):
+    async with async_responsaas.batch():
+        await async_responsaas.get("/foo", body="one")
+        await async_responsaas.get(re.compile(r"/bar/\d+"), body="bar")
+
+    await async_responsaas.upsert("GET", "/foo", body="two")
+    await async_responsaas.upsert("GET", "/baz", body="baz")
+
+    async with httpx.AsyncClient() as client:
+        base_url = async_responsaas.base_url
+        assert (await client.get(base_url + "/foo")).text == "two"
+        assert (await client.get(base_url + "/bar/1")).text == "bar"
+        assert (await client.get(base_url + "/baz")).text == "baz"
+
+    counts = await async_responsaas.call_counts()
+    assert counts["path"] == {"/foo": 1, "/bar/1": 1, "/baz": 1}
+
+    calls = await async_responsaas.query_calls(path_prefix="/ba", fields=["path"])
+    assert calls == [{"path": "/bar/1"}, {"path": "/baz"}]
+
+
+async def test_reset(async_responsaas: AsyncResponsaas):
+    await async_responsaas.get("/foo", body="one")
+
+    async with httpx.AsyncClient() as client:
+        await client.get(async_responsaas.base_url + "/foo")
+        await async_responsaas.reset()
+        response = await client.get(async_responsaas.base_url + "/foo")
+
+    assert response.status_code == 500
+    calls, cursor = await async_responsaas.fetch_calls()
+    assert len(calls) == 1
+    assert await async_responsaas.fetch_calls(cursor) == ([], cursor)
@@ -1,7 +1,7 @@
 import textwrap
 
 import requests
-from responsaas.api import Responsaas, matchers
+from responsaas.api import Responsaas, ResponsaasServer, matchers
 
 
 def test_get_request(responsaas: Responsaas):
@@ -28,6 +28,17 @@ def test_match(responsaas: Responsaas):
     assert textwrap.dedent(text) in response.text
 
 
+def test_no_match(responsaas: Responsaas):
+    responsaas.get("/foo")
+
+    response = requests.get(f"{responsaas.base_url}/bar", timeout=1)
+    assert response.status_code == 500
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert response.text.startswith("Connection refused by Responses")
+    assert "Request: \n- GET /bar\n\nAvailable matches:" in response.text
+    assert "Traceback" not in response.text
+
+
 def test_call_count(responsaas: Responsaas):
     responsaas.get("/foo", json={"hey": "there"})
 
@@ -46,3 +57,57 @@ def test_calls(responsaas: Responsaas):
     assert len(calls) == 2
     assert calls[0].request.url == "/foo"
     assert calls[0].response.json() == {"hey": "there"}
+
+
+def test_exit_removes_namespace(responsaas: Responsaas):
+    server = ResponsaasServer(responsaas.server_url)
+    with server.activate() as scoped:
+        scoped.get("/foo", json={"hey": "there"})
+
+    response = requests.get(f"{scoped.base_url}/foo", timeout=1)
+    assert response.status_code == 400
+
+
+def test_json_body_match(responsaas: Responsaas):
+    responsaas.post(
+        "/foo",
+        json={"ok": True},
+        match=[(matchers.json_params_matcher, {"a": [1, 2]})],
+    )
+
+    response = requests.post(
+        f"{responsaas.base_url}/foo", json={"a": [1, 2]}, timeout=1
+    )
+    assert response.json() == {"ok": True}
+
+    response = requests.post(f"{responsaas.base_url}/foo", json={"a": [1]}, timeout=1)
+    assert response.status_code == 500
+
+    [call, _] = responsaas.calls()
+    assert call.request.body == b'{"a": [1, 2]}'
+
+
+def test_repeated_query_params(responsaas: Responsaas):
+    responsaas.get(
+        "/foo",
+        json={"ok": True},
+        match=[(matchers.query_param_matcher, {"q": ["1", "2"]})],
+    )
+
+    response = requests.get(f"{responsaas.base_url}/foo?q=1&q=2", timeout=1)
+    assert response.json() == {"ok": True}
+    assert responsaas.call_count("/foo?q=1&q=2") == 1
+
+
+def test_unpickle_cache(responsaas: Responsaas):
+    url = f"{responsaas.server_url}/__responsaas__/unpickle_cache"
+    before = requests.post(url, timeout=1).json()
+
+    for i in range(3):
+        responsaas.get(
+            f"/foo/{i}", match=[(matchers.query_param_matcher, {"q": str(i)})]
+        )
+
+    after = requests.post(url, timeout=1).json()
+    assert after["hits"] + after["misses"] == before["hits"] + before["misses"] + 3
+    assert after["hits"] >= before["hits"] + 2
@@ -0,0 +1,68 @@
+import pytest
+import requests
+from responsaas.api import Responsaas, matchers
+
+
+def test_batch(responsaas: Responsaas):
+    with responsaas.batch():
+        responsaas.get("/foo", json={"foo": True})
+        responsaas.post("/bar", status=201)
+        responsaas.get(
+            "/baz", json={"q": 4}, match=[(matchers.query_param_matcher, {"q": 4})]
+        )
+
+        # Nothing has been sent yet.
+        response = requests.get(f"{responsaas.base_url}/foo", timeout=1)
+        assert response.status_code == 500
+
+    response = requests.get(f"{responsaas.base_url}/foo", timeout=1)
+    assert response.json() == {"foo": True}
+
+    response = requests.post(f"{responsaas.base_url}/bar", timeout=1)
+    assert response.status_code == 201
+
+    response = requests.get(f"{responsaas.base_url}/baz?q=4", timeout=1)
+    assert response.json() == {"q": 4}
+
+
+def test_batch_in_order(responsaas: Responsaas):
+    with responsaas.batch():
+        responsaas.get("/foo", json={"foo": 1})
+        responsaas.replace(responsaas.GET, "/foo", json={"foo": 2})
+        responsaas.upsert(responsaas.GET, "/bar", json={"bar": 1})
+        responsaas.add(responsaas.GET, "/baz")
+        responsaas.remove(responsaas.GET, "/baz")
+
+    response = requests.get(f"{responsaas.base_url}/foo", timeout=1)
+    assert response.json() == {"foo": 2}
+
+    response = requests.get(f"{responsaas.base_url}/bar", timeout=1)
+    assert response.json() == {"bar": 1}
+
+    response = requests.get(f"{responsaas.base_url}/baz", timeout=1)
+    assert response.status_code == 500
+
+
+def test_batch_atomic(responsaas: Responsaas):
+    responsaas.get("/foo", json={"foo": 1})
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        with responsaas.batch():
+            responsaas.get("/bar", json={"bar": 1})
+            responsaas.replace(responsaas.GET, "/missing", json={})
+
+    response = requests.get(f"{responsaas.base_url}/foo", timeout=1)
+    assert response.json() == {"foo": 1}
+
+    response = requests.get(f"{responsaas.base_url}/bar", timeout=1)
+    assert response.status_code == 500
+
+
+def test_batch_discarded_on_error(responsaas: Responsaas):
+    with pytest.raises(RuntimeError):
+        with responsaas.batch():
+            responsaas.get("/foo", json={"foo": 1})
+            raise RuntimeError()
+
+    response = requests.get(f"{responsaas.base_url}/foo", timeout=1)
+    assert response.status_code == 500
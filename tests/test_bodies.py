@@ -0,0 +1,108 @@
+import os
+import uuid
+
+import pytest
+import requests
+
+from responsaas import Responsaas
+from responsaas.bodies import BodyStore
+from responsaas.operations import RouteSpec
+
+
+def test_body_store_dedup(tmp_path):
+    store = BodyStore(str(tmp_path), threshold=10)
+
+    small = RouteSpec(url="/foo", body=b"small")
+    assert store.intern(small) is small
+
+    first = store.intern(RouteSpec(url="/foo", body=b"x" * 100))
+    second = store.intern(RouteSpec(url="/bar", body=b"x" * 100))
+    assert first.body is None
+    assert first.body_file == second.body_file
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_body_store_file_root(tmp_path):
+    (tmp_path / "foo.txt").write_bytes(b"foo")
+
+    store = BodyStore(str(tmp_path / "store"))
+    with pytest.raises(Exception, match="not enabled"):
+        store.intern(RouteSpec(url="/foo", body_file="foo.txt"))
+
+    store = BodyStore(str(tmp_path / "store"), file_root=str(tmp_path))
+    route = store.intern(RouteSpec(url="/foo", body_file="foo.txt"))
+    assert route.body_file == str(tmp_path / "foo.txt")
+
+    for name in ("../foo.txt", "/etc/passwd", "missing.txt"):
+        with pytest.raises(Exception, match="Invalid body_file"):
+            store.intern(RouteSpec(url="/foo", body_file=name))
+
+
+def test_large_body(responsaas: Responsaas):
+    body = os.urandom(1024 * 1024)
+    responsaas.get("/foo", body=body, content_type="application/octet-stream")
+
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    assert response.status_code == 200
+    assert response.content == body
+    assert response.headers["Content-Type"] == "application/octet-stream"
+    assert response.headers["Content-Length"] == str(len(body))
+    responsaas.assert_call_count("/foo", 1)
+
+
+def test_large_body_calls(responsaas: Responsaas):
+    body = os.urandom(100 * 1024)
+    responsaas.get("/foo", body=body)
+    requests.get(responsaas.base_url + "/foo", timeout=10)
+
+    # Bodies served from the store are read back when calls are retrieved.
+    [call] = responsaas.calls()
+    assert call.response.content == body
+    [call] = responsaas.query_calls(fields=["response_body"], max_body=10)
+    assert call == {"response_body": body[:10]}
+
+    responsaas.retain(bodies="truncate", max_body=10)
+    requests.get(responsaas.base_url + "/foo", timeout=10)
+    call = responsaas.calls()[-1]
+    assert call.response.content == body[:10]
+
+
+def test_body_digest(responsaas: Responsaas):
+    body = b"digest" * 1000
+    digest = responsaas.store_body(body)
+
+    responsaas.get("/foo", body_digest=digest, status=201)
+    responsaas.get(
+        "/bar", body_digest=digest, shaping={"chunk_size": 100, "ttfb": 0.01}
+    )
+
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    assert response.status_code == 201
+    assert response.content == body
+
+    response = requests.get(responsaas.base_url + "/bar", timeout=10)
+    assert response.content == body
+
+
+def test_body_digest_unknown(responsaas: Responsaas):
+    with pytest.raises(requests.HTTPError):
+        responsaas.get("/foo", body_digest="0" * 64)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("RESPONSAAS_FILE_ROOT"),
+    reason="Requires the server's RESPONSAAS_FILE_ROOT",
+)
+def test_body_file(responsaas: Responsaas):
+    name = f"{uuid.uuid4()}.json"
+    path = os.path.join(os.environ["RESPONSAAS_FILE_ROOT"], name)
+    with open(path, "wb") as f:
+        f.write(b'{"foo": true}')
+
+    try:
+        responsaas.get("/foo", body_file=name, content_type="application/json")
+        response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    finally:
+        os.remove(path)
+
+    assert response.json() == {"foo": True}
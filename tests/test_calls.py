@@ -1,3 +1,6 @@
+import re
+
+import pytest
 import requests
 from responsaas.api import Responsaas
 
@@ -28,3 +31,135 @@ def test_calls(responsaas: Responsaas):
     assert len(calls) == 2
     assert calls[0].request.url == "/foo"
     assert calls[0].response.json() == {"hey": "there"}
+
+
+def test_calls_since(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+
+    requests.get(f"{responsaas.base_url}/foo?q=1", timeout=1)
+    requests.get(f"{responsaas.base_url}/foo?q=2", timeout=1)
+    requests.get(f"{responsaas.base_url}/foo?q=3", timeout=1)
+
+    calls, cursor = responsaas.fetch_calls(limit=2)
+    assert [call.request.url for call in calls] == ["/foo?q=1", "/foo?q=2"]
+
+    calls = responsaas.calls(since=cursor)
+    assert [call.request.url for call in calls] == ["/foo?q=3"]
+
+
+def test_call_log(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    log = responsaas.call_log()
+
+    requests.get(f"{responsaas.base_url}/foo?q=1", timeout=1)
+    assert [call.request.url for call in log.poll()] == ["/foo?q=1"]
+    assert log.poll() == []
+
+    requests.get(f"{responsaas.base_url}/foo?q=2", timeout=1)
+    requests.get(f"{responsaas.base_url}/foo?q=3", timeout=1)
+    assert len(log.poll(limit=1)) == 1
+    assert len(log.poll()) == 1
+    assert [call.request.url for call in log.calls] == [
+        "/foo?q=1",
+        "/foo?q=2",
+        "/foo?q=3",
+    ]
+
+
+def test_call_log_reset(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    log = responsaas.call_log()
+
+    requests.get(f"{responsaas.base_url}/foo?q=1", timeout=1)
+    assert len(log.poll()) == 1
+
+    responsaas.reset()
+    responsaas.get("/foo", json={"hey": "there"})
+    requests.get(f"{responsaas.base_url}/foo?q=2", timeout=1)
+    assert [call.request.url for call in log.poll()] == ["/foo?q=2"]
+
+
+def test_call_counts(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    responsaas.post(re.compile("/bar/.*"), json={"hey": "there"})
+
+    requests.get(f"{responsaas.base_url}/foo?q=1", timeout=1)
+    requests.get(f"{responsaas.base_url}/foo?q=2", timeout=1)
+    requests.post(f"{responsaas.base_url}/bar/1", timeout=1)
+    requests.post(f"{responsaas.base_url}/bar/2", timeout=1)
+    requests.get(f"{responsaas.base_url}/bar/3", timeout=1)
+
+    assert responsaas.call_counts() == {
+        "url": {"/foo?q=1": 1, "/foo?q=2": 1, "/bar/1": 1, "/bar/2": 1, "/bar/3": 1},
+        "path": {"/foo": 2, "/bar/1": 1, "/bar/2": 1, "/bar/3": 1},
+        "method_path": {
+            "GET /foo": 2,
+            "POST /bar/1": 1,
+            "POST /bar/2": 1,
+            "GET /bar/3": 1,
+        },
+        "route": {"GET /foo": 2, "POST re:/bar/.*": 2},
+    }
+
+
+def test_call_counts_reset(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    requests.get(f"{responsaas.base_url}/foo", timeout=1)
+    responsaas.reset()
+
+    assert responsaas.call_count("/foo") == 0
+    assert responsaas.call_counts()["path"] == {}
+
+
+def test_query_calls(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    responsaas.post(re.compile("/bar/.*"), body="bar", status=201)
+
+    requests.get(f"{responsaas.base_url}/foo?q=1&r=2", timeout=1)
+    requests.get(f"{responsaas.base_url}/foo?q=2", headers={"X-Foo": "1"}, timeout=1)
+    requests.post(f"{responsaas.base_url}/bar/1", data=b"12345", timeout=1)
+    requests.post(f"{responsaas.base_url}/bar/2", timeout=1)
+    requests.get(f"{responsaas.base_url}/baz", timeout=1)
+
+    def urls(**query):
+        return [call["url"] for call in responsaas.query_calls(**query)]
+
+    assert urls(method="post") == ["/bar/1", "/bar/2"]
+    assert urls(path_prefix="/ba") == ["/bar/1", "/bar/2", "/baz"]
+    assert urls(path_regex=r"/bar/\d") == ["/bar/1", "/bar/2"]
+    assert urls(query={"q": "2"}) == ["/foo?q=2"]
+    assert urls(headers={"x-foo": "1"}) == ["/foo?q=2"]
+    assert urls(status=201) == ["/bar/1", "/bar/2"]
+    assert urls(route="GET /foo", query={"r": "2"}) == ["/foo?q=1&r=2"]
+
+    # Calls which matched no route have no route or status.
+    assert responsaas.query_calls(path_prefix="/baz") == [
+        {"method": "GET", "url": "/baz", "route": None, "status": None}
+    ]
+
+    [call] = responsaas.query_calls(
+        method="POST",
+        fields=["path", "body", "response_body"],
+        max_body=2,
+        limit=1,
+    )
+    assert call == {"path": "/bar/1", "body": b"12", "response_body": b"ba"}
+
+
+def test_query_calls_since(responsaas: Responsaas):
+    responsaas.get("/foo", json={"hey": "there"})
+    for q in range(4):
+        requests.get(f"{responsaas.base_url}/foo?q={q}", timeout=1)
+
+    _, cursor = responsaas.fetch_calls(limit=1)
+    assert [call["url"] for call in responsaas.query_calls(since=cursor, limit=2)] == [
+        "/foo?q=1",
+        "/foo?q=2",
+    ]
+
+
+def test_query_calls_invalid(responsaas: Responsaas):
+    with pytest.raises(requests.HTTPError):
+        responsaas.query_calls(path_regex="(")
+    with pytest.raises(requests.HTTPError):
+        responsaas.query_calls(fields=["foo"])
@@ -0,0 +1,26 @@
+import cappa
+
+from responsaas.__main__ import Cli
+
+
+def test_defaults():
+    cli = cappa.parse(Cli, argv=[])
+    assert cli.port == 7564
+    assert cli.workers == 1
+    assert cli.debug is False
+    assert cli.access_log is False
+
+
+def test_environment(monkeypatch):
+    monkeypatch.setenv("RESPONSAAS_MAX_NAMESPACES", "10")
+
+    cli = cappa.parse(
+        Cli, argv=["-w", "4", "--loop", "asyncio", "--namespace-ttl", "60"]
+    )
+    assert cli.workers == 4
+    assert cli.loop == "asyncio"
+    assert cli.namespace_ttl == 60
+    assert cli.max_namespaces == 10
+    assert Cli.environ(RESPONSAAS_NAMESPACE_TTL=60.0, RESPONSAAS_DEBUG=None) == {
+        "RESPONSAAS_NAMESPACE_TTL": "60.0"
+    }
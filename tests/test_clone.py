@@ -0,0 +1,176 @@
+import pytest
+import requests
+from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
+from responsaas import Responsaas
+from responsaas.api import ResponsaasServer
+from responsaas.operations import RouteSpec
+from responsaas.pytest import create_responsaas_fixture, resolve_server_url
+from responsaas.registry import IndexedRequestsMock
+from responsaas.state import SharedState, State
+
+
+@pytest.fixture(scope="module")
+def module_responsaas(responsaas_server):
+    url = resolve_server_url(responsaas_server, None)
+    with ResponsaasServer(url).activate() as responsaas:
+        responsaas.get("/common", json={"common": True})
+        yield responsaas
+
+
+cloned_responsaas = create_responsaas_fixture(clone="module_responsaas")
+
+
+def send(mock: IndexedRequestsMock, method: str, url: str):
+    request = requests.PreparedRequest()
+    request.prepare(method=method, url="http://_/")
+    request.url = url
+    return mock._on_request(HTTPAdapter(), request)
+
+
+def test_fork_copy_on_write():
+    parent = IndexedRequestsMock()
+    parent.add("GET", "/foo", json=1)
+    parent.add("GET", "/bar", json=1)
+
+    fork = parent.fork()
+    assert fork.registered() is parent.registered()
+
+    fork.replace("GET", "/foo", json=2)
+    fork.add("GET", "/baz", json=2)
+    parent.remove("GET", "/bar")
+
+    assert send(parent, "GET", "/foo").json() == 1
+    assert send(fork, "GET", "/foo").json() == 2
+    assert send(fork, "GET", "/bar").json() == 1
+    with pytest.raises(requests.ConnectionError):
+        send(parent, "GET", "/baz")
+
+
+def test_fork_call_counts():
+    parent = IndexedRequestsMock(assert_all_requests_are_fired=True)
+    parent.add("GET", "/foo", json=1)
+    parent.add("GET", "/bar", json=1)
+    send(parent, "GET", "/foo")
+
+    fork = parent.fork()
+    send(fork, "GET", "/bar")
+    send(fork, "GET", "/bar")
+
+    assert [r.call_count for r in parent.registered()] == [1, 0]
+    registry = fork.get_registry()
+    assert [registry.call_count(r) for r in fork.registered()] == [0, 2]
+
+    # The parent's call to "/foo" doesn't count towards the fork.
+    with pytest.raises(AssertionError) as e:
+        fork.stop()
+    assert "/foo" in str(e.value)
+
+
+def test_fork_multiple_matches():
+    parent = IndexedRequestsMock()
+    parent.add("GET", "/foo", json=1)
+    parent.add("GET", "/foo", json=2)
+    fork = parent.fork()
+
+    # Each consumes the first of multiple matches independently.
+    assert send(parent, "GET", "/foo").json() == 1
+    assert send(fork, "GET", "/foo").json() == 1
+    assert send(fork, "GET", "/foo").json() == 2
+    assert send(parent, "GET", "/foo").json() == 2
+    assert len(fork.registered()) == 1
+
+
+def test_fork_multiple_matches_fork_first():
+    parent = IndexedRequestsMock(assert_all_requests_are_fired=True)
+    parent.add("GET", "/foo", json=1)
+    parent.add("GET", "/foo", json=2)
+    fork = parent.fork()
+
+    # The fork's call doesn't consume (or count towards) the parent's responses.
+    assert send(fork, "GET", "/foo").json() == 1
+    assert [r.call_count for r in parent.registered()] == [0, 0]
+
+    assert send(parent, "GET", "/foo").json() == 1
+    with pytest.raises(AssertionError):
+        parent.stop()
+
+    assert send(parent, "GET", "/foo").json() == 2
+    assert [r.call_count for r in parent.registered()] == [1]
+
+
+def test_clone_namespace():
+    state = State()
+    parent = state.get_namespace(state.create_namespace())
+    state.apply(parent, [("add", RouteSpec(url="/foo", json={"foo": 1}))])
+
+    clone = state.get_namespace(state.clone_namespace(parent))
+    state.apply(clone, [("add", RouteSpec(url="/bar"))])
+    assert [r.url for r in clone.responses.registered()] == ["/foo", "/bar"]
+    assert [r.url for r in parent.responses.registered()] == ["/foo"]
+
+    state.reset_namespace(clone)
+    assert [r.url for r in clone.responses.registered()] == ["/foo"]
+
+    state.remove_namespace(parent.id)
+    assert [r.url for r in clone.responses.registered()] == ["/foo"]
+
+
+def test_clone_invalid_namespace():
+    state = State()
+    with pytest.raises(HTTPException):
+        state.clone_namespace(state.get_namespace("foo"))
+
+
+def test_shared_clone_namespace(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SharedState(path=path), SharedState(path=path)
+
+    parent_id = first.create_namespace()
+    first.apply(
+        first.get_namespace(parent_id), [("add", RouteSpec(url="/foo", json=1))]
+    )
+    clone_id = first.clone_namespace(first.get_namespace(parent_id))
+    second.apply(second.get_namespace(clone_id), [("add", RouteSpec(url="/bar"))])
+
+    for state in (first, second):
+        clone = state.get_namespace(clone_id)
+        assert [r.url for r in clone.responses.registered()] == ["/foo", "/bar"]
+
+    first.reset_namespace(first.get_namespace(clone_id))
+    for state in (first, second):
+        clone = state.get_namespace(clone_id)
+        assert [r.url for r in clone.responses.registered()] == ["/foo"]
+        parent = state.get_namespace(parent_id)
+        assert [r.url for r in parent.responses.registered()] == ["/foo"]
+
+
+def test_clone(responsaas: Responsaas):
+    responsaas.get("/foo", json={"foo": True})
+    responsaas.shape(latency=0)
+
+    with responsaas.clone() as clone:
+        clone.get("/bar", json={"bar": True})
+
+        response = requests.get(f"{clone.base_url}/foo", timeout=1)
+        assert response.json() == {"foo": True}
+        response = requests.get(f"{clone.base_url}/bar", timeout=1)
+        assert response.json() == {"bar": True}
+        assert clone.call_count("/foo") == 1
+        assert responsaas.calls() == []
+
+        clone.reset()
+        assert requests.get(f"{clone.base_url}/foo", timeout=1).status_code == 200
+        assert requests.get(f"{clone.base_url}/bar", timeout=1).status_code == 500
+
+    response = requests.get(f"{responsaas.base_url}/bar", timeout=1)
+    assert response.status_code == 500
+
+
+@pytest.mark.parametrize("route", ["/one", "/two"])
+def test_clone_fixture(cloned_responsaas: Responsaas, route):
+    cloned_responsaas.get(route)
+
+    response = requests.get(f"{cloned_responsaas.base_url}/common", timeout=1)
+    assert response.json() == {"common": True}
+    assert cloned_responsaas.call_counts()["route"] == {"GET /common": 1}
@@ -0,0 +1,62 @@
+import httpx
+import pytest
+from responsaas import Responsaas
+from responsaas.async_api import AsyncResponsaas
+from responsaas.in_process import BASE_URL, ASGITransport
+from responsaas.pytest import (
+    create_async_responsaas_fixture,
+    create_responsaas_fixture,
+)
+
+in_process_responsaas = create_responsaas_fixture(in_process=True)
+in_process_async_responsaas = create_async_responsaas_fixture(in_process=True)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_in_process(in_process_responsaas: Responsaas):
+    responsaas = in_process_responsaas
+    assert responsaas.base_url.startswith(BASE_URL)
+
+    responsaas.get("/foo", json={"foo": 1}, headers={"X-Foo": "1"})
+    responsaas.post("/foo", status=201)
+
+    response = responsaas.session.get(responsaas.base_url + "/foo?a=1")
+    assert response.json() == {"foo": 1}
+    assert response.headers["X-Foo"] == "1"
+    response = responsaas.session.post(responsaas.base_url + "/foo", data=b"body")
+    assert response.status_code == 201
+    response = responsaas.session.get(responsaas.base_url + "/bar")
+    assert response.status_code == 500
+
+    assert responsaas.call_count("/foo?a=1") == 1
+    [call] = responsaas.query_calls(method="POST", fields=["body"])
+    assert call == {"body": b"body"}
+    assert len(responsaas.calls()) == 3
+
+
+def test_in_process_httpx(in_process_responsaas: Responsaas):
+    in_process_responsaas.get("/foo", json={"foo": 1})
+
+    with httpx.Client(transport=ASGITransport()) as client:
+        response = client.get(in_process_responsaas.base_url + "/foo")
+    assert response.json() == {"foo": 1}
+    assert in_process_responsaas.call_count("/foo") == 1
+
+
+@pytest.mark.anyio
+async def test_in_process_async(in_process_async_responsaas: AsyncResponsaas):
+    responsaas = in_process_async_responsaas
+    await responsaas.get("/foo", json={"foo": 1})
+
+    response = await responsaas.client.get(responsaas.base_url + "/foo")
+    assert response.json() == {"foo": 1}
+    assert await responsaas.call_count("/foo") == 1
+
+
+def test_in_process_pool():
+    with pytest.raises(ValueError):
+        create_responsaas_fixture(in_process=True, pool=2)
@@ -0,0 +1,61 @@
+import requests
+
+from responsaas import Responsaas
+from responsaas.metrics import Histogram, Metrics
+from responsaas.state import State
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 5.65
+
+
+def test_metrics():
+    state = State()
+    namespace = state.get_namespace(state.create_namespace())
+    state.apply(namespace, [])
+
+    metrics = Metrics()
+    metrics.record_match(namespace, 0.001, matched=True)
+    metrics.record_match(namespace, 0.001, matched=False)
+    metrics.record_handler(0.002)
+
+    result = metrics.to_dict(state)
+    assert result["namespaces"] == 1
+    assert result["requests"] == 2
+    assert result["miss_rate"] == 0.5
+    assert result["handler_seconds"]["count"] == 1
+    assert result["namespace"][namespace.id]["requests"] == 2
+    assert result["namespace"][namespace.id]["misses"] == 1
+
+    text = metrics.to_prometheus(state)
+    assert "responsaas_namespaces 1\n" in text
+    assert (
+        f'responsaas_namespace_misses_total{{namespace="{namespace.id}"}} 1\n' in text
+    )
+    assert 'responsaas_match_seconds_bucket{le="+Inf"} 2\n' in text
+
+
+def test_metrics_endpoint(responsaas: Responsaas):
+    responsaas.get("/foo", body="foo")
+    requests.get(responsaas.base_url + "/foo", timeout=10)
+
+    response = requests.get(
+        responsaas.server_url + "/__responsaas__/metrics", timeout=10
+    )
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert "# TYPE responsaas_handler_seconds histogram" in response.text
+
+    response = requests.get(
+        responsaas.server_url + "/__responsaas__/metrics",
+        params={"format": "json"},
+        timeout=10,
+    )
+    result = response.json()
+    assert result["requests"] >= 1
+    assert "match_seconds" in result
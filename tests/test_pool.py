@@ -0,0 +1,90 @@
+import pytest
+import requests
+from responsaas import Responsaas
+from responsaas.api import NamespacePool, ResponsaasServer
+from responsaas.operations import RouteSpec
+from responsaas.pytest import create_responsaas_fixture, resolve_server_url
+from responsaas.shaping import Shaping
+from responsaas.state import SharedState, State
+
+pooled_responsaas = create_responsaas_fixture(pool=2)
+
+
+@pytest.fixture
+def server(responsaas_server):
+    return ResponsaasServer(resolve_server_url(responsaas_server, None))
+
+
+def test_create_namespaces(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SharedState(path=path), SharedState(path=path)
+
+    namespace_ids = first.create_namespaces(3)
+    assert len(set(namespace_ids)) == 3
+    for namespace_id in namespace_ids:
+        assert second.get_namespace(namespace_id)
+
+
+def test_release_namespace():
+    state = State()
+    namespace = state.get_namespace(state.create_namespace())
+    state.apply(namespace, [("add", RouteSpec(url="/foo"))])
+    state.configure(namespace, shaping=Shaping(latency=1))
+
+    state.release_namespace(namespace)
+    assert namespace.responses.registered() == []
+    assert namespace.shaping is None
+
+
+@pytest.mark.parametrize("route", ["/one", "/two", "/three"])
+def test_pooled_fixture(pooled_responsaas: Responsaas, route):
+    # Each test starts with an empty namespace, though namespaces are reused.
+    assert pooled_responsaas.calls() == []
+    assert (
+        requests.get(pooled_responsaas.base_url + "/one", timeout=1).status_code == 500
+    )
+
+    pooled_responsaas.get(route)
+    pooled_responsaas.shape(latency=0)
+    assert (
+        requests.get(pooled_responsaas.base_url + route, timeout=1).status_code == 200
+    )
+
+
+def test_pool_reuse(server: ResponsaasServer):
+    pool = NamespacePool(server, size=1)
+    with pool.namespace() as first:
+        first.get("/foo")
+        requests.get(first.base_url + "/foo", timeout=1)
+
+    # The released namespace is reused, starting empty.
+    with pool.namespace() as second:
+        assert second.namespace_id == first.namespace_id
+        assert second.calls() == []
+        assert requests.get(second.base_url + "/foo", timeout=1).status_code == 500
+    pool.close()
+
+
+def test_pool_drained(server: ResponsaasServer):
+    pool = NamespacePool(server, size=1)
+    with pool.namespace() as first, pool.namespace() as second:
+        assert first.namespace_id != second.namespace_id
+
+    # Only as many namespaces as the pool's size are kept.
+    assert len(pool._idle) == 1
+    pool.close()
+    assert pool._idle == []
+
+
+def test_pool_release_assertion(server: ResponsaasServer):
+    pool = NamespacePool(server, size=1)
+    response = server._call("enter", json={"assert_all_requests_are_fired": True})
+    responsaas = Responsaas(server.server_url, namespace_id=response["namespace_id"])
+    responsaas.get("/foo")
+
+    # The namespace is removed, rather than returned to the pool.
+    with pytest.raises(requests.HTTPError):
+        pool.release(responsaas)
+    assert pool._idle == []
+    with pytest.raises(requests.HTTPError):
+        responsaas.reset()
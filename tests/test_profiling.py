@@ -0,0 +1,63 @@
+import time
+
+import requests
+from responses import matchers
+
+from responsaas import Responsaas
+from responsaas.profiling import Timings
+
+
+def test_timings():
+    timings = Timings()
+    timings.mark("body")
+    time.sleep(0.02)
+    timings.add("matcher", 0.01)
+    timings.mark("response")
+
+    # Time attributed to other phases is excluded from the marked phase.
+    assert timings.phases["matcher"] == 0.01
+    assert 0.005 < timings.phases["response"] < 0.02
+    assert timings.server_timing().startswith("body;dur=")
+
+
+def test_server_timing(responsaas: Responsaas):
+    responsaas.get("/foo", body="foo")
+
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    assert "Server-Timing" not in response.headers
+
+    responsaas.profile(server_timing=True)
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    phases = [
+        timing.split(";")[0] for timing in response.headers["Server-Timing"].split(", ")
+    ]
+    assert phases == ["body", "prepare", "registry", "matcher", "response"]
+
+    responsaas.profile()
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    assert "Server-Timing" not in response.headers
+
+
+def test_slowest(responsaas: Responsaas):
+    responsaas.profile(slowest=2)
+    responsaas.get("/fast", body="fast")
+    responsaas.get(
+        "/slow",
+        body="slow",
+        match=[(matchers.query_param_matcher, {"q": "1"})],
+        shaping={"latency": 0.05},
+    )
+
+    requests.get(responsaas.base_url + "/fast", timeout=10)
+    requests.get(responsaas.base_url + "/slow?q=1", timeout=10)
+    requests.get(responsaas.base_url + "/fast", timeout=10)
+    requests.get(responsaas.base_url + "/fast", timeout=10)
+
+    slowest = responsaas.slowest_requests()
+    assert len(slowest) == 2
+    assert slowest[0]["url"] == "/slow?q=1"
+    assert slowest[0]["total_ms"] >= 50
+    assert slowest[0]["phases_ms"]["delay"] >= 50
+    assert slowest[0]["dominant"]["route"] == "GET /slow"
+    assert slowest[0]["dominant"]["matchers"] == ["query_param_matcher.<locals>.match"]
+    assert slowest[1]["url"] == "/fast"
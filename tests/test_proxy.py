@@ -0,0 +1,103 @@
+import json
+import os
+import uuid
+
+import pytest
+import requests
+from responsaas import Responsaas
+from responsaas.api import ResponsaasServer
+from responsaas.bodies import BodyStore
+from responsaas.proxy import write_cassette
+from responsaas.pytest import resolve_server_url
+from responsaas.templates import load_templates
+
+
+@pytest.fixture
+def upstream(responsaas_server):
+    # Another namespace stands in for the upstream service.
+    url = resolve_server_url(responsaas_server, None)
+    with ResponsaasServer(url).activate() as upstream:
+        yield upstream
+
+
+def test_write_cassette(tmp_path):
+    path = str(tmp_path / "cassette.json")
+    route = {"method": "GET", "url": "/foo", "status": 200, "headers": {}}
+    write_cassette(path, {**route, "match": [("query_string_matcher", "a=1")]}, b"foo")
+    write_cassette(path, {**route, "url": "/bar"}, b"\xff")
+
+    with open(path) as f:
+        routes = json.load(f)["routes"]
+    assert routes[0]["body"] == "foo"
+    assert routes[1]["body_file"].startswith("cassette.json.bodies/")
+
+    # Cassettes are templates.
+    templates = load_templates([path], BodyStore())
+    [foo, bar] = templates["cassette"]
+    assert foo.body == b"foo"
+    with open(bar.body_file, "rb") as f:
+        assert f.read() == b"\xff"
+
+
+def test_proxy(responsaas: Responsaas, upstream: Responsaas):
+    upstream.get("/foo", json={"foo": 1}, headers={"X-Upstream": "1"})
+    upstream.post("/foo", json={"foo": 2})
+    responsaas.proxy(upstream.base_url)
+
+    for _ in range(2):
+        response = requests.get(responsaas.base_url + "/foo?a=1", timeout=10)
+        assert response.json() == {"foo": 1}
+        assert response.headers["X-Upstream"] == "1"
+        assert response.headers["Content-Type"] == "application/json"
+    assert upstream.call_count("/foo?a=1") == 1
+
+    # Requests differing by query or body are recorded separately.
+    requests.get(responsaas.base_url + "/foo?a=2", timeout=10)
+    for body in (b"1", b"2", b"1"):
+        response = requests.post(responsaas.base_url + "/foo", data=body, timeout=10)
+        assert response.json() == {"foo": 2}
+    assert len(upstream.calls()) == 4
+
+    # Each request is a single call, against its recorded route.
+    assert len(responsaas.calls()) == 6
+    assert responsaas.call_counts()["route"] == {"GET /foo": 3, "POST /foo": 3}
+
+    # Without the proxy, recordings are still served.
+    responsaas.proxy()
+    response = requests.get(responsaas.base_url + "/foo?a=1", timeout=10)
+    assert response.json() == {"foo": 1}
+    response = requests.get(responsaas.base_url + "/foo?a=3", timeout=10)
+    assert response.status_code == 500
+
+
+def test_proxy_upstream_error(responsaas: Responsaas):
+    responsaas.proxy("http://localhost:1", timeout=1)
+    response = requests.get(responsaas.base_url + "/foo", timeout=10)
+    assert response.status_code == 502
+
+
+def test_proxy_invalid_cassette(responsaas: Responsaas, upstream: Responsaas):
+    with pytest.raises(requests.HTTPError):
+        responsaas.proxy(upstream.base_url, cassette="../cassette.json")
+
+
+@pytest.mark.skipif(
+    not os.environ.get("RESPONSAAS_FILE_ROOT"),
+    reason="Requires the server's RESPONSAAS_FILE_ROOT",
+)
+def test_proxy_cassette(responsaas: Responsaas, upstream: Responsaas):
+    upstream.get("/foo", json={"foo": 1})
+    name = f"{uuid.uuid4()}.json"
+    responsaas.proxy(upstream.base_url, cassette=name)
+    requests.get(responsaas.base_url + "/foo", timeout=10)
+
+    path = os.path.join(os.environ["RESPONSAAS_FILE_ROOT"], name)
+    try:
+        with open(path) as f:
+            [route] = json.load(f)["routes"]
+    finally:
+        os.remove(path)
+
+    assert route["url"] == "/foo"
+    assert json.loads(route["body"]) == {"foo": 1}
+    assert route["match"] == [["query_string_matcher", ""]]
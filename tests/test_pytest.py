@@ -1,6 +1,11 @@
 import pytest
 import requests.exceptions
+from pytest_mock_resources.container.base import (
+    ContainerCheckFailed,
+    unused_tcp_port,
+)
 from responsaas.pytest import (
+    ResponsaasConfig,
     create_responsaas_fixture,
 )
 
@@ -25,3 +30,57 @@ def test_with_string_fixture():
     # This implies it's actually attempting to connect
     with pytest.raises(requests.exceptions.ConnectionError):
         next(fixture.__pytest_wrapped__.obj("http://localhost"))
+
+
+def test_for_worker():
+    config = ResponsaasConfig(instance_ports=[7000, 7001, 7002])
+    assert [config.for_worker(f"gw{i}").port for i in range(4)] == [
+        7000,
+        7001,
+        7002,
+        7000,
+    ]
+    assert config.for_worker("").port == 7000
+    assert config.for_worker("gw4").for_worker("gw1").port == 7001
+
+
+def test_for_worker_unsharded(monkeypatch):
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw3")
+    config = ResponsaasConfig(port=7000)
+    assert config.for_worker().base_url == config.base_url
+
+
+def test_instance_ports_env(monkeypatch):
+    monkeypatch.setenv("PMR_RESPONSAAS_INSTANCE_PORTS", "7000,7001")
+    assert [config.port for config in ResponsaasConfig().instances()] == [7000, 7001]
+
+
+def test_instances_env_port(monkeypatch):
+    # Each instance keeps its own port, despite the environment's.
+    monkeypatch.setenv("PMR_RESPONSAAS_PORT", "7799")
+    config = ResponsaasConfig(instance_ports=[7000, 7001])
+    assert [instance.port for instance in config.instances()] == [7000, 7001]
+    assert config.for_worker("gw1").base_url.endswith(":7001")
+
+    assert ResponsaasConfig().for_worker("gw1").port == 7799
+
+
+def test_instances_env_instance_ports(monkeypatch):
+    monkeypatch.setenv("PMR_RESPONSAAS_PORT", "7799")
+    monkeypatch.setenv("PMR_RESPONSAAS_INSTANCE_PORTS", "7000,7001")
+
+    # A worker's config is of its instance alone, which is all it checks.
+    instance = ResponsaasConfig().for_worker("gw1")
+    assert instance.port == 7001
+    assert instance.instance_ports is None
+    assert instance.instances() == [instance]
+
+
+def test_check_fn_all_instances(responsaas_server):
+    config = ResponsaasConfig(
+        host=responsaas_server.host,
+        instance_ports=[responsaas_server.port, unused_tcp_port()],
+    )
+    config.for_worker("gw0").check_fn()
+    with pytest.raises(ContainerCheckFailed):
+        config.check_fn()
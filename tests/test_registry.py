@@ -0,0 +1,66 @@
+import re
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from responsaas.api import Responsaas
+from responsaas.registry import IndexedRequestsMock
+from responses import RequestsMock
+
+
+def send(mock: IndexedRequestsMock, method: str, url: str):
+    request = requests.PreparedRequest()
+    request.prepare(method=method, url="http://_/")
+    request.url = url
+    return mock._on_request(HTTPAdapter(), request)
+
+
+def test_indexed_first_match():
+    mock = IndexedRequestsMock()
+    mock.add("GET", "/foo", json=1)
+    mock.add("GET", "/foo", json=2)
+    mock.add("POST", "/foo", json=3)
+
+    assert send(mock, "POST", "/foo").json() == 3
+    assert send(mock, "GET", "/foo").json() == 1
+    assert send(mock, "GET", "/foo").json() == 2
+    assert send(mock, "GET", "/foo").json() == 2
+
+
+@pytest.mark.parametrize("mock_cls", [RequestsMock, IndexedRequestsMock])
+def test_indexed_pattern_ordering(mock_cls):
+    mock = mock_cls()
+    mock.add("GET", re.compile("/foo/.*"), json="pattern")
+    mock.add("GET", "/foo/bar", json="exact")
+    mock.add("GET", re.compile("/bar/.*"), json="other")
+
+    assert send(mock, "GET", "/foo/baz").json() == "pattern"
+    assert send(mock, "GET", "/foo/bar").json() == "exact"
+    assert send(mock, "GET", "/foo/bar").json() == "exact"
+    assert send(mock, "GET", "/bar/baz").json() == "other"
+
+
+def test_indexed_replace_remove_reset():
+    mock = IndexedRequestsMock()
+    mock.add("GET", "/foo", json=1)
+    mock.add("GET", "/bar", json=1)
+    mock.replace("GET", "/foo", json=2)
+    mock.remove("GET", "/bar")
+
+    assert send(mock, "GET", "/foo").json() == 2
+    with pytest.raises(requests.ConnectionError) as e:
+        send(mock, "GET", "/bar")
+    assert "- GET /foo URL does not match" in str(e.value)
+
+    mock.reset()
+    mock.add("GET", "/bar", json=3)
+    assert send(mock, "GET", "/bar").json() == 3
+
+
+def test_many_routes(responsaas: Responsaas):
+    with responsaas.batch():
+        for i in range(200):
+            responsaas.get(f"/foo/{i}", json=i)
+
+    response = requests.get(f"{responsaas.base_url}/foo/150", timeout=1)
+    assert response.json() == 150
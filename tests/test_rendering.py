@@ -0,0 +1,59 @@
+import requests
+from responsaas import Responsaas
+from responsaas.registry import IndexedRequestsMock
+from responsaas.rendering import RenderingAdapter, StaticResponse
+
+
+def send(mock: IndexedRequestsMock, method: str, url: str):
+    request = requests.PreparedRequest()
+    request.prepare(method=method, url="http://_/")
+    request.url = url
+    return mock._on_request(RenderingAdapter(), request)
+
+
+def test_rendered_once():
+    mock = IndexedRequestsMock()
+    route = mock.add(StaticResponse("GET", "/foo", json={"foo": 1}, status=201))
+
+    first = send(mock, "GET", "/foo?a=1")
+    second = send(mock, "GET", "/foo?a=2")
+    assert first.rendered is second.rendered
+    assert first.content is second.content
+
+    for response, url in ((first, "/foo?a=1"), (second, "/foo?a=2")):
+        assert response.json() == {"foo": 1}
+        assert response.status_code == 201
+        assert response.headers["Content-Type"] == "application/json"
+        assert response.url == url
+        assert response.request.url == url
+
+    # Calls are still recorded.
+    assert route.call_count == 2
+    assert [call.response for call in mock.calls] == [first, second]
+
+
+def test_rendered_shared_by_forks():
+    parent = IndexedRequestsMock()
+    parent.add(StaticResponse("GET", "/foo", body="foo"))
+    send(parent, "GET", "/foo")
+
+    fork = parent.fork()
+    assert send(fork, "GET", "/foo").rendered is parent.registered()[0].rendered
+    assert fork.get_registry().call_count(fork.registered()[0]) == 1
+
+
+def test_rendered_response(responsaas: Responsaas):
+    responsaas.get("/foo", json={"foo": 1}, headers={"X-Foo": "1"}, status=201)
+    responsaas.profile(server_timing=True)
+
+    for _ in range(3):
+        response = requests.get(responsaas.base_url + "/foo", timeout=1)
+        assert response.status_code == 201
+        assert response.json() == {"foo": 1}
+        assert response.headers["X-Foo"] == "1"
+        assert response.headers["Content-Type"] == "application/json"
+
+        # Per-request headers aren't kept with the rendered response.
+        assert response.headers["Server-Timing"].count("prepare;dur") == 1
+
+    assert responsaas.call_count("/foo") == 3
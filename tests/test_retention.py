@@ -0,0 +1,115 @@
+import hashlib
+
+import pytest
+import requests
+from responsaas import Responsaas
+from responsaas.calls import CallRecord, Retention
+from responsaas.operations import RouteSpec
+from responsaas.state import SharedState, State
+from responses import Call
+
+
+def make_call(url: str, body: bytes = b"body") -> Call:
+    request = requests.PreparedRequest()
+    request.prepare(method="POST", url="http://_/", data=body)
+    request.url = url
+    request.route = "POST /foo"  # type: ignore[attr-defined]
+
+    response = requests.Response()
+    response.status_code = 201
+    response.headers["Content-Type"] = "text/plain"
+    response._content = b"response"
+    return Call(request, response)  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize(
+    "retention, body, digest",
+    [
+        (Retention(), b"body", None),
+        (Retention(bodies="truncate", max_body=2), b"bo", None),
+        (Retention(bodies="hash"), None, hashlib.sha256(b"body").hexdigest()),
+        (Retention(bodies="drop"), None, None),
+    ],
+)
+def test_call_record(retention, body, digest):
+    record = CallRecord.from_call(make_call("/foo?a=1"), retention)
+    assert (record.body, record.body_digest, record.body_size) == (body, digest, 4)
+
+    request, response = record.to_call()
+    assert request.url == "/foo?a=1"
+    assert request.params == {"a": "1"}
+    assert request.route == "POST /foo"
+    assert request.body == body
+    assert response.status_code == 201
+    assert response.headers["Content-Type"] == "text/plain"
+    assert response.request is request
+
+
+def test_route_calls_not_retained():
+    state = State()
+    namespace = state.get_namespace(state.create_namespace())
+    state.apply(namespace, [("add", RouteSpec(url="/foo"))])
+
+    [route] = namespace.responses.registered()
+    route.calls.add_call(make_call("/foo"))
+    assert route.call_count == 1
+    assert list(route.calls) == []
+
+
+def test_max_calls():
+    state = State()
+    namespace = state.get_namespace(state.create_namespace())
+    namespace.record_calls(
+        [CallRecord.from_call(make_call(f"/foo?q={q}")) for q in range(3)]
+    )
+
+    state.configure(namespace, retention=Retention(max_calls=2))
+    assert [call.url for call in namespace.calls] == ["/foo?q=1", "/foo?q=2"]
+
+    namespace.record_calls([CallRecord.from_call(make_call("/foo?q=3"))])
+    calls, cursor = namespace.calls_since(0)
+    assert [call.url for call in calls] == ["/foo?q=2", "/foo?q=3"]
+    assert cursor == 4
+    assert namespace.counts.path["/foo"] == 4
+    assert namespace.size == sum(call.size for call in namespace.calls)
+
+
+def test_shared_max_calls(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SharedState(path=path), SharedState(path=path)
+
+    namespace_id = first.create_namespace()
+    namespace = first.get_namespace(namespace_id)
+    first.configure(namespace, retention=Retention(max_calls=2))
+    for q in range(3):
+        namespace.responses.calls.add_call(make_call(f"/foo?q={q}"))
+        first.record_calls(namespace)
+
+    namespace = second.get_namespace(namespace_id)
+    calls, _ = second.calls_since(namespace)
+    assert [call.url for call in calls] == ["/foo?q=1", "/foo?q=2"]
+
+    # The discarded call is still counted by a process which never saw it.
+    second.sync_calls(namespace)
+    assert namespace.counts.path["/foo"] == 3
+    assert [call.url for call in namespace.calls] == ["/foo?q=1", "/foo?q=2"]
+
+
+def test_retain(responsaas: Responsaas):
+    responsaas.post("/foo", body="response")
+    responsaas.retain(bodies="truncate", max_body=3, max_calls=2)
+
+    for q in range(3):
+        requests.post(f"{responsaas.base_url}/foo?q={q}", data=b"12345", timeout=1)
+
+    calls = responsaas.calls()
+    assert [call.request.url for call in calls] == ["/foo?q=1", "/foo?q=2"]
+    assert calls[0].request.body == b"123"
+    assert calls[0].request.body_size == 5
+    assert calls[0].response.content == b"res"
+    assert responsaas.call_count("/foo?q=0") == 1
+
+    responsaas.retain(bodies="hash")
+    requests.post(f"{responsaas.base_url}/foo?q=3", data=b"12345", timeout=1)
+    [call] = responsaas.query_calls(query={"q": "3"}, fields=["body", "body_digest"])
+    assert call == {"body": None, "body_digest": hashlib.sha256(b"12345").hexdigest()}
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+import requests
+
+from responsaas import Responsaas, Shaping
+from responsaas.shaping import sample_percentiles
+
+
+def test_sample_percentiles():
+    percentiles = {50: 0.1, 90: 0.5, 99: 1.0}
+    assert sample_percentiles(percentiles, 0) == 0.1
+    assert sample_percentiles(percentiles, 50) == 0.1
+    assert sample_percentiles(percentiles, 70) == pytest.approx(0.3)
+    assert sample_percentiles(percentiles, 100) == 1.0
+
+
+def test_delay():
+    assert Shaping().delay() == 0
+    assert Shaping(latency=0.5).delay() == 0.5
+
+    for _ in range(100):
+        assert 0.4 <= Shaping(latency=0.5, jitter=0.1).delay() <= 0.6
+        assert 0 <= Shaping(latency=0.05, jitter=0.1).delay() <= 0.15
+        assert 1 <= Shaping(latency=5, percentiles={0: 1, 100: 2}).delay() <= 2
+
+
+def timed_get(url: str):
+    start = time.monotonic()
+    response = requests.get(url, timeout=10)
+    return response, time.monotonic() - start
+
+
+def test_route_latency(responsaas: Responsaas):
+    responsaas.get("/slow", body="slow", shaping=Shaping(latency=0.3))
+    responsaas.get("/fast", body="fast")
+
+    response, elapsed = timed_get(responsaas.base_url + "/slow")
+    assert response.text == "slow"
+    assert elapsed >= 0.3
+
+    response, elapsed = timed_get(responsaas.base_url + "/fast")
+    assert response.text == "fast"
+    assert elapsed < 0.3
+
+
+def test_bandwidth(responsaas: Responsaas):
+    body = b"x" * 4000
+    responsaas.get(
+        "/foo",
+        body=body,
+        shaping={"ttfb": 0.1, "bandwidth": 10_000, "chunk_size": 1000},
+    )
+
+    response, elapsed = timed_get(responsaas.base_url + "/foo")
+    assert response.content == body
+    assert elapsed >= 0.1 + 0.3
+
+
+def test_namespace_shaping(responsaas: Responsaas):
+    responsaas.shape(latency=0.3)
+    responsaas.get("/default", body="default")
+    responsaas.get("/override", body="override", shaping={"latency": 0})
+
+    response, elapsed = timed_get(responsaas.base_url + "/default")
+    assert response.text == "default"
+    assert elapsed >= 0.3
+
+    _, elapsed = timed_get(responsaas.base_url + "/override")
+    assert elapsed < 0.3
+
+    responsaas.shape()
+    _, elapsed = timed_get(responsaas.base_url + "/default")
+    assert elapsed < 0.3
+
+
+def test_replace_clears_shaping(responsaas: Responsaas):
+    responsaas.get("/foo", body="slow", shaping={"latency": 0.3})
+    responsaas.replace(responsaas.GET, "/foo", body="fast")
+
+    response, elapsed = timed_get(responsaas.base_url + "/foo")
+    assert response.text == "fast"
+    assert elapsed < 0.3
@@ -0,0 +1,129 @@
+import pytest
+from fastapi import HTTPException
+from requests import PreparedRequest
+from responsaas.operations import RouteSpec
+from responsaas.state import SharedState, State
+
+
+@pytest.fixture
+def states(tmp_path):
+    path = str(tmp_path / "state.db")
+    return SharedState(path=path), SharedState(path=path)
+
+
+def test_shared_operations(states):
+    first, second = states
+
+    namespace_id = first.create_namespace()
+    first.apply(
+        first.get_namespace(namespace_id),
+        [("add", RouteSpec(url="/foo", json={"foo": 1}))],
+    )
+
+    namespace = second.get_namespace(namespace_id)
+    [response] = namespace.responses.registered()
+    assert response.url == "/foo"
+
+    second.apply(namespace, [("replace", RouteSpec(url="/foo", json={"foo": 2}))])
+    second.apply(namespace, [("add", RouteSpec(url="/bar"))])
+
+    namespace = first.get_namespace(namespace_id)
+    assert [r.url for r in namespace.responses.registered()] == ["/foo", "/bar"]
+
+
+def test_shared_calls(states):
+    first, second = states
+
+    namespace_id = first.create_namespace()
+    namespace = second.get_namespace(namespace_id)
+    request = PreparedRequest()
+    request.prepare(method="GET", url="http://_/foo")
+    namespace.responses.calls.add(request, None)
+    second.record_calls(namespace)
+
+    namespace = first.get_namespace(namespace_id)
+    first.sync_calls(namespace)
+    assert [call.request.url for call in namespace.calls] == ["http://_/foo"]
+
+    second.reset_namespace(second.get_namespace(namespace_id))
+
+    namespace = first.get_namespace(namespace_id)
+    first.sync_calls(namespace)
+    assert list(namespace.calls) == []
+
+
+def test_shared_invalid_namespace(states):
+    first, _ = states
+    with pytest.raises(HTTPException):
+        first.get_namespace("foo")
+
+
+def test_exit_removes_namespace():
+    state = State()
+    namespace_id = state.create_namespace()
+    state.remove_namespace(namespace_id)
+    with pytest.raises(HTTPException):
+        state.get_namespace(namespace_id)
+
+
+def test_reap_ttl():
+    state = State(namespace_ttl=60)
+    old = state.create_namespace()
+    new = state.create_namespace()
+    state.namespaces[old].last_used -= 120
+
+    assert state.reap() == [old]
+    assert list(state.namespaces) == [new]
+
+
+def test_max_namespaces_lru():
+    state = State(max_namespaces=2)
+    first = state.create_namespace()
+    second = state.create_namespace()
+    state.get_namespace(first)
+
+    third = state.create_namespace()
+    assert list(state.namespaces) == [first, third]
+    assert second not in state.namespaces
+
+
+def test_reap_max_bytes():
+    state = State(max_bytes=100)
+    first = state.create_namespace()
+    second = state.create_namespace()
+    state.apply(
+        state.get_namespace(first), [("add", RouteSpec(url="/a", body=b"a" * 80))]
+    )
+    state.apply(
+        state.get_namespace(second), [("add", RouteSpec(url="/b", body=b"b" * 80))]
+    )
+
+    assert state.reap() == [first]
+    assert list(state.namespaces) == [second]
+
+
+def test_shared_reap(states):
+    first, second = states
+    first.namespace_ttl = 60
+
+    old = first.create_namespace()
+    new = second.create_namespace()
+    first.connection.execute(
+        "UPDATE namespaces SET last_used = last_used - 120 WHERE id = ?", (old,)
+    )
+
+    assert first.reap() == [old]
+    with pytest.raises(HTTPException):
+        second.get_namespace(old)
+    assert second.get_namespace(new)
+
+
+def test_shared_remove_namespace(states):
+    first, second = states
+
+    namespace_id = first.create_namespace()
+    second.get_namespace(namespace_id)
+    first.remove_namespace(namespace_id)
+
+    with pytest.raises(HTTPException):
+        second.get_namespace(namespace_id)
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+import requests
+
+from responsaas import Responsaas
+from responsaas.api import ResponsaasServer
+from responsaas.bodies import BodyStore
+from responsaas.state import State
+from responsaas.templates import load_templates
+
+templates_dir = os.path.join(os.path.dirname(__file__), "templates")
+
+
+@pytest.fixture
+def templates(tmp_path):
+    return load_templates([templates_dir], BodyStore(str(tmp_path)))
+
+
+def test_load_templates(templates):
+    assert sorted(templates) == ["example", "other"]
+    user, issues, readme = templates["example"]
+    assert user.json_body == {"login": "octocat"}
+    assert isinstance(issues.pattern, bytes)
+    assert readme.body_file == os.path.join(templates_dir, "readme.txt")
+    assert templates["other"][0].body == b"other"
+
+
+def test_load_template_invalid(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text('{"routes": [{"url": "/foo", "match": [["nope", {}]]}]}')
+
+    with pytest.raises(ValueError, match="Invalid template 'bad'"):
+        load_templates([str(path)], BodyStore(str(tmp_path)))
+
+
+def test_namespace_from_templates(templates):
+    state = State(templates=templates)
+    namespace = state.get_namespace(state.create_namespace(templates=["other"]))
+    assert len(namespace.responses.registered()) == 1
+
+    state.apply(namespace, [])
+    state.reset_namespace(namespace)
+    assert len(namespace.responses.registered()) == 1
+
+    with pytest.raises(Exception, match="Unknown template"):
+        state.create_namespace(templates=["missing"])
+
+
+@pytest.fixture
+def server(responsaas: Responsaas):
+    server = ResponsaasServer(responsaas.server_url)
+    if "example" not in server._call("templates"):
+        pytest.skip("Requires a server started with `--template tests/templates`")
+    return server
+
+
+def test_enter_with_templates(server: ResponsaasServer):
+    with server.activate(["example", "other"]) as responsaas:
+        responsaas.get("/extra", body="extra")
+        base_url = responsaas.base_url
+
+        assert requests.get(base_url + "/user", timeout=10).json() == {
+            "login": "octocat"
+        }
+        response = requests.post(base_url + "/repos/foo/issues?draft=false", timeout=10)
+        assert response.status_code == 201
+        assert requests.get(base_url + "/readme", timeout=10).text == "Hello, world!\n"
+        assert requests.get(base_url + "/other", timeout=10).status_code == 202
+        assert requests.get(base_url + "/extra", timeout=10).text == "extra"
+
+        # Template routes are overridden with `replace`, and restored by `reset`.
+        responsaas.replace(responsaas.GET, "/other", body="replaced")
+        assert requests.get(base_url + "/other", timeout=10).text == "replaced"
+
+        responsaas.reset()
+        assert requests.get(base_url + "/other", timeout=10).text == "other"
@@ -0,0 +1,37 @@
+import re
+
+import pytest
+import requests
+from responsaas.api import Responsaas, ResponsaasServer, matchers
+
+
+@pytest.mark.parametrize("use_msgpack", [False, True])
+def test_wire_format(responsaas: Responsaas, use_msgpack: bool):
+    server = ResponsaasServer(responsaas.server_url, use_msgpack=use_msgpack)
+    with server.activate() as scoped:
+        assert scoped.use_msgpack is True
+
+        scoped.get(
+            "/foo", body=b"\x00\xff", match=[(matchers.query_param_matcher, {"q": "1"})]
+        )
+        scoped.get(re.compile("/bar/.*"), json={"bar": True})
+
+        response = requests.get(f"{scoped.base_url}/foo?q=1", timeout=1)
+        assert response.content == b"\x00\xff"
+
+        response = requests.get(f"{scoped.base_url}/bar/1", timeout=1)
+        assert response.json() == {"bar": True}
+
+        calls = scoped.calls()
+        assert [call.request.url for call in calls] == ["/foo?q=1", "/bar/1"]
+        assert scoped.call_count("/bar/1") == 1
+
+
+def test_json_fallback(responsaas: Responsaas):
+    response = requests.post(
+        f"{responsaas.server_url}/__responsaas__/call_count",
+        json={"namespace_id": responsaas.namespace_id, "url": "/foo"},
+        timeout=1,
+    )
+    assert response.headers["Content-Type"] == "application/json"
+    assert response.json() == {"call_count": 0}